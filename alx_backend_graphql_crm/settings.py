@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,109 @@ GRAPHENE = {
     'SCHEMA': 'alx_backend_graphql_crm.schema.schema',
 }
 
+# Rows checked and inserted per query by the bulk mutations
+CRM_BULK_CHUNK_SIZE = 1000
+
+# Largest page served by the keyset ('keyset: true') connections
+CRM_KEYSET_MAX_PAGE_SIZE = 100
+
+# Rows fetched per database round trip by the streaming exports
+CRM_EXPORT_CHUNK_SIZE = 2000
+
+# Parsed and validated documents kept by the /graphql endpoint
+CRM_DOCUMENT_CACHE_SIZE = 512
+
+# Most results returned by the ranked 'searchCustomers' query
+CRM_SEARCH_MAX_RESULTS = 50
+
+# Most products returned by the 'salesByProduct' query
+CRM_SALES_MAX_RESULTS = 100
+
+# Longest range of days the 'salesByDay' query returns
+CRM_SALES_BY_DAY_MAX_DAYS = 731
+
+# Worker threads running the sync-only resolvers of the async GraphQL view
+CRM_ASYNC_SYNC_THREADS = 8
+
+# Most operations accepted in one batched request (a JSON array of operations)
+CRM_BATCH_MAX_OPERATIONS = 20
+
+# Budgets checked before an operation runs (see 'crm.cost'); None disables one
+CRM_QUERY_MAX_COST = 10000
+CRM_QUERY_MAX_DEPTH = 10
+
+# Rows assumed for a plain list field when estimating an operation's cost
+CRM_QUERY_DEFAULT_LIST_SIZE = 10
+
+# Resolver and SQL tracing ('crm.tracing'). Clients get 'extensions.tracing'
+# by sending {"tracing": true} in the request 'extensions'; requests slower
+# than SLOW_REQUEST_MS (None: never) are logged. TRACE_ALL_FIELDS adds the
+# per-field breakdown to every log line, at the cost of timing every resolver.
+CRM_TRACING = {
+    'ENABLED': True,
+    'SLOW_REQUEST_MS': 1000,
+    'TRACE_ALL_FIELDS': False,
+}
+
+# GraphQL endpoint the cron and Celery jobs post to; None runs their
+# operations in process ('crm.executor'), off the web workers
+CRM_JOBS_GRAPHQL_URL = None
+
+# Alias of the read replica in DATABASES; reads stay on the primary while
+# it is not configured
+CRM_REPLICA_DATABASE = 'replica'
+
+# Orders read per page by the reminder pipeline ('crm.reminders'), and
+# reminders handed to each 'send_reminder_batch' task
+CRM_REMINDER_PAGE_SIZE = 100
+CRM_REMINDER_BATCH_SIZE = 500
+
+# Customers deleted per transaction by 'purge_inactive_customers', and
+# seconds slept between two batches to let other writes through
+CRM_PURGE_BATCH_SIZE = 1000
+CRM_PURGE_PAUSE = 0.1
+
+# The CRM report covers the last 'DAYS' days; its orders are summed in
+# 'DATE_PARTITIONS' parallel subtasks and its customers ranked in
+# 'CUSTOMER_SHARDS' ones. Its breakdowns keep the 'TOP' products and customers.
+CRM_REPORT_DAYS = 7
+CRM_REPORT_DATE_PARTITIONS = 7
+CRM_REPORT_CUSTOMER_SHARDS = 4
+CRM_REPORT_TOP = 10
+
+# Celery broker, and the result backend the chords (the CRM report) collect
+# their subtasks' results in
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/1')
+
+# Accept automatic persisted queries (sha256 hash instead of the query text)
+CRM_PERSISTED_QUERIES = True
+
+# Cache of read-query responses, invalidated by writes to the CRM models.
+# Its entries and model versions live in the 'crm' cache, shared by every
+# process writing the database (web workers, cron and Celery jobs, management
+# commands). 'crm.response_cache.LocMemBackend' (OPTIONS: maxsize, ttl) keeps
+# them in the worker instead: only for a single process doing every write.
+CRM_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'BACKEND': 'crm.response_cache.DjangoCacheBackend',
+    'OPTIONS': {'alias': 'crm', 'ttl': 300},
+}
+
+# The 'crm' cache is a table of the primary database (migration 0010), so
+# every process sees the same entries; point it at Redis or Memcached to
+# take that load off the database.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'crm': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'crm_cache',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -54,6 +158,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'crm.routers.database_routing_middleware',
 ]
 
 ROOT_URLCONF = 'alx_backend_graphql_crm.urls'
@@ -83,9 +188,25 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open across requests, checked before each reuse.
+        # On PostgreSQL, OPTIONS={'pool': True} pools them instead (with
+        # CONN_MAX_AGE at 0).
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Optional read replica, which GraphQL queries read from (see 'crm.routers').
+# Locally, point CRM_REPLICA_DB at a second SQLite file to stand in for one.
+if os.environ.get('CRM_REPLICA_DB'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['CRM_REPLICA_DB'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['crm.routers.PrimaryReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -16,11 +16,14 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
+from crm.views import AsyncCRMGraphQLView, CRMExportView, CRMGraphQLView
 from django.views.decorators.csrf import csrf_exempt
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql', csrf_exempt(CRMGraphQLView.as_view(graphiql=True))),
+    # Same schema on graphql-core's async executor, for ASGI deployments
+    path('graphql/async', csrf_exempt(AsyncCRMGraphQLView.as_view(graphiql=True))),
+    path('export/<str:resource>', CRMExportView.as_view(), name='crm-export'),
 ]
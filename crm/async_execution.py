@@ -0,0 +1,130 @@
+"""
+'async_execution' runs GraphQL queries on graphql-core's async executor.
+Root fields with a native async resolver (Django's async ORM) run on the
+event loop; every other root field, with its whole sub-selection, runs in
+a bounded pool of worker threads so the loop never blocks on the database.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from threading import Lock
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from graphql import ExecutionContext, located_error
+from graphql.execution.execute import get_field_def
+from graphql.execution.values import get_argument_values
+
+
+# ---------------------------------------------------------
+# Bounded pool for the sync-only code paths
+# ---------------------------------------------------------
+_executor = None
+_executor_lock = Lock()
+
+
+def get_sync_executor():
+    """Returns the thread pool sized by 'CRM_ASYNC_SYNC_THREADS', built once.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.CRM_ASYNC_SYNC_THREADS,
+                thread_name_prefix='crm-sync',
+            )
+    return _executor
+
+
+def _with_connections(func):
+    """Applies the request-level connection handling to one pool job.
+    """
+    @wraps(func)
+    def job(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return job
+
+
+async def run_sync(func, *args, **kwargs):
+    """Awaits 'func(*args, **kwargs)' run in the bounded thread pool.
+    """
+    return await sync_to_async(
+        _with_connections(func), thread_sensitive=False, executor=get_sync_executor()
+    )(*args, **kwargs)
+
+
+# ---------------------------------------------------------
+# Native async resolvers
+# ---------------------------------------------------------
+native_resolvers = {}
+
+
+def async_resolver(type_name, field_name):
+    """Registers a coroutine resolving 'type_name.field_name' on the async path.
+    The synchronous view keeps using the field's regular resolver.
+    """
+    def register(resolver):
+        native_resolvers[(type_name, field_name)] = resolver
+        return resolver
+    return register
+
+
+# ---------------------------------------------------------
+# Execution context splitting the loop and the pool
+# ---------------------------------------------------------
+class AsyncCRMExecutionContext(ExecutionContext):
+    """Executes each root field on the event loop or in the thread pool.
+    Pool jobs of one operation run one at a time, as its DataLoaders and
+    the optimizer's querysets are not thread-safe; the jobs of different
+    operations (the queries of a batch) may overlap.
+    Inheritance:
+    	ExecutionContext: graphql-core's executor, used unchanged below the root.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sync_lock = asyncio.Lock()
+
+    async def run_serialized(self, func, *args):
+        trace = getattr(self.context_value, 'crm_trace', None)
+        if trace is not None:
+            # SQL hooks are per thread, so each job installs its own.
+            func = trace.recorded(func)
+        async with self.sync_lock:
+            return await run_sync(func, *args)
+
+    def execute_field(self, parent_type, source, field_nodes, path):
+        if path.prev is not None:
+            return super().execute_field(parent_type, source, field_nodes, path)
+
+        resolver = native_resolvers.get((parent_type.name, field_nodes[0].name.value))
+        if resolver is None:
+            # The resolver and the completion of its sub-selection run in one job.
+            return self.run_serialized(
+                super().execute_field, parent_type, source, field_nodes, path
+            )
+        return self.execute_native_field(resolver, parent_type, source, field_nodes, path)
+
+    async def execute_native_field(self, resolver, parent_type, source, field_nodes, path):
+        """Awaits a native resolver, then completes its value in the pool,
+        where the nested resolvers may still reach the database.
+        """
+        field_def = get_field_def(self.schema, parent_type, field_nodes[0])
+        return_type = field_def.type
+        info = self.build_resolve_info(field_def, field_nodes, parent_type, path)
+        if self.middleware_manager:
+            resolver = self.middleware_manager.get_field_resolver(resolver)
+        try:
+            args = get_argument_values(field_def, field_nodes[0], self.variable_values)
+            result = await resolver(source, info, **args)
+            return await self.run_serialized(
+                self.complete_value, return_type, field_nodes, info, path, result
+            )
+        except Exception as raw_error:
+            error = located_error(raw_error, field_nodes, path.as_list())
+            self.handle_field_error(error, return_type)
+            return None
@@ -0,0 +1,39 @@
+"""
+'benchmarks' times CRM operations against a throwaway test database.
+Run a benchmark module directly, e.g. 'python -m crm.benchmarks.bulk_create_customers'.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+
+def setup_database():
+    """Configures Django and creates an empty test database for the run.
+    Return:
+    	The name of the created test database.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
+
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    return connection.creation.create_test_db(verbosity=0)
+
+
+def teardown_database(old_name):
+    """Drops the test database created by 'setup_database'.
+    """
+    from django.db import connection
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def timer(results, label):
+    """Stores the wall time of the wrapped block in 'results[label]' (seconds).
+    """
+    start = time.perf_counter()
+    yield
+    results[label] = time.perf_counter() - start
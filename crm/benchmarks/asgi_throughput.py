@@ -0,0 +1,191 @@
+"""
+Compares concurrent-request throughput of the async GraphQL view under
+uvicorn (ASGI) with the synchronous view under gunicorn's threaded WSGI
+worker. Each server runs one process with as many threads as the async
+view's sync pool, against the same seeded SQLite file, with the response
+cache disabled so every request reaches the database.
+Usage: python -m crm.benchmarks.asgi_throughput [concurrency ...]
+Requires uvicorn and gunicorn ('pip install uvicorn gunicorn').
+"""
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from crm.benchmarks import timer
+
+
+REQUESTS_PER_CLIENT = 50
+
+QUERY = """
+{
+  allOrders(first: 20) {
+    edges { node { totalAmount customer { email } items { quantity product { name } } } }
+  }
+  crmStats { orderCount revenue }
+}
+"""
+
+SETTINGS = """
+from alx_backend_graphql_crm.settings import *
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1']
+DATABASES = {{'default': {{
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': {database!r},
+    'OPTIONS': {{'timeout': 30}},
+}}}}
+CRM_RESPONSE_CACHE = {{**CRM_RESPONSE_CACHE, 'ENABLED': False}}
+CRM_ASYNC_SYNC_THREADS = {threads}
+"""
+
+THREADS = 8
+
+SERVERS = {
+    'asgi': ('/graphql/async', lambda port: [
+        'uvicorn', 'alx_backend_graphql_crm.asgi:application',
+        '--port', str(port), '--log-level', 'warning', '--no-access-log',
+    ]),
+    'wsgi': ('/graphql', lambda port: [
+        'gunicorn', 'alx_backend_graphql_crm.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', '1',
+        '--worker-class', 'gthread', '--threads', str(THREADS), '--log-level', 'warning',
+    ]),
+}
+
+
+def prepare(directory):
+    """Writes the benchmark settings, then migrates and seeds the database.
+    Return:
+    	The environment the servers run with.
+    """
+    Path(directory, 'crm_benchmark_settings.py').write_text(
+        SETTINGS.format(database=str(Path(directory, 'benchmark.sqlite3')), threads=THREADS)
+    )
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE='crm_benchmark_settings',
+        PYTHONPATH=os.pathsep.join([directory, os.getcwd()]),
+    )
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '-v0'], env=env, check=True)
+    subprocess.run(
+        [sys.executable, '-c', 'import django; django.setup(); '
+         'from crm.benchmarks.asgi_throughput import seed; seed()'],
+        env=env, check=True,
+    )
+    return env
+
+
+def seed(customers=200, products=50, orders=5000):
+    from crm.models import Customer, Order, OrderItem, Product
+
+    created_customers = Customer.objects.bulk_create([
+        Customer(name=f'Customer {i}', email=f'customer{i}@example.com')
+        for i in range(customers)
+    ])
+    created_products = Product.objects.bulk_create([
+        Product(name=f'Product {i}', price=i + 1, stock=100) for i in range(products)
+    ])
+    created_orders = Order.objects.bulk_create([
+        Order(customer_id=created_customers[i % customers]) for i in range(orders)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, quantity=1, unit_price=product.price)
+        for i, order in enumerate(created_orders)
+        for product in (created_products[i % products], created_products[(i + 1) % products])
+    ])
+    Order.objects.recompute_totals()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(name, env):
+    """Starts a one-process server and waits until it accepts requests.
+    Return:
+    	A tuple (process, port).
+    """
+    path, command = SERVERS[name]
+    port = free_port()
+    module, *arguments = command(port)
+    process = subprocess.Popen([sys.executable, '-m', module, *arguments], env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            status, _ = post(port, path)
+            if status == 200:
+                return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{name} server did not start")
+
+
+def post(port, path, connection=None):
+    connection = connection or http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    connection.request(
+        'POST', path, body=json.dumps({'query': QUERY}),
+        headers={'Content-Type': 'application/json'},
+    )
+    response = connection.getresponse()
+    body = response.read()
+    if response.status != 200 or b'"errors"' in body:
+        raise RuntimeError(body[:200])
+    return response.status, body
+
+
+def client(port, path):
+    """Sends 'REQUESTS_PER_CLIENT' requests on one keep-alive connection.
+    Return:
+    	The latency of every request, in seconds.
+    """
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    latencies = []
+    for _ in range(REQUESTS_PER_CLIENT):
+        start = time.perf_counter()
+        post(port, path, connection)
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+    return latencies
+
+
+def measure(port, path, concurrency):
+    results = {}
+    with timer(results, 'wall'):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            runs = list(pool.map(lambda _: client(port, path), range(concurrency)))
+    latencies = sorted(latency for run in runs for latency in run)
+    return {
+        'rps': len(latencies) / results['wall'],
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p95': latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+def main(levels):
+    with tempfile.TemporaryDirectory() as directory:
+        env = prepare(directory)
+        print(f"{'server':>6} {'clients':>8} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+        for name in SERVERS:
+            process, port = start_server(name, env)
+            try:
+                for concurrency in levels:
+                    stats = measure(port, SERVERS[name][0], concurrency)
+                    print(f"{name:>6} {concurrency:>8} {stats['rps']:>8.1f} "
+                          f"{stats['p50']:>9.1f} {stats['p95']:>9.1f}")
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == '__main__':
+    main([int(level) for level in sys.argv[1:]] or [1, 8, 32])
@@ -0,0 +1,78 @@
+"""
+Compares the set-based 'bulkCreateCustomers' with the former per-row path.
+Usage: python -m crm.benchmarks.bulk_create_customers [rows ...]
+"""
+import re
+import sys
+from crm.benchmarks import setup_database, teardown_database, timer
+
+
+MUTATION = """
+mutation ($customers: [CustomerInput]!) {
+  bulkCreateCustomers(customers: $customers) {
+    success
+    errors
+  }
+}
+"""
+
+
+def legacy_bulk_create(customers):
+    """The per-row loop 'BulkCreateCustomers' ran before: one exists() and one save() per row.
+    """
+    from crm.models import Customer
+
+    created, errors = [], []
+    for data in customers:
+        name, email, phone = data.get('name'), data.get('email'), data.get('phone')
+        if not name or not email:
+            errors.append(f"Missing required fields for: {name or '[Unnamed]'}")
+            continue
+        if Customer.objects.filter(email=email).exists():
+            errors.append(f"Email already exists: {email}")
+            continue
+        if phone and not re.match(r'^(\+\d{1,3}\d{4,14}|(\d{3}-\d{4}))$', phone):
+            errors.append(f"Invalid phone: {phone}")
+            continue
+        customer = Customer(name=name, email=email, phone=phone)
+        customer.save()
+        created.append(customer)
+    return created, errors
+
+
+def payload(rows, prefix):
+    return [
+        {'name': f'Customer {i}', 'email': f'{prefix}{i}@example.com', 'phone': '+2547000000'}
+        for i in range(rows)
+    ]
+
+
+def main(sizes):
+    from alx_backend_graphql_crm.schema import schema
+    from crm.models import Customer
+
+    print(f"{'rows':>8} {'per-row (s)':>12} {'bulk (s)':>10} {'speed-up':>9}")
+    for rows in sizes:
+        results = {}
+
+        with timer(results, 'legacy'):
+            legacy_bulk_create(payload(rows, 'legacy'))
+
+        with timer(results, 'bulk'):
+            result = schema.execute(
+                MUTATION, variable_values={'customers': payload(rows, 'bulk')}
+            )
+        assert not result.errors, result.errors
+        assert Customer.objects.filter(email__startswith='bulk').count() == rows
+
+        print(f"{rows:>8} {results['legacy']:>12.2f} {results['bulk']:>10.2f} "
+              f"{results['legacy'] / results['bulk']:>8.1f}x")
+        Customer.objects.all().delete()
+
+
+if __name__ == '__main__':
+    old_name = setup_database()
+    try:
+        main([int(rows) for rows in sys.argv[1:]] or [1000, 10000, 100000])
+    finally:
+        teardown_database(old_name)
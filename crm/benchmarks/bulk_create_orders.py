@@ -0,0 +1,92 @@
+"""
+Compares 'bulkCreateOrders' with looping over the 'createOrder' mutation.
+Usage: python -m crm.benchmarks.bulk_create_orders [orders ...]
+"""
+import sys
+from crm.benchmarks import setup_database, teardown_database, timer
+
+
+CREATE_ORDER = """
+mutation ($customerId: ID!, $productIds: [ID]!) {
+  createOrder(customerId: $customerId, productIds: $productIds) {
+    success
+    message
+  }
+}
+"""
+
+BULK_CREATE_ORDERS = """
+mutation ($orders: [OrderInput]!) {
+  bulkCreateOrders(orders: $orders) {
+    success
+    errors
+  }
+}
+"""
+
+
+def seed(customers=100, products=50):
+    """Creates the customers and products the benchmark orders refer to.
+    Return:
+    	A tuple (customer ids, product ids).
+    """
+    from crm.models import Customer, Product
+
+    created_customers = Customer.objects.bulk_create([
+        Customer(name=f'Customer {i}', email=f'customer{i}@example.com')
+        for i in range(customers)
+    ])
+    created_products = Product.objects.bulk_create([
+        Product(name=f'Product {i}', price=i + 1, stock=100) for i in range(products)
+    ])
+    return (
+        [customer.pk for customer in created_customers],
+        [product.pk for product in created_products],
+    )
+
+
+def payload(orders, customer_ids, product_ids):
+    return [
+        {
+            'customerId': customer_ids[i % len(customer_ids)],
+            'productIds': [product_ids[(i + j) % len(product_ids)] for j in range(3)],
+        }
+        for i in range(orders)
+    ]
+
+
+def main(sizes):
+    from alx_backend_graphql_crm.schema import schema
+    from crm.models import Order
+
+    customer_ids, product_ids = seed()
+    print(f"{'orders':>8} {'createOrder loop':>17} {'bulk (s)':>10} "
+          f"{'bulk orders/s':>14} {'speed-up':>9}")
+    for orders in sizes:
+        results = {}
+        rows = payload(orders, customer_ids, product_ids)
+
+        with timer(results, 'loop'):
+            for row in rows:
+                result = schema.execute(CREATE_ORDER, variable_values=row)
+                assert result.data['createOrder']['success'], result
+        Order.objects.all().delete()
+
+        with timer(results, 'bulk'):
+            result = schema.execute(BULK_CREATE_ORDERS, variable_values={'orders': rows})
+        assert not result.errors, result.errors
+        assert result.data['bulkCreateOrders']['success'], result.data
+        assert Order.objects.count() == orders
+        Order.objects.all().delete()
+
+        print(f"{orders:>8} {results['loop']:>17.2f} {results['bulk']:>10.2f} "
+              f"{orders / results['bulk']:>14.0f} "
+              f"{results['loop'] / results['bulk']:>8.1f}x")
+
+
+if __name__ == '__main__':
+    old_name = setup_database()
+    try:
+        main([int(orders) for orders in sys.argv[1:]] or [1000, 10000])
+    finally:
+        teardown_database(old_name)
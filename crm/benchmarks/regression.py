@@ -0,0 +1,340 @@
+"""
+Query-count and latency regression benchmark of the CRM's GraphQL operations.
+Seeds a database at each scale, runs every operation of 'OPERATIONS' through
+the /graphql endpoint with the response cache off, and records its SQL query
+count, p50/p95 latency and peak memory. The run fails when an operation's
+query count grows with its page size, or when it issues more queries or is
+slower than the stored baseline allows.
+Usage: python -m crm.benchmarks.regression [--update-baseline]
+           [--runs N] [--tolerance RATIO] [orders ...]
+Scales default to 1k, 100k and 1M orders; the 1M scale takes several minutes.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from crm.benchmarks import setup_database, teardown_database
+
+
+BASELINE = Path(__file__).with_name('baseline.json')
+
+# Page sizes each operation runs with; its query count must not change.
+PAGE_SIZES = (5, 50)
+
+# Statements not counted: they depend on the surrounding transaction only.
+TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+# Orders inserted per 'bulk_create' while seeding.
+SEED_BATCH = 20000
+
+
+REMINDER_ORDERS = """
+query ($since: DateTime, $until: DateTime, $first: Int) {
+  allOrders(orderDate_Gte: $since, orderDate_Lte: $until, first: $first) {
+    edges {
+      node {
+        id
+        orderDate
+        customer {
+          email
+        }
+      }
+    }
+  }
+}
+"""
+
+FILTERED_CUSTOMERS = """
+query ($since: Date, $name: String, $first: Int) {
+  allCustomers(createdAt_Gte: $since, name: $name, first: $first) {
+    edges {
+      node {
+        id
+        name
+        email
+        phone
+      }
+    }
+  }
+}
+"""
+
+CREATE_ORDER = """
+mutation ($customerId: ID!, $items: [OrderItemInput]) {
+  createOrder(customerId: $customerId, items: $items) {
+    success
+    message
+    order {
+      id
+      totalAmount
+      items {
+        quantity
+        product {
+          name
+        }
+      }
+    }
+  }
+}
+"""
+
+BULK_CREATE_CUSTOMERS = """
+mutation ($customers: [CustomerInput]!) {
+  bulkCreateCustomers(customers: $customers) {
+    success
+    errors
+    createdCustomers {
+      id
+    }
+  }
+}
+"""
+
+UPDATE_LOW_STOCK_PRODUCTS = """
+mutation ($threshold: Int) {
+  updateLowStockProducts(threshold: $threshold, increment: 1) {
+    success
+    output {
+      name
+      stock
+    }
+  }
+}
+"""
+
+
+def _reminder_variables(size, run, fixtures):
+    now = datetime.now(timezone.utc)
+    return {
+        'since': (now - timedelta(days=7)).isoformat(),
+        'until': now.isoformat(),
+        'first': size,
+    }
+
+
+def _customer_variables(size, run, fixtures):
+    return {'since': '2000-01-01', 'name': 'Customer', 'first': size}
+
+
+def _create_order_variables(size, run, fixtures):
+    products = fixtures['product_ids']
+    return {
+        'customerId': fixtures['customer_ids'][run % len(fixtures['customer_ids'])],
+        'items': [
+            {'productId': products[(run + i) % len(products)], 'quantity': 1}
+            for i in range(size)
+        ],
+    }
+
+
+def _bulk_customer_variables(size, run, fixtures):
+    return {'customers': [
+        {'name': f'Bulk {size} {run} {i}', 'email': f'bulk-{size}-{run}-{i}@example.com'}
+        for i in range(size)
+    ]}
+
+
+def _low_stock_variables(size, run, fixtures):
+    # Products are seeded with a stock equal to their index, so this
+    # restocks at most 'size' of them.
+    return {'threshold': size}
+
+
+# Operation name -> (document, variables(page size, run index, fixtures)).
+OPERATIONS = {
+    'allOrders (reminders)': (REMINDER_ORDERS, _reminder_variables),
+    'allCustomers (filtered)': (FILTERED_CUSTOMERS, _customer_variables),
+    'createOrder': (CREATE_ORDER, _create_order_variables),
+    'bulkCreateCustomers': (BULK_CREATE_CUSTOMERS, _bulk_customer_variables),
+    'updateLowStockProducts': (UPDATE_LOW_STOCK_PRODUCTS, _low_stock_variables),
+}
+
+
+# ---------------------------------------------------------
+# Seeding
+# ---------------------------------------------------------
+def seed(orders, products=max(PAGE_SIZES) * 4):
+    """Creates 'orders' orders of two items each, spread over the last 30
+    days, with one customer per ten orders, and their daily sales rollup.
+    Return:
+    	The fixtures the operations' variables refer to.
+    """
+    from crm.models import Customer, DailySalesRollup, Order, OrderItem, Product
+
+    customers = max(orders // 10, max(PAGE_SIZES))
+    now = datetime.now(timezone.utc)
+    customer_ids = [
+        customer.pk for customer in Customer.objects.bulk_create([
+            Customer(name=f'Customer {i}', email=f'customer{i}@example.com',
+                     phone=f'+1555{i:07d}')
+            for i in range(customers)
+        ], batch_size=SEED_BATCH)
+    ]
+    created_products = Product.objects.bulk_create([
+        Product(name=f'Product {i}', price=i % 50 + 1, stock=i) for i in range(products)
+    ])
+
+    for start in range(0, orders, SEED_BATCH):
+        batch = Order.objects.bulk_create([
+            Order(
+                customer_id_id=customer_ids[i % customers],
+                order_date=now - timedelta(minutes=i * 43200 // orders),
+            )
+            for i in range(start, min(start + SEED_BATCH, orders))
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, unit_price=product.price)
+            for i, order in enumerate(batch, start)
+            for product in (created_products[i % products],
+                            created_products[(i + 1) % products])
+        ])
+    Order.objects.recompute_totals()
+    DailySalesRollup.objects.rebuild()
+    return {
+        'customer_ids': customer_ids,
+        'product_ids': [product.pk for product in created_products],
+    }
+
+
+# ---------------------------------------------------------
+# Measuring
+# ---------------------------------------------------------
+def run_operation(client, name, size, run, fixtures):
+    """Posts one operation to /graphql and checks it succeeded.
+    Return:
+    	The number of SQL queries it issued, transaction control aside.
+    """
+    from django.db import connection
+
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        if not sql.startswith(TRANSACTION_CONTROL):
+            queries.append(sql)
+        return execute(sql, params, many, context)
+
+    document, variables = OPERATIONS[name]
+    with connection.execute_wrapper(count):
+        response = client.post(
+            '/graphql',
+            json.dumps({'query': document, 'variables': variables(size, run, fixtures)}),
+            content_type='application/json',
+        )
+    body = json.loads(response.content)
+    if response.status_code != 200 or body.get('errors'):
+        raise AssertionError(f"{name} failed: {body}")
+    result = next(iter(body['data'].values()))
+    if isinstance(result, dict) and result.get('success') is False:
+        raise AssertionError(f"{name} failed: {result}")
+    return len(queries)
+
+
+def query_counts(client, name, fixtures, sizes=PAGE_SIZES):
+    """Return:
+    	A dict mapping each page size to the query count of the operation.
+    """
+    return {size: run_operation(client, name, size, 0, fixtures) for size in sizes}
+
+
+def measure(client, name, fixtures, runs):
+    """Runs an operation 'runs' times at the largest page size.
+    Return:
+    	A dict with its query count, p50/p95 latency (ms) and peak memory (KiB).
+    """
+    size = max(PAGE_SIZES)
+    queries = run_operation(client, name, size, 1, fixtures)
+    latencies = []
+    for run in range(2, runs + 2):
+        start = time.perf_counter()
+        run_operation(client, name, size, run, fixtures)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    tracemalloc.start()
+    run_operation(client, name, size, runs + 2, fixtures)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'queries': queries,
+        'p50_ms': round(latencies[len(latencies) // 2], 2),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        'peak_kib': round(peak / 1024),
+    }
+
+
+def regressions(name, counts, stats, baseline, tolerance):
+    """Return:
+    	A list of messages, one per regression of the operation.
+    """
+    problems = []
+    if len(set(counts.values())) > 1:
+        problems.append(f"{name}: query count grows with page size {counts}")
+    if baseline is None:
+        return problems
+    if stats['queries'] > baseline['queries']:
+        problems.append(
+            f"{name}: {stats['queries']} queries, baseline {baseline['queries']}"
+        )
+    limit = baseline['p95_ms'] * (1 + tolerance)
+    if stats['p95_ms'] > limit:
+        problems.append(
+            f"{name}: p95 {stats['p95_ms']} ms, baseline {baseline['p95_ms']} ms "
+            f"(+{tolerance:.0%} allowed)"
+        )
+    return problems
+
+
+def main(scales, runs, tolerance, update_baseline):
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test import Client
+
+    settings.CRM_RESPONSE_CACHE = {**settings.CRM_RESPONSE_CACHE, 'ENABLED': False}
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    client = Client()
+    problems = []
+
+    print(f"{'orders':>8} {'operation':<24} {'queries':>8} {'p50 (ms)':>9} "
+          f"{'p95 (ms)':>9} {'peak (KiB)':>11}")
+    for orders in scales:
+        call_command('flush', interactive=False, verbosity=0)
+        fixtures = seed(orders)
+        scale_baseline = baseline.setdefault(str(orders), {})
+        for name in OPERATIONS:
+            counts = query_counts(client, name, fixtures)
+            stats = measure(client, name, fixtures, runs)
+            print(f"{orders:>8} {name:<24} {stats['queries']:>8} {stats['p50_ms']:>9.2f} "
+                  f"{stats['p95_ms']:>9.2f} {stats['peak_kib']:>11}")
+            if update_baseline:
+                scale_baseline[name] = stats
+            problems += regressions(
+                f"{orders} orders, {name}", counts, stats,
+                scale_baseline.get(name), tolerance,
+            )
+
+    if update_baseline:
+        BASELINE.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+    for problem in problems:
+        print(f"REGRESSION {problem}", file=sys.stderr)
+    return not problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('scales', nargs='*', type=int, default=[1000, 100000, 1000000])
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="Allowed p95 slowdown over the baseline (0.5: +50%%).")
+    parser.add_argument('--update-baseline', action='store_true')
+    arguments = parser.parse_args()
+
+    old_name = setup_database()
+    try:
+        passed = main(arguments.scales, arguments.runs, arguments.tolerance,
+                      arguments.update_baseline)
+    finally:
+        teardown_database(old_name)
+    sys.exit(0 if passed else 1)
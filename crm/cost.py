@@ -0,0 +1,178 @@
+"""
+'cost' estimates what an operation will cost before it runs, from the page
+sizes it asks for, the lists it expands and how deep it nests, so the view
+can refuse it before any SQL is issued.
+"""
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLList,
+    GraphQLObjectType,
+    InlineFragmentNode,
+    get_named_type,
+    get_nullable_type,
+    is_composite_type,
+)
+from graphql.execution.values import get_argument_values, get_variable_values
+from graphene_django.settings import graphene_settings
+
+
+def _is_connection(named_type):
+    return isinstance(named_type, GraphQLObjectType) and \
+        'edges' in named_type.fields and 'pageInfo' in named_type.fields
+
+
+def _capped_list_sizes():
+    """Returns the caps the list resolvers apply to their length ('first', or
+    the range of days of 'salesByDay').
+    """
+    return {
+        ('Query', 'searchCustomers'): settings.CRM_SEARCH_MAX_RESULTS,
+        ('Query', 'salesByProduct'): settings.CRM_SALES_MAX_RESULTS,
+        ('Query', 'salesByDay'): settings.CRM_SALES_BY_DAY_MAX_DAYS,
+    }
+
+
+# ---------------------------------------------------------
+# Walking the selection set
+# ---------------------------------------------------------
+class CostAnalysis:
+    """Walks one operation and adds up its estimated cost and depth.
+    Every object field costs 1, times the number of rows its parent lists
+    are expected to return; scalars are free. A connection multiplies its
+    sub-selection by 'first' or 'last' (the relay page limit when neither
+    is given), and a plain list by 'CRM_QUERY_DEFAULT_LIST_SIZE'.
+    Introspection fields are left out.
+    Attributes:
+    	cost: The estimated cost of the operation.
+    	depth: The deepest level of nested fields.
+    """
+
+    def __init__(self, schema, document, variables):
+        self.schema = schema
+        self.variables = variables
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        self.capped = _capped_list_sizes()
+        self.cost = 0
+        self.depth = 0
+
+    def analyze(self, operation):
+        root_type = self.schema.get_root_type(operation.operation)
+        self.cost, self.depth = self.selection_cost(root_type, operation.selection_set, 1)
+        return self
+
+    def fields(self, parent_type, selection_set):
+        """Yields (parent type, field node) for every field of 'selection_set',
+        expanding fragments in place.
+        """
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield parent_type, selection
+                continue
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment is None:
+                    continue
+            elif isinstance(selection, InlineFragmentNode):
+                fragment = selection
+            else:
+                continue
+            condition = fragment.type_condition
+            fragment_type = self.schema.get_type(condition.name.value) if condition else parent_type
+            yield from self.fields(fragment_type, fragment.selection_set)
+
+    def selection_cost(self, parent_type, selection_set, level):
+        """Return:
+        	A tuple (cost, depth) of 'selection_set' on 'parent_type'.
+        """
+        cost = depth = 0
+        for owner, node in self.fields(parent_type, selection_set):
+            name = node.name.value
+            if name.startswith('__') or not hasattr(owner, 'fields') or name not in owner.fields:
+                continue
+            field_def = owner.fields[name]
+            named_type = get_named_type(field_def.type)
+            depth = max(depth, level)
+            if not is_composite_type(named_type) or node.selection_set is None:
+                continue
+
+            child_cost, child_depth = self.selection_cost(
+                named_type, node.selection_set, level + 1
+            )
+            cost += 1 + self.multiplier(owner, node, field_def, named_type) * child_cost
+            depth = max(depth, child_depth)
+        return cost, depth
+
+    def multiplier(self, owner, node, field_def, named_type):
+        """Returns how many rows the field is expected to return.
+        """
+        if _is_connection(owner) and node.name.value == 'edges':
+            # The connection field already counted its page size.
+            return 1
+
+        is_list = isinstance(get_nullable_type(field_def.type), GraphQLList)
+        if not is_list and not _is_connection(named_type):
+            return 1
+
+        try:
+            args = get_argument_values(field_def, node, self.variables)
+        except GraphQLError:
+            args = {}
+        requested = args.get('first') or args.get('last')
+
+        cap = self.capped.get((owner.name, node.name.value))
+        if cap is not None:
+            return min(requested or cap, cap)
+        if _is_connection(named_type):
+            return requested or graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+        return requested or settings.CRM_QUERY_DEFAULT_LIST_SIZE
+
+
+# ---------------------------------------------------------
+# Entry point used by the GraphQL view
+# ---------------------------------------------------------
+def check_cost(schema, document, operation, variables):
+    """Estimates the cost of 'operation' and checks it against the budgets.
+    Args:
+    	schema: The 'GraphQLSchema' the document was validated against.
+    	document: The parsed document.
+    	operation: The operation about to run.
+    	variables: The raw variables sent with the request.
+    Return:
+    	A tuple (report for the response 'extensions', GraphQLError or None).
+    """
+    coerced = get_variable_values(
+        schema, operation.variable_definitions or (), variables or {}
+    )
+    if isinstance(coerced, list):
+        # Invalid variables; execution reports them before anything runs.
+        coerced = {}
+
+    analysis = CostAnalysis(schema, document, coerced).analyze(operation)
+    max_cost = settings.CRM_QUERY_MAX_COST
+    max_depth = settings.CRM_QUERY_MAX_DEPTH
+    report = {
+        'requestedCost': analysis.cost,
+        'maximumCost': max_cost,
+        'depth': analysis.depth,
+        'maximumDepth': max_depth,
+    }
+
+    if max_depth is not None and analysis.depth > max_depth:
+        return report, GraphQLError(
+            f"Query depth {analysis.depth} exceeds the maximum depth of {max_depth}.",
+            extensions={'code': 'QUERY_TOO_DEEP'},
+        )
+    if max_cost is not None and analysis.cost > max_cost:
+        return report, GraphQLError(
+            f"Query cost {analysis.cost} exceeds the maximum cost of {max_cost}.",
+            extensions={'code': 'QUERY_TOO_COMPLEX'},
+        )
+    return report, None
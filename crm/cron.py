@@ -1,8 +1,5 @@
 from datetime import datetime
-import requests
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
-import json
+from .executor import run_operation
 
 
 def update_low_stock():
@@ -18,45 +15,31 @@ def update_low_stock():
     }
     """
 
+    log_path = "/tmp/low_stock_updates_log.txt"
     try:
-        res = requests.post(
-            "http://localhost:8000/graphql",
-            json={"query": query},
-            timeout=5
-        )
+        data = run_operation(query).get("updateLowStockProducts") or {}
+        products = data.get("output") or []
+        success = data.get("success", "")
 
-        log_path = "/tmp/low_stock_updates_log.txt"
         with open(log_path, "a") as log:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            if res.ok:
-                data = res.json().get("data", {}).get("updateLowStockProducts", {})
-                products = data.get("output", [])
-                success = data.get("success", "")
-
-                log.write(f"{timestamp} - {success}\n")
-                for product in products:
-                    log.write(f"\tProduct: {product['name']} | New Stock: {product['stock']}\n")
-            else:
-                log.write(f"{timestamp} - Failed to execute mutation: {res.status_code}\n")
+            log.write(f"{timestamp} - {success}\n")
+            for product in products:
+                log.write(f"\tProduct: {product['name']} | New Stock: {product['stock']}\n")
     except Exception as e:
-        with open("/tmp/low_stock_updates_log.txt", "a") as log:
+        with open(log_path, "a") as log:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             log.write(f"{timestamp} - Exception: {str(e)}\n")
 
 
 def log_crm_heartbeat():
-    timestamp = datetime.now().strftime("%d/%m?%Y-%H:%M:%S")
+    timestamp = datetime.now().strftime("%d/%m/%Y-%H:%M:%S")
     status = "CRM is alive"
 
     try:
         # Optional: Ping GraphQL hello field
-        res = requests.post(
-            "http://localhost:8000/graphql",
-            json={"query": "{ hello }"},
-            timeout=3
-        )
-        if res.ok and res.json().get("data", {}).get("hello") == "Hello, GraphQL!":
+        data = run_operation("{ hello }")
+        if data.get("hello") == "Hello, GraphQL!":
             status = "CRM is alive and GraphQL responsive"
         else:
             status = "CRM is alive but GraphQL failed"
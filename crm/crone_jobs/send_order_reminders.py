@@ -1,55 +1,33 @@
 #!/usr/bin/env python3
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
-from datetime import datetime, timedelta
+"""
+Queues one reminder per customer who ordered in the last 7 days, through
+the paginated pipeline of 'crm.reminders'; a run interrupted by a crash is
+resumed by the next one. Orders are read in this process against the CRM
+schema; pass '--remote URL' to read them from a GraphQL endpoint instead.
+"""
+import argparse
 import os
+import sys
+from pathlib import Path
 
-# Define GraphQL endpoint
-transport = RequestHTTPTransport(
-    url='http://localhost:8000/graphql',
-    verify=False,
-    retries=3,
-)
-
-client = Client(transport=transport, fetch_schema_from_transport=False)
-
-# Calculate date range (last 7 days)
-today = datetime.today()
-seven_days_ago = today - timedelta(days=7)
-today_str = today.strftime('%Y-%m-%d')
-seven_days_ago_str = seven_days_ago.strftime('%Y-%m-%d')
-
-# GraphQL query to fetch recent orders
-query = gql(f"""
-query {{
-  allOrders(orderDate_Gte: "{seven_days_ago_str}", orderDate_Lte: "{today_str}") {{
-    edges {{
-      node {{
-        id
-        orderDate
-        customer {{
-          email
-        }}
-      }}
-    }}
-  }}
-}}
-""")
+# Run from anywhere (e.g. crontab): make the project importable.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
+
+import django
+
+django.setup()
+
+from crm.reminders import send_reminders
+
+
+parser = argparse.ArgumentParser(description="Remind the customers who ordered in the last 7 days.")
+parser.add_argument('--remote', metavar='URL', help="GraphQL endpoint to read the orders from.")
+arguments = parser.parse_args()
 
 try:
-    result = client.execute(query)
-    log_lines = []
-    for edge in result['allOrders']['edges']:
-        order = edge['node']
-        log_line = f"{datetime.now().isoformat()} - Order ID: {order['id']}, Customer Email: {order['customer']['email']}"
-        log_lines.append(log_line)
-
-    log_path = '/tmp/order_reminders_log.txt'
-    with open(log_path, 'a') as log_file:
-        for line in log_lines:
-            log_file.write(line + '\n')
-
-    print("Order reminders processed!")
+    run = send_reminders(days=7, remote=arguments.remote)
+    print(f"Order reminders processed! ({run.reminders.count()} customers)")
 
 except Exception as e:
     print("Error:", e)
@@ -0,0 +1,145 @@
+"""
+'documents' caches parsed and validated GraphQL documents, and resolves
+automatic persisted queries (APQ) sent as a sha256 hash.
+"""
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from django.conf import settings
+from django.core.cache import cache
+from graphql import parse
+from graphql.error import GraphQLError
+from graphql.validation import validate
+from graphene_django.settings import graphene_settings
+
+
+def query_hash(query):
+    """Returns the sha256 hex digest identifying a query string.
+    """
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+# ---------------------------------------------------------
+# LRU cache of parsed and validated documents
+# ---------------------------------------------------------
+class DocumentCache:
+    """Bounded LRU of parsed documents and their validation errors.
+    Entries are keyed by the schema, the validation rules and the query hash,
+    so the same query text is parsed and validated only once per process.
+    Attributes:
+    	maxsize: Number of documents kept before the least recently used is dropped.
+    	hits: Lookups answered from the cache.
+    	misses: Lookups that had to parse and validate.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, schema, query, validation_rules=None):
+        """Returns the parsed document of 'query' and its validation errors.
+        Args:
+        	schema: The 'GraphQLSchema' the document is validated against.
+        	query: The query string sent by the client.
+        	validation_rules: Optional extra validation rules.
+        Return:
+        	A tuple (document or None, list of GraphQL errors).
+        """
+        key = (id(schema), tuple(validation_rules or ()), query_hash(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = self._parse_and_validate(schema, query, validation_rules)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        """Drops every entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Returns the cache counters, e.g. for logging or monitoring.
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    @staticmethod
+    def _parse_and_validate(schema, query, validation_rules):
+        try:
+            document = parse(query)
+        except GraphQLError as error:
+            return None, [error]
+
+        errors = validate(
+            schema,
+            document,
+            validation_rules,
+            graphene_settings.MAX_VALIDATION_ERRORS,
+        )
+        return document, errors
+
+
+document_cache = DocumentCache(settings.CRM_DOCUMENT_CACHE_SIZE)
+
+
+# ---------------------------------------------------------
+# Automatic persisted queries
+# ---------------------------------------------------------
+def resolve_persisted_query(query, extensions):
+    """Applies the APQ protocol to the query of a request.
+    A request carrying both the query and its hash registers the query;
+    a request carrying only the hash is answered from the registrations.
+    Args:
+    	query: The query string sent by the client, if any.
+    	extensions: The 'extensions' object of the request, if any.
+    Return:
+    	A tuple (query string or None, GraphQLError or None).
+    """
+    persisted = (extensions or {}).get('persistedQuery')
+    if not persisted or not settings.CRM_PERSISTED_QUERIES:
+        return query, None
+
+    sha256 = persisted.get('sha256Hash')
+    if persisted.get('version') != 1 or not sha256:
+        return None, GraphQLError(
+            "Unsupported persisted query",
+            extensions={'code': 'PERSISTED_QUERY_NOT_SUPPORTED'},
+        )
+
+    key = f'crm:apq:{sha256}'
+    if query:
+        if query_hash(query) != sha256:
+            return None, GraphQLError(
+                "Provided sha256Hash does not match query",
+                extensions={'code': 'BAD_REQUEST'},
+            )
+        cache.set(key, query, timeout=None)
+        return query, None
+
+    query = cache.get(key)
+    if query is None:
+        return None, GraphQLError(
+            "PersistedQueryNotFound",
+            extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'},
+        )
+    return query, None
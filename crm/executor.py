@@ -0,0 +1,121 @@
+"""
+'executor' runs GraphQL operations for scheduled jobs (cron, Celery) inside
+the job's own process, against the schema the /graphql endpoint serves.
+Jobs then cost no HTTP round trip and no web worker, and keep working while
+the web tier is busy or down. A remote mode posting to an endpoint remains
+for jobs that must go through it.
+"""
+import requests
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from graphene_django.settings import graphene_settings
+from graphql import OperationType, execute, get_operation_ast
+from .documents import document_cache
+
+
+class OperationError(Exception):
+    """Raised when an operation run for a job returns errors.
+    Attributes:
+    	errors: The GraphQL errors, as formatted in a response body.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(error.get('message', str(error)) for error in errors))
+
+
+class JobContext:
+    """Stands in for the HTTP request as 'info.context' of a job's operation.
+    Per-operation state (loaders, trace) is attached to it like on a request.
+    Attributes:
+    	user: An anonymous user, as jobs act for no one.
+    	method: Always 'POST'.
+    	META: Empty request headers.
+    """
+
+    def __init__(self):
+        self.user = AnonymousUser()
+        self.method = 'POST'
+        self.META = {}
+
+
+# ---------------------------------------------------------
+# Running operations
+# ---------------------------------------------------------
+def _format_error(error):
+    return error.formatted if hasattr(error, 'formatted') else {'message': str(error)}
+
+
+def run_local(query, variables=None, operation_name=None):
+    """Executes an operation in this process.
+    The document is parsed and validated once per process, and mutations run
+    in one transaction, as they would behind the view.
+    Return:
+    	The 'data' of the result.
+    Raises:
+    	OperationError: The operation is invalid or returned errors.
+    """
+    schema = graphene_settings.SCHEMA.graphql_schema
+    document, errors = document_cache.get(schema, query)
+    if errors:
+        raise OperationError([_format_error(error) for error in errors])
+
+    operation = get_operation_ast(document, operation_name)
+    options = {
+        'context_value': JobContext(),
+        'variable_values': variables,
+        'operation_name': operation_name,
+    }
+    if operation is not None and operation.operation == OperationType.MUTATION:
+        with transaction.atomic():
+            result = execute(schema, document, **options)
+            if result.errors:
+                transaction.set_rollback(True)
+    else:
+        result = execute(schema, document, **options)
+
+    if result.errors:
+        raise OperationError([_format_error(error) for error in result.errors])
+    return result.data
+
+
+def run_remote(url, query, variables=None, operation_name=None, timeout=10):
+    """Posts an operation to a GraphQL endpoint.
+    Return:
+    	The 'data' of the response.
+    Raises:
+    	OperationError: The response carries errors.
+    	requests.RequestException: The endpoint could not be reached.
+    """
+    response = requests.post(
+        url,
+        json={'query': query, 'variables': variables, 'operationName': operation_name},
+        timeout=timeout,
+    )
+    try:
+        body = response.json()
+    except ValueError:
+        response.raise_for_status()
+        raise
+    if body.get('errors'):
+        raise OperationError(body['errors'])
+    response.raise_for_status()
+    return body.get('data')
+
+
+def run_operation(query, variables=None, operation_name=None, remote=None):
+    """Runs an operation for a job, in process unless a remote URL is given.
+    Args:
+    	query: The GraphQL document.
+    	variables: The operation's variables.
+    	operation_name: The operation to run in a multi-operation document.
+    	remote: Endpoint URL to post to instead; defaults to 'CRM_JOBS_GRAPHQL_URL'
+    		(None runs the operation in process).
+    Return:
+    	The 'data' of the result.
+    """
+    remote = remote or settings.CRM_JOBS_GRAPHQL_URL
+    if remote:
+        return run_remote(remote, query, variables, operation_name)
+    return run_local(query, variables, operation_name)
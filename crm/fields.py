@@ -0,0 +1,178 @@
+"""
+'fields' holds the connection fields shared by the CRM's GraphQL types.
+"""
+import base64
+import json
+from functools import partial
+from django.conf import settings
+from django.db.models import Q
+from graphene import Boolean
+from graphene.relay import PageInfo
+from graphene_django.filter import DjangoFilterConnectionField
+from .loaders import get_loaders
+
+
+# ----------------------------------------------------------
+# Opaque keyset cursors
+# ----------------------------------------------------------
+def encode_keyset_cursor(values):
+    """Encodes the sort key of a row into an opaque cursor.
+    """
+    payload = json.dumps(['keyset', values], default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_keyset_cursor(cursor, model, fields):
+    """Decodes a cursor made by 'encode_keyset_cursor' back into field values.
+    Raises:
+    	ValueError: The cursor is malformed or was made for another sort key.
+    """
+    try:
+        tag, values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"Invalid keyset cursor: {cursor}") from error
+
+    if tag != 'keyset' or len(values) != len(fields):
+        raise ValueError(f"Invalid keyset cursor: {cursor}")
+    return [
+        model._meta.get_field(field).to_python(value)
+        for field, value in zip(fields, values)
+    ]
+
+
+def keyset_filter(fields, values, lookup):
+    """Builds the predicate selecting rows strictly past 'values' in key order.
+    Args:
+    	fields: The sort key, e.g. ('order_date', 'id').
+    	values: The key of the row the cursor points at.
+    	lookup: 'gt' to seek forward, 'lt' to seek backward.
+    """
+    predicate = Q()
+    for position, field in enumerate(fields):
+        equal = {name: value for name, value in zip(fields[:position], values)}
+        predicate |= Q(**equal, **{f'{field}__{lookup}': values[position]})
+    return predicate
+
+
+# ----------------------------------------------------------
+# Filterable connection feeding the request's DataLoaders
+# ----------------------------------------------------------
+class CRMConnectionField(DjangoFilterConnectionField):
+    """Filterable relay connection that batches the relations of its page.
+    Once the page is sliced, its nodes are queued on the request's loaders so
+    the relation resolvers of every node share one query per relation.
+    When built with 'keyset_fields', clients may pass 'keyset: true' to
+    paginate by seeking on that sort key instead of OFFSET slicing.
+    Inheritance:
+    	DjangoFilterConnectionField: Applies the filterset and the pagination.
+    """
+
+    def __init__(self, type_, *args, keyset_fields=None, **kwargs):
+        self.keyset_fields = tuple(keyset_fields or ())
+        if self.keyset_fields:
+            kwargs.setdefault('keyset', Boolean(
+                description="Paginate with keyset cursors ordered by "
+                            + ", ".join(self.keyset_fields) + "."
+            ))
+        super().__init__(type_, *args, **kwargs)
+
+    @classmethod
+    def connection_resolver(cls, resolver, connection, default_manager,
+                            queryset_resolver, max_limit, enforce_first_or_last,
+                            root, info, **args):
+        """Resolves the page and queues its nodes on the request's loaders.
+        Args:
+        	info: Contains useful context associated with the request made.
+        Return:
+        	The resolved connection instance.
+        """
+        resolved = super().connection_resolver(
+            resolver, connection, default_manager, queryset_resolver,
+            max_limit, enforce_first_or_last, root, info, **args
+        )
+        get_loaders(info.context).queue_nodes(
+            [edge.node for edge in resolved.edges]
+        )
+        return resolved
+
+    @classmethod
+    def keyset_connection_resolver(cls, resolver, connection, default_manager,
+                                   queryset_resolver, keyset_fields, root, info,
+                                   **args):
+        """Resolves one page by seeking past the cursor on 'keyset_fields'.
+        No COUNT is issued and every page costs one indexed range scan.
+        Args:
+        	keyset_fields: The unique sort key the cursors encode.
+        	info: Contains useful context associated with the request made.
+        Return:
+        	The resolved connection instance.
+        """
+        page_size = settings.CRM_KEYSET_MAX_PAGE_SIZE
+        first, last = args.get('first'), args.get('last')
+        backward = last is not None and first is None
+        limit = max(0, min(last if backward else (first or page_size), page_size))
+
+        iterable = resolver(root, info, **args)
+        if iterable is None:
+            iterable = default_manager
+        queryset = queryset_resolver(connection, iterable, info, args)
+
+        loaded, deferred = queryset.query.deferred_loading
+        if loaded and not deferred:
+            # The cursors are built from the sort key, so it must be loaded.
+            queryset = queryset.only(*loaded, *keyset_fields)
+
+        model = queryset.model
+        cursor = args.get('before') if backward else args.get('after')
+        if cursor:
+            values = decode_keyset_cursor(cursor, model, keyset_fields)
+            queryset = queryset.filter(
+                keyset_filter(keyset_fields, values, 'lt' if backward else 'gt')
+            )
+
+        ordering = [f'-{field}' if backward else field for field in keyset_fields]
+        rows = list(queryset.order_by(*ordering)[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+
+        edges = [
+            connection.Edge(node=row, cursor=encode_keyset_cursor(
+                [getattr(row, field) for field in keyset_fields]
+            ))
+            for row in rows
+        ]
+        get_loaders(info.context).queue_nodes(rows)
+        return connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_more if backward else bool(cursor),
+                has_next_page=bool(cursor) if backward else has_more,
+            ),
+        )
+
+    def wrap_resolve(self, parent_resolver):
+        """Dispatches to the keyset resolver when the client asks for it.
+        """
+        offset_resolver = super().wrap_resolve(parent_resolver)
+        if not self.keyset_fields:
+            return offset_resolver
+
+        keyset_resolver = partial(
+            self.keyset_connection_resolver,
+            self.resolver or parent_resolver,
+            self.connection_type,
+            self.get_manager(),
+            self.get_queryset_resolver(),
+            self.keyset_fields,
+        )
+
+        def resolve(root, info, keyset=False, **args):
+            if keyset:
+                return keyset_resolver(root, info, **args)
+            return offset_resolver(root, info, **args)
+
+        return resolve
@@ -1,6 +1,7 @@
 import django_filters
 from .models import Customer, Product, Order
 from django.db.models import Q
+from .search import filter_search
 
 
 class CustomerFilter(django_filters.FilterSet):
@@ -15,17 +16,26 @@ class CustomerFilter(django_filters.FilterSet):
         lookup_expr='lte'
     )
     phone_pattern = django_filters.CharFilter(method='filter_phone_pattern')
+    search = django_filters.CharFilter(method='filter_full_text')
 
     def filter_phone_pattern(self, queryset, name, value):
-        return queryset.filter(phone__startswith=value)
+        # The range seeks the phone index, which LIKE 'value%' only does
+        # under a binary collation. It matches exactly the prefix only under
+        # such a collation too, so 'startswith' rechecks the rows it finds.
+        upper = value[:-1] + chr(ord(value[-1]) + 1)
+        return queryset.filter(phone__gte=value, phone__lt=upper, phone__startswith=value)
+
+    def filter_full_text(self, queryset, name, value):
+        return filter_search(queryset, value)
 
     class Meta:
         model = Customer
         fields = [
             'name', 'email',
             'phone_pattern',
+            'search',
             'created_at__gte',
-            'created_at_lte',
+            'created_at__lte',
         ]
 
 
@@ -35,17 +45,22 @@ class ProductFilter(django_filters.FilterSet):
     price__lte = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
     stock__gte = django_filters.NumberFilter(field_name='stock', lookup_expr='gte')
     stock__lte = django_filters.NumberFilter(field_name='stock', lookup_expr='lte')
-    low_stock = django_filter.BooelanFilter(method='filter_low_stock')
+    low_stock = django_filters.BooleanFilter(method='filter_low_stock')
+    search = django_filters.CharFilter(method='filter_full_text')
 
     def filter_low_stock(self, queryset, name, value):
         return queryset.filter(stock__lt=10) if value else queryset
 
+    def filter_full_text(self, queryset, name, value):
+        return filter_search(queryset, value)
+
     class Meta:
         model = Product
         fields = [
             'name',
             'price__gte', 'price__lte',
             'stock__gte', 'stock__lte',
+            'search',
         ]
 
 
@@ -54,16 +69,15 @@ class OrderFilter(django_filters.FilterSet):
     total_amount__lte = django_filters.NumberFilter(field_name='total_amount', lookup_expr='lte')
     order_date__gte = django_filters.DateTimeFilter(field_name='order_date', lookup_expr='gte')
     order_date__lte = django_filters.DateTimeFilter(field_name='order_date', lookup_expr='lte')
-    low_order_date = django_filter.BooelanFilter(method='filter_low_order_date')
-    customer_name = django_filters.CharFilter(field_name='customer__name', lookup_expr='icontains')
+    customer_name = django_filters.CharFilter(field_name='customer_id__name', lookup_expr='icontains')
     product_name = django_filters.CharFilter(method='filter_product_name')
     product_id = django_filters.NumberFilter(method='filter_product_id')
 
     def filter_product_name(self, queryset, name, value):
-        return queryset.filter(products_name__icontains=value)
+        return queryset.filter(product_id__name__icontains=value).distinct()
 
     def filter_product_id(self, queryset, name, value):
-        return queryset.filter(products__id=value)
+        return queryset.filter(product_id__id=value)
 
 
     class Meta:
@@ -0,0 +1,157 @@
+"""
+'loaders' batches the relation lookups issued while resolving a single request.
+"""
+from collections import defaultdict
+from .models import Customer, Order, OrderItem
+
+
+# ---------------------------------------------------------
+# Synchronous, request-scoped batch loader
+# ---------------------------------------------------------
+class DataLoader:
+    """Collects keys and fetches them in as few queries as possible.
+    Keys queued ahead of time (e.g. every node on a connection page) are
+    loaded together the first time any one of them is requested, so the
+    per-node resolvers of a page cost a single query overall.
+    Attributes:
+    	batch_load_fn: Callable mapping a list of keys to a dict of key -> value.
+    	default: Value returned for keys the batch function did not yield.
+    """
+
+    def __init__(self, batch_load_fn, default=None):
+        self.batch_load_fn = batch_load_fn
+        self.default = default
+        self._cache = {}
+        self._queue = []
+
+    def prime(self, key, value):
+        """Stores an already known value, skipping any future fetch.
+        """
+        self._cache.setdefault(key, value)
+
+    def queue(self, keys):
+        """Schedules keys to be fetched along with the next cache miss.
+        """
+        self._queue.extend(key for key in keys if key not in self._cache)
+
+    def load(self, key):
+        """Returns the value for 'key', dispatching the pending batch on a miss.
+        """
+        if key not in self._cache:
+            self._queue.append(key)
+            self.dispatch()
+        return self._cache.get(key, self.default)
+
+    def load_many(self, keys):
+        """Returns the values for 'keys', fetching all the missing ones at once.
+        """
+        self.queue(keys)
+        self.dispatch()
+        return [self._cache.get(key, self.default) for key in keys]
+
+    def dispatch(self):
+        """Fetches every queued key in a single call to the batch function.
+        """
+        keys = list(dict.fromkeys(
+            key for key in self._queue if key not in self._cache
+        ))
+        self._queue = []
+        if not keys:
+            return
+
+        results = self.batch_load_fn(keys)
+        for key in keys:
+            self._cache[key] = results.get(key, self.default)
+
+
+# ---------------------------------------------------------
+# Loaders for the relations exposed by 'crm.types'
+# ---------------------------------------------------------
+class CRMLoaders:
+    """Bundle of the loaders shared by every resolver of one request.
+    Attributes:
+    	customer: Customer instances keyed by primary key.
+    	products_by_order: Lists of products keyed by order primary key.
+    	items_by_order: Lists of line items (with their product) keyed by order primary key.
+    	orders_by_customer: Lists of orders keyed by customer primary key.
+    """
+
+    def __init__(self):
+        self.customer = DataLoader(self._load_customers)
+        self.products_by_order = DataLoader(self._load_products_by_order,
+                                            default=())
+        self.items_by_order = DataLoader(self._load_items_by_order, default=())
+        self.orders_by_customer = DataLoader(self._load_orders_by_customer,
+                                             default=())
+
+    def queue_nodes(self, nodes):
+        """Schedules the relations of a page of nodes for batched loading.
+        Args:
+        	nodes: Model instances about to be resolved by the GraphQL types.
+        """
+        orders = [node for node in nodes if isinstance(node, Order)]
+        customers = [node for node in nodes if isinstance(node, Customer)]
+        if orders:
+            self.queue_orders(orders)
+        for customer in customers:
+            self.customer.prime(customer.pk, customer)
+        if customers:
+            self.orders_by_customer.queue(customer.pk for customer in customers)
+
+    def queue_orders(self, orders):
+        """Schedules the customer and products of each order.
+        """
+        self.customer.queue(
+            order.customer_id_id for order in orders
+            if 'customer_id_id' in order.__dict__
+        )
+        self.products_by_order.queue(order.pk for order in orders)
+        self.items_by_order.queue(order.pk for order in orders)
+
+    def _load_customers(self, keys):
+        return Customer.objects.in_bulk(keys)
+
+    def _load_products_by_order(self, keys):
+        # Shares the line items query, so 'productId' and 'items' cost one query.
+        return {
+            key: [item.product for item in items]
+            for key, items in zip(keys, self.items_by_order.load_many(keys))
+        }
+
+    def _load_items_by_order(self, keys):
+        items = OrderItem.objects.filter(order_id__in=keys).select_related('product')
+
+        by_order = defaultdict(list)
+        for item in items.order_by('pk'):
+            by_order[item.order_id].append(item)
+        return by_order
+
+    def _load_orders_by_customer(self, keys):
+        orders = defaultdict(list)
+        for order in Order.objects.filter(customer_id__in=keys).order_by('pk'):
+            orders[order.customer_id_id].append(order)
+
+        # Orders reached through a customer are resolved as a page too.
+        self.queue_orders(
+            [order for page in orders.values() for order in page]
+        )
+        return orders
+
+
+def get_loaders(context):
+    """Returns the loaders attached to the request context, creating them once.
+    Args:
+    	context: The 'info.context' of the running operation (usually the request).
+    Return:
+    	The 'CRMLoaders' instance shared by the whole request (every operation
+    	of a batch, but for the queries the async view runs concurrently).
+    """
+    if isinstance(context, dict):
+        return context.setdefault('crm_loaders', CRMLoaders())
+
+    loaders = getattr(context, 'crm_loaders', None)
+    if loaders is None:
+        loaders = CRMLoaders()
+        if context is not None:
+            context.crm_loaders = loaders
+    return loaders
@@ -0,0 +1,63 @@
+"""
+'purge_inactive_customers' deletes the customers who never ordered and were
+created more than '--days' days ago, in small committed batches (see
+'crm.purge'). An interrupted purge is resumed by the next invocation.
+Usage: python manage.py purge_inactive_customers [--days 365] [--dry-run]
+"""
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from crm.purge import inactive_customers, pending_purge, purge_batches, start_purge
+
+
+class Command(BaseCommand):
+    """Deletes inactive customers batch by batch, or counts them with '--dry-run'.
+    Inheritance:
+    	BaseCommand: Parses the options and runs 'handle'.
+    """
+    help = "Deletes the customers without orders created more than --days days ago."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help="Purge customers created more than this many days ago (default 365).",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help="Customers deleted per transaction (default CRM_PURGE_BATCH_SIZE).",
+        )
+        parser.add_argument(
+            '--pause', type=float, default=None,
+            help="Seconds to sleep between batches (default CRM_PURGE_PAUSE).",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only count the customers the purge would delete.",
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] <= 0:
+            raise CommandError("--days must be positive.")
+        if options['batch_size'] is not None and options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be positive.")
+
+        run = pending_purge()
+        if options['dry_run']:
+            if run is None:
+                count = inactive_customers(timezone.now() - timedelta(days=options['days'])).count()
+            else:
+                count = inactive_customers(run.cutoff, run.last_pk).count()
+            self.stdout.write(str(count))
+            return
+
+        if run is None:
+            run = start_purge(options['days'])
+        else:
+            self.stdout.write(
+                f"Resuming the purge of customers created before {run.cutoff:%Y-%m-%d %H:%M} "
+                f"({run.deleted} deleted so far)."
+            )
+        for deleted in purge_batches(run, options['batch_size'], options['pause']):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  deleted {deleted} (up to id {run.last_pk})")
+        self.stdout.write(str(run.deleted))
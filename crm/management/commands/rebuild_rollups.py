@@ -0,0 +1,41 @@
+"""
+'rebuild_rollups' recomputes the 'DailySalesRollup' rows from the orders:
+a backfill after loading orders outside the mutations, or a repair after
+editing them by hand.
+Usage: python manage.py rebuild_rollups [--from 2025-01-01] [--to 2025-12-31]
+"""
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from crm.models import DailySalesRollup
+from crm.response_cache import invalidate_models
+
+
+class Command(BaseCommand):
+    """Rebuilds the daily sales rollup of a range of days, or of every day.
+    Inheritance:
+    	BaseCommand: Parses the options and runs 'handle'.
+    """
+    help = "Recomputes the daily sales rollup from the orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from', dest='since', type=date.fromisoformat, default=None,
+            help="First day to rebuild (default: the first order's).",
+        )
+        parser.add_argument(
+            '--to', dest='until', type=date.fromisoformat, default=None,
+            help="Last day to rebuild (default: the last order's).",
+        )
+
+    def handle(self, *args, **options):
+        since, until = options['since'], options['until']
+        if since and until and since > until:
+            raise CommandError("--from must not be after --to.")
+
+        started = time.perf_counter()
+        days = DailySalesRollup.objects.rebuild(since, until)
+        invalidate_models(DailySalesRollup)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {days} days in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,377 @@
+"""
+'seed_crm' fills the CRM tables with synthetic customers, products and
+orders for load testing. The same '--seed' and '--end-date' give the same
+rows on every run.
+Usage: python manage.py seed_crm --customers 100000 --products 5000 --orders 1000000
+"""
+import argparse
+import random
+import time
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from itertools import accumulate, islice
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import DateTimeField, Max
+from crm.models import (
+    CrmReport, Customer, DailySalesRollup, Order, OrderItem, Product, PurgeRun,
+    Reminder, ReminderRun,
+)
+from crm.response_cache import invalidate_models
+from crm.search import install_search_index, uninstall_search_index
+
+
+FIRST_NAMES = (
+    'Alice', 'Bob', 'Carla', 'David', 'Emma', 'Farid', 'Grace', 'Hugo', 'Ines',
+    'Jamal', 'Kofi', 'Lena', 'Mateo', 'Nadia', 'Oscar', 'Priya', 'Quentin',
+    'Rosa', 'Sami', 'Tara', 'Uche', 'Vera', 'Wei', 'Yara', 'Zane',
+)
+LAST_NAMES = (
+    'Adeyemi', 'Brown', 'Chen', 'Dubois', 'Evans', 'Fischer', 'Garcia', 'Haddad',
+    'Ivanova', 'Johnson', 'Kim', 'Lopez', 'Mensah', 'Nakamura', 'Okafor', 'Patel',
+    'Rossi', 'Silva', 'Tanaka', 'Usman', 'Virtanen', 'Williams', 'Young',
+)
+ADJECTIVES = (
+    'Compact', 'Deluxe', 'Eco', 'Classic', 'Smart', 'Portable', 'Wireless',
+    'Ergonomic', 'Premium', 'Basic', 'Rugged', 'Slim',
+)
+NOUNS = (
+    'Laptop', 'Phone', 'Monitor', 'Keyboard', 'Mouse', 'Headset', 'Speaker',
+    'Camera', 'Router', 'Tablet', 'Charger', 'Desk', 'Chair', 'Lamp',
+)
+
+# Columns of the row tuples the generators yield, per model.
+CUSTOMER_COLUMNS = ('id', 'name', 'email', 'phone', 'created_at')
+PRODUCT_COLUMNS = ('id', 'name', 'price', 'stock')
+ORDER_COLUMNS = ('id', 'customer_id', 'order_date', 'total_amount')
+ORDER_ITEM_COLUMNS = ('id', 'order', 'product', 'quantity', 'unit_price')
+
+# Every table '--clear' empties, children before their parents.
+CLEARED_MODELS = (
+    Reminder, ReminderRun, OrderItem, Order, DailySalesRollup,
+    PurgeRun, CrmReport, Product, Customer,
+)
+
+# SQLite pragmas set for the load, then restored.
+SQLITE_PRAGMAS = {
+    'synchronous': 'OFF',
+    'journal_mode': 'MEMORY',
+    'temp_store': 'MEMORY',
+    'cache_size': '-262144',
+}
+
+
+def _bounds(value):
+    """Parses 'MIN-MAX' (or a single 'N') into a pair of non-negative ints.
+    """
+    low, _, high = value.partition('-')
+    try:
+        low = int(low)
+        high = int(high) if high else low
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected MIN-MAX, got '{value}'.")
+    if low < 0 or high < low:
+        raise argparse.ArgumentTypeError(f"Invalid range '{value}'.")
+    return low, high
+
+
+def _picker(rng, count, skew):
+    """Returns a function drawing an index in [0, count).
+    A skew of 0 draws uniformly; a larger skew follows a Zipf-like law where
+    index i is drawn in proportion to 1 / (i + 1) ** skew.
+    """
+    if not skew:
+        return lambda: rng.randrange(count)
+    weights = list(accumulate(1 / (i + 1) ** skew for i in range(count)))
+    total = weights[-1]
+    return lambda: min(bisect(weights, rng.random() * total), count - 1)
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _next_pk(model, using):
+    return (model.objects.using(using).aggregate(Max('pk'))['pk__max'] or 0) + 1
+
+
+# ---------------------------------------------------------
+# Loading context
+# ---------------------------------------------------------
+@contextmanager
+def fast_load(connection):
+    """Runs the load in one transaction with the backend's bulk-load settings:
+    relaxed syncing on SQLite and PostgreSQL, no unique and foreign key checks
+    on MySQL. Whatever was changed is restored afterwards.
+    """
+    vendor = connection.vendor
+    previous = {}
+    with connection.cursor() as cursor:
+        # Neither can be changed inside a transaction, e.g. under a test case.
+        if vendor == 'sqlite' and not connection.in_atomic_block:
+            for pragma, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {pragma}')
+                previous[pragma] = cursor.fetchone()[0]
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+        elif vendor == 'mysql' and not connection.in_atomic_block:
+            cursor.execute('SET SESSION unique_checks = 0, foreign_key_checks = 0')
+            previous['mysql'] = True
+    try:
+        with transaction.atomic(using=connection.alias):
+            if vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL synchronous_commit = off')
+            yield
+    finally:
+        with connection.cursor() as cursor:
+            if previous.pop('mysql', False):
+                cursor.execute('SET SESSION unique_checks = 1, foreign_key_checks = 1')
+            for pragma, value in previous.items():
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+# ---------------------------------------------------------
+# Command
+# ---------------------------------------------------------
+class Command(BaseCommand):
+    """Bulk-loads synthetic CRM data, deterministically from '--seed'.
+    Primary keys are assigned up front, so order lines can point at their
+    orders without reading ids back; they go straight into the 'OrderItem'
+    through table with totals computed on the way. Rows are generated as
+    tuples and written with one prepared INSERT per batch, which keeps the
+    generated 'created_at' values. The search index is dropped for the load
+    and rebuilt once, and the daily sales rollup is rebuilt from the orders
+    at the end.
+    Inheritance:
+    	BaseCommand: Parses the options and runs 'handle'.
+    """
+    help = "Generates synthetic customers, products and orders for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=10000)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument(
+            '--items', type=_bounds, default=(1, 5), metavar='MIN-MAX',
+            help="Distinct products per order (default 1-5).",
+        )
+        parser.add_argument(
+            '--quantity', type=_bounds, default=(1, 3), metavar='MIN-MAX',
+            help="Quantity of each order line (default 1-3).",
+        )
+        parser.add_argument(
+            '--stock', type=_bounds, default=(0, 500), metavar='MIN-MAX',
+            help="Stock level of each product (default 0-500).",
+        )
+        parser.add_argument(
+            '--customer-skew', type=float, default=0.5,
+            help="Zipf exponent of orders per customer; 0 spreads them evenly.",
+        )
+        parser.add_argument(
+            '--product-skew', type=float, default=0.8,
+            help="Zipf exponent of product popularity; 0 spreads it evenly.",
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help="Orders and sign-ups are spread over this many days.",
+        )
+        parser.add_argument(
+            '--end-date', type=date.fromisoformat, default=None,
+            help="Last day of the spread (default: today, UTC).",
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help="Delete every existing CRM row first, reminders, purges and reports included.",
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options['orders'] and not (options['customers'] and options['products']):
+            raise CommandError("Orders need at least one customer and one product.")
+        if options['batch_size'] <= 0 or options['days'] <= 0:
+            raise CommandError("--batch-size and --days must be positive.")
+
+        using = options['database']
+        connection = connections[using]
+        rng = random.Random(options['seed'])
+        end_date = options['end_date'] or datetime.now(timezone.utc).date()
+        self.end = datetime.combine(end_date, datetime.min.time(), timezone.utc) \
+            + timedelta(days=1)
+        self.span = options['days'] * 86400
+        self.batch_size = options['batch_size']
+        self.using = using
+        self.connection = connection
+
+        started = time.perf_counter()
+        with fast_load(connection):
+            uninstall_search_index(connection)
+            if options['clear']:
+                self.clear()
+
+            customers = list(self.customers(
+                rng, options['customers'], _next_pk(Customer, using)
+            ))
+            self.load('customers', Customer, CUSTOMER_COLUMNS, customers)
+            products = list(self.products(
+                rng, options['products'], options['stock'], _next_pk(Product, using)
+            ))
+            self.load('products', Product, PRODUCT_COLUMNS, products)
+            self.load_orders(
+                rng, options,
+                [customer[0] for customer in customers],
+                [(product[0], product[2]) for product in products],
+            )
+
+            self.reset_sequences()
+            self.stdout.write("Rebuilding the search index...")
+            install_search_index(connection)
+            self.stdout.write("Rebuilding the daily sales rollup...")
+            DailySalesRollup.objects.db_manager(using).rebuild()
+
+        invalidate_models(*CLEARED_MODELS)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded in {time.perf_counter() - started:.1f}s."
+        ))
+
+    # -----------------------------------------------------
+    # Row generators, yielding tuples in the '*_COLUMNS' order
+    # -----------------------------------------------------
+    def customers(self, rng, count, first_pk):
+        for pk in range(first_pk, first_pk + count):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            yield (
+                pk,
+                f'{first} {last}',
+                f'{first}.{last}.{pk}@example.com'.lower(),
+                None if rng.random() < 0.2 else f'+1{rng.randrange(10 ** 10):010d}',
+                self.end - timedelta(seconds=rng.random() * self.span),
+            )
+
+    def products(self, rng, count, stock, first_pk):
+        for pk in range(first_pk, first_pk + count):
+            price = min(max(rng.lognormvariate(3.5, 1.0), 1.0), 5000.0)
+            yield (
+                pk,
+                f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {pk}',
+                Decimal(f'{price:.2f}'),
+                rng.randint(*stock),
+            )
+
+    def orders(self, rng, options, customer_pks, products):
+        """Yields (order, its lines), the order total already summed.
+        Order dates grow with the primary key, as they do in production,
+        which also keeps the date indexes appending rather than splitting.
+        """
+        pick_customer = _picker(rng, len(customer_pks), options['customer_skew'])
+        pick_product = _picker(rng, len(products), options['product_skew'])
+        low, high = options['items']
+        high = min(high, len(products))
+        low = min(low, high)
+        count = options['orders']
+        step = self.span / count
+        start = self.end - timedelta(seconds=self.span)
+        order_pk = _next_pk(Order, self.using)
+        item_pk = _next_pk(OrderItem, self.using)
+
+        for position in range(count):
+            wanted = rng.randint(low, high)
+            chosen = set()
+            # Popular products come up again and again; give up after a few
+            # draws rather than forcing rare ones in.
+            for _ in range(wanted * 4):
+                if len(chosen) == wanted:
+                    break
+                chosen.add(pick_product())
+
+            pk = order_pk + position
+            lines = []
+            total = Decimal('0.00')
+            for index in sorted(chosen):
+                product_pk, price = products[index]
+                quantity = rng.randint(*options['quantity'])
+                total += quantity * price
+                lines.append((item_pk, pk, product_pk, quantity, price))
+                item_pk += 1
+
+            order_date = start + timedelta(seconds=(position + rng.random()) * step)
+            yield (pk, customer_pks[pick_customer()], order_date, total), lines
+
+    # -----------------------------------------------------
+    # Writing
+    # -----------------------------------------------------
+    def write(self, model, columns, rows):
+        """Inserts one batch of row tuples with one prepared INSERT.
+        The values go in as generated: no 'pre_save', so 'auto_now_add'
+        does not stamp the customers with the current time. MySQL drivers
+        fold the batch into multi-row INSERTs and psycopg pipelines it.
+        """
+        fields = [model._meta.get_field(name) for name in columns]
+        quote = self.connection.ops.quote_name
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(model._meta.db_table),
+            ', '.join(quote(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+        # Decimals are generated with two places and go to the driver as
+        # they are; only datetimes need the backend's conversion.
+        adapted = [
+            position for position, field in enumerate(fields)
+            if isinstance(field, DateTimeField)
+        ]
+        if adapted:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for position in adapted:
+                    row[position] = fields[position].get_db_prep_save(
+                        row[position], self.connection
+                    )
+        with self.connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def load(self, label, model, columns, rows):
+        started = time.perf_counter()
+        for batch in _batches(rows, self.batch_size):
+            self.write(model, columns, batch)
+        self.report(label, len(rows), started)
+
+    def load_orders(self, rng, options, customer_pks, products):
+        if not options['orders']:
+            return
+        started = time.perf_counter()
+        lines = 0
+        for batch in _batches(self.orders(rng, options, customer_pks, products),
+                              self.batch_size):
+            self.write(Order, ORDER_COLUMNS, [order for order, _ in batch])
+            items = [item for _, order_items in batch for item in order_items]
+            self.write(OrderItem, ORDER_ITEM_COLUMNS, items)
+            lines += len(items)
+        self.report('orders', options['orders'], started)
+        self.stdout.write(f"  with {lines} order lines")
+
+    def clear(self):
+        quote = self.connection.ops.quote_name
+        with self.connection.cursor() as cursor:
+            for model in CLEARED_MODELS:
+                cursor.execute(f'DELETE FROM {quote(model._meta.db_table)}')
+
+    def reset_sequences(self):
+        """Moves the id sequences past the explicitly assigned keys.
+        """
+        statements = self.connection.ops.sequence_reset_sql(
+            no_style(), [Customer, Product, Order, OrderItem]
+        )
+        with self.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def report(self, label, count, started):
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(f"{count:>10} {label:<10} {elapsed:>8.1f}s {rate:>10.0f} rows/s")
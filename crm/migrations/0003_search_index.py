@@ -0,0 +1,73 @@
+from django.db import migrations
+
+# The search index as this migration created it, frozen here so later
+# changes to 'crm.search' do not change what the migration does.
+SQLITE_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS crm_customer_fts USING fts5("
+    "name, email, content='crm_customer', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS crm_customer_fts_ai AFTER INSERT ON crm_customer BEGIN "
+    "INSERT INTO crm_customer_fts(rowid, name, email) VALUES (new.id, new.name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS crm_customer_fts_ad AFTER DELETE ON crm_customer BEGIN "
+    "INSERT INTO crm_customer_fts(crm_customer_fts, rowid, name, email) "
+    "VALUES ('delete', old.id, old.name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS crm_customer_fts_au AFTER UPDATE OF name, email ON crm_customer BEGIN "
+    "INSERT INTO crm_customer_fts(crm_customer_fts, rowid, name, email) "
+    "VALUES ('delete', old.id, old.name, old.email); "
+    "INSERT INTO crm_customer_fts(rowid, name, email) VALUES (new.id, new.name, new.email); END",
+    "INSERT INTO crm_customer_fts(crm_customer_fts) VALUES ('rebuild')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS crm_product_fts USING fts5("
+    "name, content='crm_product', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS crm_product_fts_ai AFTER INSERT ON crm_product BEGIN "
+    "INSERT INTO crm_product_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS crm_product_fts_ad AFTER DELETE ON crm_product BEGIN "
+    "INSERT INTO crm_product_fts(crm_product_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS crm_product_fts_au AFTER UPDATE OF name ON crm_product BEGIN "
+    "INSERT INTO crm_product_fts(crm_product_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO crm_product_fts(rowid, name) VALUES (new.id, new.name); END",
+    "INSERT INTO crm_product_fts(crm_product_fts) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}"
+    for table in ('crm_customer', 'crm_product') for suffix in ('ai', 'ad', 'au')
+] + [
+    "DROP TABLE IF EXISTS crm_customer_fts",
+    "DROP TABLE IF EXISTS crm_product_fts",
+]
+
+MYSQL_INSTALL = [
+    "ALTER TABLE crm_customer ADD FULLTEXT INDEX crm_customer_search (name, email)",
+    "ALTER TABLE crm_product ADD FULLTEXT INDEX crm_product_search (name)",
+]
+
+MYSQL_UNINSTALL = [
+    "ALTER TABLE crm_customer DROP INDEX crm_customer_search",
+    "ALTER TABLE crm_product DROP INDEX crm_product_search",
+]
+
+
+def _run(schema_editor, statements):
+    statements = statements.get(schema_editor.connection.vendor, ())
+    for statement in statements:
+        schema_editor.execute(statement, params=None)
+
+
+def install(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_INSTALL, 'mysql': MYSQL_INSTALL})
+
+
+def uninstall(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_UNINSTALL, 'mysql': MYSQL_UNINSTALL})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,65 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_links_to_items(apps, schema_editor):
+    """Turns every row of the implicit order/product table into a line item
+    of quantity 1, priced at the product's current price.
+    """
+    Order = apps.get_model('crm', 'Order')
+    OrderItem = apps.get_model('crm', 'OrderItem')
+    Product = apps.get_model('crm', 'Product')
+    links = Order._meta.get_field('product_id').remote_field.through._meta.db_table
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f"INSERT INTO {quote(OrderItem._meta.db_table)} "
+        f"(order_id, product_id, quantity, unit_price) "
+        f"SELECT link.order_id, link.product_id, 1, product.price "
+        f"FROM {quote(links)} link "
+        f"INNER JOIN {quote(Product._meta.db_table)} product ON product.id = link.product_id"
+    )
+
+
+def copy_items_to_links(apps, schema_editor):
+    Order = apps.get_model('crm', 'Order')
+    OrderItem = apps.get_model('crm', 'OrderItem')
+    links = Order._meta.get_field('product_id').remote_field.through._meta.db_table
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f"INSERT INTO {quote(links)} (order_id, product_id) "
+        f"SELECT order_id, product_id FROM {quote(OrderItem._meta.db_table)}"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_order_date_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='crm.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='crm.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'order'], name='crm_orderitem_product_idx')],
+                'constraints': [models.UniqueConstraint(fields=('order', 'product'), name='crm_orderitem_unique_product')],
+            },
+        ),
+        migrations.RunPython(copy_links_to_items, copy_items_to_links),
+        migrations.RemoveField(
+            model_name='order',
+            name='product_id',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='product_id',
+            field=models.ManyToManyField(through='crm.OrderItem', to='crm.product'),
+        ),
+    ]
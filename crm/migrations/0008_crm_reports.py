@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_purge_runs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrmReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField()),
+                ('period_end', models.DateTimeField()),
+                ('customer_count', models.PositiveIntegerField(default=0)),
+                ('active_customer_count', models.PositiveIntegerField(default=0)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('average_order_value', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('top_products', models.JSONField(default=list)),
+                ('top_customers', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'get_latest_by': 'created_at',
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.core.management import call_command
+from django.db import migrations
+
+# Table of the 'crm' cache (see CACHES), which holds the response cache
+# shared by every process using the database.
+TABLE = 'crm_cache'
+
+
+def create_cache_table(apps, schema_editor):
+    call_command('createcachetable', TABLE, database=schema_editor.connection.alias, verbosity=0)
+
+
+def drop_cache_table(apps, schema_editor):
+    schema_editor.execute(f"DROP TABLE IF EXISTS {schema_editor.quote_name(TABLE)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0009_daily_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, drop_cache_table),
+    ]
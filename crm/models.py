@@ -1,4 +1,12 @@
-from django.db import models
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+
+_MONEY = models.DecimalField(max_digits=12, decimal_places=2)
 
 
 # ---------------------------------------
@@ -16,6 +24,15 @@ class Customer(models.Model):
         blank=True,
         null=True
     )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        """Indexes backing the 'CustomerFilter' range and prefix lookups.
+        """
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='crm_customer_created_idx'),
+            models.Index(fields=['phone'], name='crm_customer_phone_idx'),
+        ]
 
     def __str__(self):
         """String representation of any class instance.
@@ -26,6 +43,33 @@ class Customer(models.Model):
 # ---------------------------------------
 # Collection of offered products
 # ---------------------------------------
+class ProductQuerySet(models.QuerySet):
+    """Product queries aggregating the order line items in SQL.
+    """
+
+    def with_sales(self, since=None, until=None):
+        """Annotates each product with 'units_sold' and 'revenue'.
+        Args:
+        	since: Optional start of the order date window.
+        	until: Optional end of the order date window.
+        """
+        window = Q()
+        if since:
+            window &= Q(order_items__order__order_date__gte=since)
+        if until:
+            window &= Q(order_items__order__order_date__lte=until)
+        window = window or None
+
+        return self.annotate(
+            units_sold=Coalesce(Sum('order_items__quantity', filter=window), 0),
+            revenue=Coalesce(
+                Sum(F('order_items__quantity') * F('order_items__unit_price'),
+                    filter=window, output_field=_MONEY),
+                Value(Decimal('0')), output_field=_MONEY,
+            ),
+        )
+
+
 class Product(models.Model):
     """Represents the Db table with all product records.
     Inheritance:
@@ -35,6 +79,21 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        """Indexes backing the 'ProductFilter' ranges and the low stock restock.
+        """
+        indexes = [
+            models.Index(fields=['price'], name='crm_product_price_idx'),
+            models.Index(fields=['stock'], name='crm_product_stock_idx'),
+            models.Index(
+                fields=['stock'],
+                condition=models.Q(stock__lt=10),
+                name='crm_product_low_stock_idx',
+            ),
+        ]
+
     def __str__(self):
         """String representation of any class instance.
         """
@@ -44,21 +103,291 @@ class Product(models.Model):
 # ---------------------------------------
 # Collection of all placed orders
 # ---------------------------------------
+class OrderQuerySet(models.QuerySet):
+    """Order queries computing amounts from the line items in SQL.
+    """
+
+    def recompute_totals(self):
+        """Sets each order's 'total_amount' to the sum of its line items,
+        with a single UPDATE.
+        Return:
+        	The number of updated orders.
+        """
+        totals = OrderItem.objects.filter(order=OuterRef('pk')).values('order').annotate(
+            total=Sum(F('quantity') * F('unit_price'), output_field=_MONEY)
+        ).values('total')
+        return self.update(total_amount=Coalesce(
+            Subquery(totals, output_field=_MONEY), Value(Decimal('0')),
+            output_field=_MONEY,
+        ))
+
+
 class Order(models.Model):
     """Represents the Order table from the backend database.
     Inheritance:
     	models.Model: Ensures this class is mapped onto the right DB table.
     """
     customer_id = models.ForeignKey(Customer, on_delete=models.CASCADE)
-    product_id = models.ManyToManyField(Product)
-    order_date = models.DateTimeField(auto_now_add=True)
+    product_id = models.ManyToManyField(Product, through='OrderItem')
+    order_date = models.DateTimeField(default=timezone.now)
     total_amount = models.DecimalField(
         max_digits=10,
         decimal_places=2,
         default=0.0
     )
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        """Indexes backing the 'OrderFilter' ranges and the keyset pagination.
+        """
+        indexes = [
+            models.Index(fields=['order_date', 'id'], name='crm_order_date_idx'),
+            models.Index(fields=['customer_id', 'order_date'], name='crm_order_customer_date_idx'),
+            models.Index(fields=['total_amount'], name='crm_order_total_idx'),
+        ]
+
     def __str__(self):
         """String representation of any class instance.
         """
         return self.name
+
+
+# ---------------------------------------
+# Line items of every placed order
+# ---------------------------------------
+class OrderItem(models.Model):
+    """Represents one product of an order, with its quantity and the unit
+    price the product had when the order was placed.
+    Inheritance:
+    	models.Model: Ensures this class is mapped onto the right DB table.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='order_items')
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        """One line per product of an order; per-product sales seek by product.
+        """
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product'], name='crm_orderitem_unique_product'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'order'], name='crm_orderitem_product_idx'),
+        ]
+
+    def __str__(self):
+        """String representation of any class instance.
+        """
+        return f"{self.quantity} x {self.product_id} (order {self.order_id})"
+
+
+# ---------------------------------------
+# Progress of the order-reminder pipeline
+# ---------------------------------------
+class ReminderRun(models.Model):
+    """One pass of the reminder pipeline over a window of orders.
+    The cursor is committed with every page, so a crashed run resumes
+    where it stopped instead of starting over.
+    Inheritance:
+    	models.Model: Ensures this class is mapped onto the right DB table.
+    """
+    window_start = models.DateTimeField()
+    window_end = models.DateTimeField()
+    cursor = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        """String representation of any class instance.
+        """
+        return f"Reminders for {self.window_start:%Y-%m-%d} - {self.window_end:%Y-%m-%d}"
+
+
+class Reminder(models.Model):
+    """The single reminder a run owes a customer, whatever their number of
+    orders in the window. 'sent_at' stays empty until it is delivered.
+    Inheritance:
+    	models.Model: Ensures this class is mapped onto the right DB table.
+    """
+    run = models.ForeignKey(ReminderRun, on_delete=models.CASCADE, related_name='reminders')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='reminders')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reminders')
+    email = models.EmailField()
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        """One reminder per customer and run; resumes look up the unsent ones.
+        """
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'customer'], name='crm_reminder_unique_customer'),
+        ]
+        indexes = [
+            models.Index(fields=['run', 'sent_at'], name='crm_reminder_pending_idx'),
+        ]
+
+    def __str__(self):
+        """String representation of any class instance.
+        """
+        return f"Reminder to {self.email} (order {self.order_id})"
+
+
+# ---------------------------------------
+# Progress of the inactive-customer purge
+# ---------------------------------------
+class PurgeRun(models.Model):
+    """One purge of the customers created before 'cutoff' who never ordered.
+    Customers are deleted in primary key order; 'last_pk' is committed with
+    every batch, so an interrupted purge resumes past it.
+    Inheritance:
+    	models.Model: Ensures this class is mapped onto the right DB table.
+    """
+    cutoff = models.DateTimeField()
+    last_pk = models.BigIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        """String representation of any class instance.
+        """
+        return f"Purge of customers created before {self.cutoff:%Y-%m-%d}"
+
+
+# ---------------------------------------
+# Materialized CRM reports
+# ---------------------------------------
+class CrmReport(models.Model):
+    """Figures of the CRM over a period, merged from the partitions the
+    report task computed in parallel. Reads only ever fetch the latest row.
+    Inheritance:
+    	models.Model: Ensures this class is mapped onto the right DB table.
+    Attributes:
+    	top_products: Best-selling products of the period, as
+    		{'product_id', 'name', 'units_sold', 'revenue'} dicts.
+    	top_customers: Biggest spenders of the period, as
+    		{'customer_id', 'name', 'email', 'order_count', 'revenue'} dicts.
+    """
+    period_start = models.DateTimeField()
+    period_end = models.DateTimeField()
+    customer_count = models.PositiveIntegerField(default=0)
+    active_customer_count = models.PositiveIntegerField(default=0)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    average_order_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    top_products = models.JSONField(default=list)
+    top_customers = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        """The latest report is looked up through the 'created_at' index.
+        """
+        get_latest_by = 'created_at'
+
+    def __str__(self):
+        """String representation of any class instance.
+        """
+        return f"CRM report {self.period_start:%Y-%m-%d} - {self.period_end:%Y-%m-%d}"
+
+
+# ---------------------------------------
+# Sales summed per day
+# ---------------------------------------
+def _day_start(day):
+    """Returns the aware datetime at which 'day' starts in the current time zone.
+    """
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class DailySalesRollupQuerySet(models.QuerySet):
+    """Keeps the per-day rollup in step with the orders.
+    """
+
+    def record(self, orders, sign=1):
+        """Adds orders to the rollup of their day, or removes them with
+        'sign=-1', with one UPDATE per day they fall on. Call it in the
+        transaction writing the orders.
+        Args:
+        	orders: (order_date, total_amount, units) tuples.
+        	sign: 1 for new orders, -1 for deleted ones.
+        """
+        days = {}
+        for order_date, total_amount, units in orders:
+            if timezone.is_naive(order_date):
+                order_date = timezone.make_aware(order_date)
+            day = days.setdefault(timezone.localdate(order_date), [0, Decimal('0'), 0])
+            day[0] += 1
+            day[1] += Decimal(total_amount)
+            day[2] += units
+
+        for day, (count, revenue, units) in days.items():
+            increments = {
+                'order_count': F('order_count') + sign * count,
+                'revenue': F('revenue') + sign * revenue,
+                'units_sold': F('units_sold') + sign * units,
+            }
+            if self.filter(date=day).update(**increments):
+                continue
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(date=day, order_count=sign * count,
+                                revenue=sign * revenue, units_sold=sign * units)
+            except IntegrityError:
+                # Another transaction created the day's row first.
+                self.filter(date=day).update(**increments)
+
+    def rebuild(self, since=None, until=None):
+        """Recomputes the rollup of the days from 'since' to 'until' (both
+        included, every day when None) from the orders, with two grouped
+        queries, and replaces those days' rows in one transaction.
+        Return:
+        	The number of days holding orders.
+        """
+        orders = Order.objects.using(self.db)
+        items = OrderItem.objects.using(self.db)
+        rows = self.all()
+        if since:
+            orders = orders.filter(order_date__gte=_day_start(since))
+            items = items.filter(order__order_date__gte=_day_start(since))
+            rows = rows.filter(date__gte=since)
+        if until:
+            orders = orders.filter(order_date__lt=_day_start(until + timedelta(days=1)))
+            items = items.filter(order__order_date__lt=_day_start(until + timedelta(days=1)))
+            rows = rows.filter(date__lte=until)
+
+        days = {
+            row['day']: self.model(date=row['day'], order_count=row['order_count'], revenue=row['revenue'])
+            for row in orders.annotate(day=TruncDate('order_date')).values('day').annotate(
+                order_count=Count('pk'), revenue=Sum('total_amount'),
+            ).order_by()
+        }
+        for row in items.annotate(day=TruncDate('order__order_date')).values('day').annotate(
+            units_sold=Sum('quantity'),
+        ).order_by():
+            days[row['day']].units_sold = row['units_sold']
+
+        with transaction.atomic(using=self.db):
+            rows.delete()
+            self.bulk_create(days.values(), batch_size=1000)
+        return len(days)
+
+
+class DailySalesRollup(models.Model):
+    """Orders, revenue and units sold of one day, maintained incrementally
+    as orders are created and deleted, so charts over days read one row per
+    day instead of re-summing the orders.
+    Inheritance:
+    	models.Model: Ensures this class is mapped onto the right DB table.
+    """
+    date = models.DateField(unique=True)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units_sold = models.IntegerField(default=0)
+
+    objects = DailySalesRollupQuerySet.as_manager()
+
+    def __str__(self):
+        """String representation of any class instance.
+        """
+        return f"Sales of {self.date:%Y-%m-%d}"
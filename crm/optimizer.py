@@ -0,0 +1,210 @@
+"""
+'optimizer' plans the ORM query of a connection from its GraphQL selection set.
+"""
+from django.db.models import Manager, Prefetch, QuerySet
+from graphene import Dynamic, relay
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.filter import DjangoFilterConnectionField
+from graphql.language import FieldNode, FragmentSpreadNode
+
+
+# ---------------------------------------------------------
+# Walking the selection set
+# ---------------------------------------------------------
+def _unwrap(graphene_type):
+    """Strips List/NonNull wrappers (and lazy references) from a graphene type.
+    """
+    while True:
+        if callable(graphene_type) and not isinstance(graphene_type, type):
+            graphene_type = graphene_type()
+        elif hasattr(graphene_type, 'of_type'):
+            graphene_type = graphene_type.of_type
+        else:
+            return graphene_type
+
+
+def _field_nodes(selection_set, type_name, fragments):
+    """Yields the field nodes selected on 'type_name', expanding fragments.
+    Args:
+    	selection_set: The AST selection set to expand.
+    	type_name: GraphQL name of the type the selections apply to.
+    	fragments: The named fragments of the operation ('info.fragments').
+    """
+    if selection_set is None:
+        return
+
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+            continue
+
+        if isinstance(selection, FragmentSpreadNode):
+            selection = fragments.get(selection.name.value)
+            if selection is None:
+                continue
+
+        condition = selection.type_condition
+        if condition is None or condition.name.value == type_name:
+            yield from _field_nodes(selection.selection_set, type_name, fragments)
+
+
+def _is_connection(graphene_type):
+    return isinstance(graphene_type, type) and issubclass(graphene_type, relay.Connection)
+
+
+def _node_selection(field_nodes, graphene_type, fragments):
+    """Returns the field nodes selected on the objects behind 'graphene_type'.
+    Connections are descended through 'edges { node }'.
+    Return:
+    	A tuple (object type, list of its selected field nodes).
+    """
+    if _is_connection(graphene_type):
+        edge_type = graphene_type.Edge
+        edges = _select(field_nodes, 'edges', graphene_type._meta.name, fragments)
+        field_nodes = list(_select(edges, 'node', edge_type._meta.name, fragments))
+        graphene_type = _unwrap(graphene_type._meta.node)
+
+    selected = []
+    for field_node in field_nodes:
+        selected.extend(
+            _field_nodes(field_node.selection_set, graphene_type._meta.name, fragments)
+        )
+    return graphene_type, selected
+
+
+def _select(field_nodes, name, type_name, fragments):
+    """Yields the sub-fields called 'name' of the given field nodes.
+    """
+    for field_node in field_nodes:
+        for child in _field_nodes(field_node.selection_set, type_name, fragments):
+            if child.name.value == name:
+                yield child
+
+
+# ---------------------------------------------------------
+# Turning the selection into an ORM query plan
+# ---------------------------------------------------------
+class QueryPlan:
+    """Columns and relations one selection set needs from the database.
+    Attributes:
+    	only: Column names (prefixed for joined relations) to load.
+    	select_related: Forward relations to join in the same query.
+    	prefetch: Many-valued relations to prefetch, with the plan of their rows.
+    """
+
+    def __init__(self):
+        self.only = set()
+        self.select_related = set()
+        self.prefetch = {}
+
+    def apply(self, queryset):
+        """Returns 'queryset' restricted and extended according to the plan.
+        """
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        for lookup, (model, plan) in self.prefetch.items():
+            queryset = queryset.prefetch_related(Prefetch(
+                lookup, queryset=plan.apply(model._default_manager.all())
+            ))
+        if self.only:
+            queryset = queryset.only(*sorted(self.only))
+        return queryset
+
+
+def _model_fields(model):
+    """Maps attribute names (including reverse accessors) to model fields.
+    """
+    fields = {}
+    for field in model._meta.get_fields():
+        if field.auto_created and not field.concrete:
+            fields[field.get_accessor_name()] = field
+        else:
+            fields[field.name] = field
+    return fields
+
+
+def _plan(plan, graphene_type, selections, fragments, prefix=''):
+    """Adds the needs of 'selections' on 'graphene_type' to 'plan'.
+    Args:
+    	plan: The 'QueryPlan' being filled.
+    	graphene_type: The 'DjangoObjectType' the selections apply to.
+    	selections: The field nodes selected on that type.
+    	fragments: The named fragments of the operation.
+    	prefix: Lookup path of 'graphene_type' from the planned queryset.
+    """
+    model = graphene_type._meta.model
+    model_fields = _model_fields(model)
+    type_fields = graphene_type._meta.fields
+    sources = getattr(graphene_type, 'field_sources', {})
+
+    plan.only.add(prefix + model._meta.pk.name)
+
+    for field_node in selections:
+        name = to_snake_case(field_node.name.value)
+        model_field = model_fields.get(sources.get(name, name))
+        type_field = type_fields.get(name)
+        if isinstance(type_field, Dynamic):
+            type_field = type_field.get_type()
+        if model_field is None or type_field is None:
+            continue
+
+        if not model_field.is_relation:
+            plan.only.add(prefix + model_field.name)
+            continue
+
+        if isinstance(type_field, DjangoFilterConnectionField):
+            # Filtered relations are re-queried by their own connection.
+            continue
+
+        related_type, related_selections = _node_selection(
+            [field_node], _unwrap(type_field.type), fragments
+        )
+        if not hasattr(related_type, '_meta') or \
+                getattr(related_type._meta, 'model', None) is None:
+            continue
+
+        if model_field.concrete and (model_field.many_to_one or model_field.one_to_one):
+            plan.only.add(prefix + model_field.name)
+            plan.select_related.add(prefix + model_field.name)
+            _plan(plan, related_type, related_selections, fragments,
+                  prefix=prefix + model_field.name + '__')
+            continue
+
+        lookup = prefix + sources.get(name, name)
+        _, related_plan = plan.prefetch.setdefault(
+            lookup, (related_type._meta.model, QueryPlan())
+        )
+        _plan(related_plan, related_type, related_selections, fragments)
+        if model_field.one_to_many:
+            # The related rows need their key back to the prefetching object.
+            related_plan.only.add(model_field.field.name)
+
+
+def optimize_queryset(queryset, info, graphene_type):
+    """Applies select_related, prefetch_related and only() to a queryset
+    according to the fields requested by the current GraphQL operation.
+    Args:
+    	queryset: The queryset about to be filtered and paginated.
+    	info: Contains useful context associated with the request made.
+    	graphene_type: The 'DjangoObjectType' of the queryset's rows.
+    Return:
+    	The planned queryset, or 'queryset' untouched if it cannot be planned.
+    """
+    if isinstance(queryset, Manager):
+        queryset = queryset.get_queryset()
+    if not isinstance(queryset, QuerySet):
+        return queryset
+
+    return_type = getattr(_unwrap(info.return_type), 'graphene_type', None)
+    if _is_connection(return_type):
+        graphene_type, selections = _node_selection(
+            info.field_nodes, return_type, info.fragments
+        )
+    else:
+        graphene_type, selections = _node_selection(
+            info.field_nodes, graphene_type, info.fragments
+        )
+
+    plan = QueryPlan()
+    _plan(plan, graphene_type, selections, info.fragments)
+    return plan.apply(queryset)
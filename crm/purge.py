@@ -0,0 +1,83 @@
+"""
+'purge' deletes the customers who never ordered and were created before a
+cutoff. Deletes run in small primary-key-ordered batches, each committed on
+its own with the purge's checkpoint, so no statement holds the write lock
+for long and an interrupted purge resumes where it stopped.
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .models import Customer, Order, PurgeRun
+
+
+def inactive_customers(cutoff, after=0):
+    """Customers created before 'cutoff' with no order, past the key 'after'.
+    """
+    return Customer.objects.filter(pk__gt=after, created_at__lt=cutoff).filter(
+        ~Exists(Order.objects.filter(customer_id=OuterRef('pk')))
+    )
+
+
+def pending_purge():
+    """Returns the purge left unfinished, if any.
+    """
+    return PurgeRun.objects.filter(completed_at__isnull=True).order_by('pk').first()
+
+
+def start_purge(days=365):
+    """Returns the unfinished purge to resume, or a new purge of the
+    customers older than 'days' days. A resumed purge keeps its own cutoff.
+    """
+    return pending_purge() or PurgeRun.objects.create(cutoff=timezone.now() - timedelta(days=days))
+
+
+def delete_batch(run, batch_size):
+    """Deletes the next 'batch_size' inactive customers of 'run' and moves
+    its checkpoint past them, in one transaction.
+    Return:
+    	The number of customers deleted, or None once there are none left.
+    """
+    keys = list(
+        inactive_customers(run.cutoff, run.last_pk)
+        .order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not keys:
+        return None
+
+    with transaction.atomic():
+        # The anti-join is checked again: a customer may have ordered since
+        # the batch was read. The regular delete cascades to the customers'
+        # reminders and sends the signals the response cache listens to.
+        _, deleted = inactive_customers(run.cutoff).filter(pk__in=keys).delete()
+        deleted = deleted.get(Customer._meta.label, 0)
+        run.last_pk = keys[-1]
+        run.deleted += deleted
+        run.save(update_fields=['last_pk', 'deleted'])
+    return deleted
+
+
+def purge_batches(run, batch_size=None, pause=None):
+    """Deletes the inactive customers of 'run' batch by batch, pausing
+    between batches to let other writes through, and marks it completed.
+    Args:
+    	run: The PurgeRun to carry on.
+    	batch_size: Customers per batch; defaults to 'CRM_PURGE_BATCH_SIZE'.
+    	pause: Seconds slept between batches; defaults to 'CRM_PURGE_PAUSE'.
+    Return:
+    	A generator of the number of customers deleted by each batch.
+    """
+    batch_size = batch_size or settings.CRM_PURGE_BATCH_SIZE
+    pause = settings.CRM_PURGE_PAUSE if pause is None else pause
+    while True:
+        deleted = delete_batch(run, batch_size)
+        if deleted is None:
+            break
+        yield deleted
+        if pause:
+            time.sleep(pause)
+
+    run.completed_at = timezone.now()
+    run.save(update_fields=['completed_at'])
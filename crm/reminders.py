@@ -0,0 +1,146 @@
+"""
+'reminders' sends one reminder per customer who ordered within a window.
+The window's orders are walked page by page with keyset cursors, so memory
+stays bounded by the page and batch sizes whatever the order volume. Every
+page's new reminders and its end cursor are committed together: a crashed
+run resumes after the last committed page and only re-sends what had not
+been delivered. Delivery itself is handed to Celery in batches.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from graphql_relay import from_global_id
+from .executor import run_operation
+from .models import Reminder, ReminderRun
+from .tasks import send_reminder_batch
+
+
+ORDERS_PAGE = """
+query ($since: DateTime!, $until: DateTime!, $first: Int!, $after: String) {
+  allOrders(orderDate_Gte: $since, orderDate_Lte: $until,
+            keyset: true, first: $first, after: $after) {
+    pageInfo {
+      hasNextPage
+      endCursor
+    }
+    edges {
+      node {
+        id
+        customer {
+          id
+          email
+        }
+      }
+    }
+  }
+}
+"""
+
+
+# ---------------------------------------------------------
+# Runs and their checkpoints
+# ---------------------------------------------------------
+def start_run(days=7):
+    """Returns the unfinished run to resume, or a new run over the last
+    'days' days. A resumed run keeps its own window.
+    """
+    run = ReminderRun.objects.filter(completed_at__isnull=True).order_by('pk').first()
+    if run is None:
+        now = timezone.now()
+        run = ReminderRun.objects.create(window_start=now - timedelta(days=days), window_end=now)
+    return run
+
+
+def record_page(run, connection):
+    """Stores a reminder for every customer of an 'allOrders' page that the
+    run has not reached yet, and moves the run's cursor past the page.
+    Args:
+    	run: The ReminderRun being walked.
+    	connection: The 'allOrders' result of the page.
+    Return:
+    	The ids of the customers newly owed a reminder.
+    """
+    first_orders = {}
+    for edge in connection['edges']:
+        order = edge['node']
+        customer_id = int(from_global_id(order['customer']['id'])[1])
+        first_orders.setdefault(customer_id, (int(from_global_id(order['id'])[1]), order['customer']['email']))
+
+    with transaction.atomic():
+        reached = set(
+            Reminder.objects.filter(run=run, customer_id__in=first_orders)
+            .values_list('customer_id', flat=True)
+        )
+        new_reminders = [
+            Reminder(run=run, customer_id=customer_id, order_id=order_id, email=email)
+            for customer_id, (order_id, email) in first_orders.items()
+            if customer_id not in reached
+        ]
+        Reminder.objects.bulk_create(new_reminders)
+        run.cursor = connection['pageInfo']['endCursor'] or run.cursor
+        run.save(update_fields=['cursor'])
+    return [reminder.customer_id for reminder in new_reminders]
+
+
+# ---------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------
+def _unsent_customers(run, batch_size):
+    """Yields the customers of 'run' still owed a reminder, 'batch_size' at a time.
+    """
+    batch = []
+    unsent = (
+        Reminder.objects.filter(run=run, sent_at__isnull=True)
+        .order_by('pk').values_list('customer_id', flat=True)
+    )
+    for customer_id in unsent.iterator(chunk_size=batch_size):
+        batch.append(customer_id)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def send_reminders(days=7, remote=None, page_size=None, batch_size=None):
+    """Walks the orders of the last 'days' days and queues one reminder per
+    customer, resuming the last run if it did not complete.
+    Args:
+    	days: Length of the window of a new run.
+    	remote: GraphQL endpoint to read orders from (see 'run_operation').
+    	page_size: Orders per page; defaults to 'CRM_REMINDER_PAGE_SIZE'.
+    	batch_size: Reminders per Celery task; defaults to 'CRM_REMINDER_BATCH_SIZE'.
+    Return:
+    	The completed ReminderRun.
+    """
+    page_size = page_size or settings.CRM_REMINDER_PAGE_SIZE
+    batch_size = batch_size or settings.CRM_REMINDER_BATCH_SIZE
+    run = start_run(days)
+
+    # Reminders recorded before a crash may not have been queued (or sent):
+    # queue them again. Sending is idempotent, so duplicates are harmless.
+    if run.cursor:
+        for batch in _unsent_customers(run, batch_size):
+            send_reminder_batch.delay(run.pk, batch)
+
+    variables = {
+        'since': run.window_start.isoformat(),
+        'until': run.window_end.isoformat(),
+        'first': page_size,
+    }
+    pending = []
+    while True:
+        connection = run_operation(ORDERS_PAGE, {**variables, 'after': run.cursor or None}, remote=remote)['allOrders']
+        pending.extend(record_page(run, connection))
+        while len(pending) >= batch_size:
+            send_reminder_batch.delay(run.pk, pending[:batch_size])
+            pending = pending[batch_size:]
+        if not connection['pageInfo']['hasNextPage']:
+            break
+    if pending:
+        send_reminder_batch.delay(run.pk, pending)
+
+    run.completed_at = timezone.now()
+    run.save(update_fields=['completed_at'])
+    return run
@@ -0,0 +1,154 @@
+"""
+'reports' computes the CRM report by partition, so that the partitions can
+run in parallel as Celery subtasks (see 'crm.tasks.generate_crm_report'):
+	- one partition per date range sums the orders and the product sales,
+	- one partition per customer-id shard ranks that shard's customers.
+Each partition returns a small JSON-serializable summary; 'merge_report'
+combines them into a stored CrmReport, which 'latestCrmReport' reads.
+"""
+from datetime import datetime
+from decimal import Decimal
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, Mod
+from .models import _MONEY, Customer, CrmReport, Order, OrderItem, Product
+from .response_cache import invalidate_models
+
+
+def date_partitions(start, end, count):
+    """Splits [start, end) into 'count' consecutive ranges of equal length.
+    Return:
+    	A list of (start, end) pairs of ISO 8601 strings.
+    """
+    step = (end - start) / count
+    bounds = [start + step * index for index in range(count)] + [end]
+    return [(low.isoformat(), high.isoformat()) for low, high in zip(bounds, bounds[1:])]
+
+
+def _window(start, end, prefix=''):
+    return {
+        f'{prefix}order_date__gte': datetime.fromisoformat(start),
+        f'{prefix}order_date__lt': datetime.fromisoformat(end),
+    }
+
+
+# ---------------------------------------------------------
+# Partitions
+# ---------------------------------------------------------
+def orders_partition(start, end):
+    """Sums the orders placed in [start, end) and the sales of each product.
+    Return:
+    	{'order_count', 'revenue', 'products': [[product_id, units_sold, revenue]]}
+    """
+    totals = Order.objects.filter(**_window(start, end)).aggregate(
+        order_count=Count('pk'),
+        revenue=Coalesce(Sum('total_amount'), Value(Decimal('0')), output_field=_MONEY),
+    )
+    products = (
+        OrderItem.objects.filter(**_window(start, end, 'order__'))
+        .values('product')
+        .annotate(
+            units_sold=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('unit_price'), output_field=_MONEY),
+        )
+        .order_by()
+    )
+    return {
+        'order_count': totals['order_count'],
+        'revenue': str(totals['revenue']),
+        'products': [
+            [row['product'], row['units_sold'], str(row['revenue'])] for row in products
+        ],
+    }
+
+
+def customers_partition(start, end, shard, shards, top):
+    """Ranks the customers of one shard (customer id modulo 'shards') by what
+    they spent on the orders placed in [start, end).
+    Return:
+    	{'active_customer_count', 'customers': [[customer_id, order_count, revenue]]},
+    	with the shard's 'top' customers only.
+    """
+    spending = (
+        Order.objects.filter(**_window(start, end))
+        .annotate(shard=Mod('customer_id', shards))
+        .filter(shard=shard)
+        .values('customer_id')
+        .annotate(order_count=Count('pk'), revenue=Sum('total_amount'))
+        .order_by()
+    )
+    best = spending.order_by('-revenue', 'customer_id')[:top]
+    return {
+        'active_customer_count': spending.count(),
+        'customers': [
+            [row['customer_id'], row['order_count'], str(row['revenue'])] for row in best
+        ],
+    }
+
+
+# ---------------------------------------------------------
+# Merging
+# ---------------------------------------------------------
+def merge_report(results, start, end, top):
+    """Combines the partition summaries into a stored CrmReport.
+    Args:
+    	results: Summaries returned by 'orders_partition' and 'customers_partition'.
+    	start: Start of the report's period, as an ISO 8601 string.
+    	end: End of the report's period, as an ISO 8601 string.
+    	top: Number of products and customers the breakdowns keep.
+    Return:
+    	The new CrmReport.
+    """
+    order_count, revenue, active_customers = 0, Decimal('0'), 0
+    products, customers = {}, []
+    for result in results:
+        if 'products' in result:
+            order_count += result['order_count']
+            revenue += Decimal(result['revenue'])
+            for product_id, units_sold, product_revenue in result['products']:
+                sold = products.setdefault(product_id, [0, Decimal('0')])
+                sold[0] += units_sold
+                sold[1] += Decimal(product_revenue)
+        else:
+            active_customers += result['active_customer_count']
+            customers.extend(
+                (customer_id, count, Decimal(spent))
+                for customer_id, count, spent in result['customers']
+            )
+
+    # Shards hold disjoint customers, so the best of their bests are exact.
+    best_products = sorted(products.items(), key=lambda item: (-item[1][1], item[0]))[:top]
+    best_customers = sorted(customers, key=lambda row: (-row[2], row[0]))[:top]
+    names = Product.objects.in_bulk([product_id for product_id, _ in best_products])
+    people = Customer.objects.in_bulk([row[0] for row in best_customers])
+
+    cent = Decimal('0.01')
+    report = CrmReport.objects.create(
+        period_start=datetime.fromisoformat(start),
+        period_end=datetime.fromisoformat(end),
+        customer_count=Customer.objects.count(),
+        active_customer_count=active_customers,
+        order_count=order_count,
+        revenue=revenue.quantize(cent),
+        average_order_value=(revenue / order_count).quantize(cent) if order_count else Decimal('0.00'),
+        top_products=[
+            {
+                'product_id': product_id,
+                'name': names[product_id].name if product_id in names else None,
+                'units_sold': units_sold,
+                'revenue': str(product_revenue.quantize(cent)),
+            }
+            for product_id, (units_sold, product_revenue) in best_products
+        ],
+        top_customers=[
+            {
+                'customer_id': customer_id,
+                'name': people[customer_id].name if customer_id in people else None,
+                'email': people[customer_id].email if customer_id in people else None,
+                'order_count': count,
+                'revenue': str(spent.quantize(cent)),
+            }
+            for customer_id, count, spent in best_customers
+        ],
+    )
+    invalidate_models(CrmReport)
+    return report
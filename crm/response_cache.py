@@ -0,0 +1,350 @@
+"""
+'response_cache' stores the results of read operations and drops them as
+soon as a model they were built from changes.
+"""
+import hashlib
+import json
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from decimal import Decimal
+from threading import Lock, local
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+from graphql import (
+    FieldNode,
+    OperationType,
+    TypeInfo,
+    TypeInfoVisitor,
+    Visitor,
+    get_named_type,
+    print_ast,
+    visit,
+)
+from graphql.execution.values import get_argument_values, get_variable_values
+from graphene.utils.str_converters import to_snake_case
+
+
+# ---------------------------------------------------------
+# Storage backends
+# ---------------------------------------------------------
+class LocMemBackend:
+    """In-process LRU with a time to live, private to each worker. Writes
+    made by other processes never reach it: only for single-process setups.
+    Attributes:
+    	maxsize: Number of responses kept before the least recently used is dropped.
+    	ttl: Seconds a response may be served for.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_versions(self, tags):
+        with self._lock:
+            return {tag: self._versions.get(tag, 0) for tag in tags}
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+
+class DjangoCacheBackend:
+    """Stores responses in a Django cache, shared by every worker using it.
+    Attributes:
+    	alias: The 'CACHES' alias to use.
+    	ttl: Seconds a response may be served for.
+    """
+
+    def __init__(self, alias='default', ttl=300):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(f'crm:rc:{key}')
+
+    def set(self, key, value):
+        self.cache.set(f'crm:rc:{key}', value, timeout=self.ttl)
+
+    def get_versions(self, tags):
+        keys = {f'crm:rc:tag:{tag}': tag for tag in tags}
+        stored = self.cache.get_many(list(keys))
+        return {tag: stored.get(key, 0) for key, tag in keys.items()}
+
+    def bump(self, tags):
+        # A fresh token rather than an increment: 'incr' is a read then a
+        # write on most caches, and two racing bumps could land on one value.
+        self.cache.set_many(
+            {f'crm:rc:tag:{tag}': uuid.uuid4().hex for tag in tags}, timeout=None
+        )
+
+    def clear(self):
+        self.cache.clear()
+
+
+_backend = None
+
+
+def get_backend():
+    """Returns the backend configured by 'CRM_RESPONSE_CACHE', built once.
+    """
+    global _backend
+    if _backend is None:
+        config = settings.CRM_RESPONSE_CACHE
+        _backend = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _backend
+
+
+# ---------------------------------------------------------
+# Invalidation
+# ---------------------------------------------------------
+def model_tag(model):
+    return model._meta.label_lower
+
+
+class _PendingBumps:
+    """The tags a transaction bumped, bumped again once it commits.
+    'transaction.on_commit' holds the only strong reference to it, so a
+    rollback, which drops the callback, forgets the tags as well.
+    Attributes:
+    	tags: Every tag bumped in the transaction.
+    	unread: The tags bumped since a response was last stored; writes to
+    		them need no new bump until a read may have cached their rows.
+    """
+
+    def __init__(self):
+        self.tags = set()
+        self.unread = set()
+
+    def __call__(self):
+        get_backend().bump(self.tags)
+
+
+_pending = local()
+
+
+def _pending_bumps():
+    reference = getattr(_pending, 'bumps', None)
+    return reference() if reference is not None else None
+
+
+def invalidate_models(*models):
+    """Marks every cached response built from 'models' as stale.
+    Inside a transaction, the versions are bumped right away and again once
+    it commits, so a read racing the write cannot cache old rows. The bumps
+    of one transaction are coalesced, as deletes signal once per row.
+    """
+    if not settings.CRM_RESPONSE_CACHE.get('ENABLED', True):
+        return
+    tags = {model_tag(model) for model in models}
+    if not transaction.get_connection().in_atomic_block:
+        get_backend().bump(tags)
+        return
+
+    pending = _pending_bumps()
+    if pending is None:
+        pending = _PendingBumps()
+        transaction.on_commit(pending)
+        _pending.bumps = weakref.ref(pending)
+    fresh = tags - pending.unread
+    if fresh:
+        get_backend().bump(fresh)
+        pending.tags.update(fresh)
+        pending.unread.update(fresh)
+
+
+# ---------------------------------------------------------
+# Working out what an operation reads
+# ---------------------------------------------------------
+def _models_of(graphene_type):
+    """Returns the models a GraphQL object type is built from.
+    """
+    meta = getattr(graphene_type, '_meta', None)
+    model = getattr(meta, 'model', None)
+    if model is not None:
+        return [model]
+    return list(getattr(graphene_type, 'cache_models', ()))
+
+
+def operation_tags(schema, document):
+    """Returns the tags of every model the document may read.
+    """
+    type_info = TypeInfo(schema)
+    tags = set()
+
+    class TagCollector(Visitor):
+        def enter_field(self, node, *args):
+            named = get_named_type(type_info.get_type())
+            graphene_type = getattr(named, 'graphene_type', None)
+            tags.update(model_tag(model) for model in _models_of(graphene_type))
+
+    visit(document, TypeInfoVisitor(type_info, TagCollector()))
+    return tags
+
+
+def _normalize_arguments(root_field, args):
+    """Passes the filter arguments of a connection through its filterset.
+    Two spellings of the same filter ('10' and '10.00') then share a key.
+    Return:
+    	The normalized arguments, or None if the filterset rejects them.
+    """
+    filterset_class = getattr(root_field, 'filterset_class', None)
+    if filterset_class is None:
+        return args
+
+    filtering_args = root_field.filtering_args
+    data = {key: value for key, value in args.items() if key in filtering_args}
+    form = filterset_class(data=data).form
+    if not form.is_valid():
+        return None
+
+    normalized = {key: value for key, value in args.items() if key not in filtering_args}
+    normalized.update({
+        key: value for key, value in form.cleaned_data.items()
+        if value not in (None, '')
+    })
+    return normalized
+
+
+class _KeyEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return format(o.normalize(), 'f')
+        return super().default(o)
+
+
+def cache_key(schema, document, operation, variables):
+    """Builds the cache key of a read operation.
+    The key covers the document printed without its root arguments, the
+    root arguments as the filtersets clean them, and the variables the
+    rest of the document still refers to.
+    Return:
+    	The key, or None if the operation cannot be cached.
+    """
+    coerced = get_variable_values(
+        schema, operation.variable_definitions or (), variables or {}
+    )
+    if isinstance(coerced, list):
+        return None
+
+    query_type = schema.query_type
+    root_fields = query_type.graphene_type._meta.fields
+    arguments = []
+    selections = []
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, FieldNode) or selection.name.value not in query_type.fields:
+            selections.append(selection)
+            continue
+
+        field_def = query_type.fields[selection.name.value]
+        args = get_argument_values(field_def, selection, coerced)
+        root_field = root_fields.get(to_snake_case(selection.name.value))
+        args = _normalize_arguments(root_field, args)
+        if args is None:
+            return None
+        arguments.append([(selection.alias or selection.name).value, args])
+        selections.append(FieldNode(
+            alias=selection.alias,
+            name=selection.name,
+            arguments=(),
+            directives=selection.directives,
+            selection_set=selection.selection_set,
+        ))
+
+    stripped = operation.__class__(
+        operation=operation.operation,
+        name=operation.name,
+        variable_definitions=(),
+        directives=operation.directives,
+        selection_set=operation.selection_set.__class__(selections=tuple(selections)),
+    )
+    definitions = [
+        stripped if definition is operation else definition
+        for definition in document.definitions
+        if definition is operation or not hasattr(definition, 'operation')
+    ]
+    printed = print_ast(document.__class__(definitions=tuple(definitions)))
+
+    referenced = set()
+
+    class VariableCollector(Visitor):
+        def enter_variable(self, node, *args):
+            referenced.add(node.name.value)
+
+    for definition in definitions:
+        visit(definition, VariableCollector())
+
+    payload = json.dumps(
+        [printed, arguments, {name: coerced.get(name) for name in sorted(referenced)}],
+        cls=_KeyEncoder, sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# ---------------------------------------------------------
+# Entry points used by the GraphQL view
+# ---------------------------------------------------------
+def lookup(schema, document, operation, variables):
+    """Returns (key, tags, cached data or None) for a read operation.
+    A None key means the operation must not be cached.
+    """
+    if not settings.CRM_RESPONSE_CACHE.get('ENABLED', True) or \
+            operation is None or operation.operation != OperationType.QUERY:
+        return None, None, None
+
+    key = cache_key(schema, document, operation, variables)
+    if key is None:
+        return None, None, None
+
+    backend = get_backend()
+    tags = operation_tags(schema, document)
+    versions = backend.get_versions(tags)
+    entry = backend.get(key)
+    if entry is not None and entry['versions'] == versions:
+        return key, versions, entry['data']
+    return key, versions, None
+
+
+def store(key, versions, data):
+    """Caches 'data' under 'key', tagged with the versions read before executing.
+    """
+    get_backend().set(key, {'versions': versions, 'data': data})
+    pending = _pending_bumps()
+    if pending is not None:
+        pending.unread.clear()
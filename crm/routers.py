@@ -0,0 +1,133 @@
+"""
+'routers' splits reads and writes between the primary database and a read
+replica ('CRM_REPLICA_DATABASE'). Only the reads of GraphQL queries go to
+the replica. Everything else (mutations, Celery jobs, commands, the admin)
+reads and writes the primary. Once a request writes, its remaining reads
+also go to the primary, so it never reads back older data than it wrote.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+
+class _Routing:
+    """Routing state of one request (or job), shared by the threads it runs on.
+    Attributes:
+    	pinned: Set by the first write; reads then stay on the primary.
+    """
+
+    def __init__(self):
+        self.pinned = False
+
+
+class _ReplicaReads:
+    """State of one 'replica_reads' block.
+    Attributes:
+    	used: Whether a read of the block went to the replica.
+    """
+
+    def __init__(self):
+        self.used = False
+
+
+_routing = ContextVar('crm_routing', default=None)
+_replica_reads = ContextVar('crm_replica_reads', default=None)
+
+
+@contextmanager
+def request_routing():
+    """Gives the block (a request) its own routing state, unpinned.
+    """
+    token = _routing.set(_Routing())
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+@contextmanager
+def replica_reads():
+    """Lets the reads of the block go to the replica, unless the request
+    already wrote or writes inside the block. Blocks running concurrently
+    (the queries of a batch) each keep their own state.
+    Return:
+    	The block's state, telling whether it read from the replica.
+    """
+    token = None
+    if _routing.get() is None:
+        token = _routing.set(_Routing())
+    reads = _ReplicaReads()
+    reads_token = _replica_reads.set(reads)
+    try:
+        yield reads
+    finally:
+        _replica_reads.reset(reads_token)
+        if token is not None:
+            _routing.reset(token)
+
+
+def _replica_alias():
+    alias = settings.CRM_REPLICA_DATABASE
+    return alias if alias and alias in connections else None
+
+
+# Label of the model behind database caches ('crm' in CACHES)
+_CACHE_APP_LABEL = 'django_cache'
+
+
+class PrimaryReplicaRouter:
+    """Sends the reads of 'replica_reads' blocks to the replica and every
+    write to the primary, pinning the request's later reads to it.
+    Reads inside a transaction stay on the primary too, to see its writes.
+    The response cache's table is only ever used on the primary, and
+    writing to it does not pin the request.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == _CACHE_APP_LABEL:
+            return DEFAULT_DB_ALIAS
+        routing = _routing.get()
+        reads = _replica_reads.get()
+        replica = _replica_alias()
+        if (
+            replica
+            and reads is not None
+            and routing is not None
+            and not routing.pinned
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            reads.used = True
+            return replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None and model._meta.app_label != _CACHE_APP_LABEL:
+            routing.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Rows of the primary and of its replica are the same rows.
+        """
+        aliases = {DEFAULT_DB_ALIAS, _replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+@sync_and_async_middleware
+def database_routing_middleware(get_response):
+    """Gives each request its own routing state (see 'request_routing').
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with request_routing():
+                return await get_response(request)
+    else:
+        def middleware(request):
+            with request_routing():
+                return get_response(request)
+    return middleware
@@ -4,14 +4,23 @@
 """
 import graphene
 from graphene import Field, List, String, ID, Int, Float, InputObjectType
-from .models import Customer, Product, Order
-from .types import CustomerType, ProductType, OrderType # Contains the 'class Meta:' for each GraphQL Type defined.
-from django.db import transaction
+from .models import Customer, Product, Order, OrderItem, CrmReport, DailySalesRollup
+from .types import CustomerType, ProductType, OrderType, CRMStatsType, ProductSalesType, CrmReportType, DailySalesType # Contains the 'class Meta:' for each GraphQL Type defined.
+from django.conf import settings
+from django.db import connection, connections, router, transaction
+from django.db.models import Avg, Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 from django.utils.timezone import now
 import re
-from graphene_django.filter import DjangoFilterConnectionField
-from .filters import CustomerFilter, ProductFlter, OrderFilter
+from datetime import timedelta
+from decimal import Decimal
+from .async_execution import async_resolver
+from .fields import CRMConnectionField
+from .loaders import get_loaders
+from .search import ranked_search
+from .response_cache import invalidate_models
+from .filters import CustomerFilter, ProductFilter, OrderFilter
 from graphene_django import DjangoObjectType
 
 
@@ -21,6 +30,18 @@ class CustomerInput(InputObjectType):
         phone = String()
 
 
+class OrderItemInput(InputObjectType):
+        product_id = ID(required=True)
+        quantity = Int(default_value=1)
+
+
+class OrderInput(InputObjectType):
+        customer_id = ID(required=True)
+        product_ids = List(ID)
+        items = List(OrderItemInput)
+        order_date = graphene.DateTime()
+
+
 # ---------------------------------------------------------
 # Mutation Field for simple 'create' on Customer table
 # ---------------------------------------------------------
@@ -59,11 +80,11 @@ class CreateCustomer(graphene.Mutation):
             return CreateCustomer(success=False,
                                   message="Invalid email format")
 
-        if phone and re.match(r"^(\+\d{1,3}\d{4,14}|(\d{3}-\d{3}-\d{4}))$", phone):
+        if phone and not re.match(r"^(\+\d{1,3}\d{4,14}|(\d{3}-\d{3}-\d{4}))$", phone):
             return CreateCustomer(success=False,
                                   message="Invalid phone format")
 
-        if Customer.objects.filter(email=email).exists:
+        if Customer.objects.filter(email=email).exists():
             return CreateCustomer(success=False,
                                   message="Email already exists")
 
@@ -83,65 +104,116 @@ class BulkCreateCustomers(graphene.Mutation):
     	* graphene.Mutation: Enables customization of the mutation.
     * **Attributes**:
         * customers: An array of objects structured like 'CustomerType' instances.
+        * chunk_size: Optional number of rows checked and inserted per query.
     """
 
     class Arguments:
         """Inner class listing the expected request inputs.
         """
         customers = List(CustomerInput, required=True)
+        chunk_size = Int(required=False)
 
 
     created_customers = List(CustomerType)
     success = graphene.Boolean()
     errors = List(String)
 
-    def mutate(self, info, customers):
+    def mutate(self, info, customers, chunk_size=None):
         """Executes the CRUD operation on the database.
+        Rows are validated in memory, then checked for existing emails and
+        inserted with 'bulk_create' one chunk at a time, inside a single transaction.
         * **Args**:
             * self: Represents the current instance of this class.
             * info: An object containing additional context associated with the current request.
             * customers: An array of objects structured like 'CustomerType' instances.
+            * chunk_size: Optional number of rows checked and inserted per query.
         """
+        if chunk_size is None:
+            chunk_size = settings.CRM_BULK_CHUNK_SIZE
+        if chunk_size <= 0:
+            return BulkCreateCustomers(
+                success=False,
+                created_customers=[],
+                errors=["Chunk size must be positive"],
+            )
+
         created = []
         errors = []
+        candidates = []
+        seen = set()
 
-        for data in customers:
+        for index, data in enumerate(customers):
             name = data.get('name')
             email = data.get('email')
             phone = data.get('phone')
 
             if not name or not email:
-                errors.append(
+                errors.append((index,
                     f"Missing required fields for: {name or '[Unnamed]'}"
-                )
+                ))
                 continue
 
-            if Customer.objects.filter(email=email).exists():
-                errors.append(
-                    f"Email already exists: {email}"
-                )
+            if email in seen:
+                errors.append((index,
+                    f"Duplicate email in request: {email}"
+                ))
                 continue
+            seen.add(email)
 
             if phone and not re.match(
                     r'^(\+\d{1,3}\d{4,14}|(\d{3}-\d{4}))$', phone):
-                errors.append(f"Invalid phone: {phone}")
+                errors.append((index, f"Invalid phone: {phone}"))
                 continue
 
-            customer = Customer(
+            candidates.append((index, Customer(
                 name=name,
                 email=email,
                 phone=phone
-            )
-            customer.save()
-            created.append(customer)
+            )))
+
+        with transaction.atomic():
+            for start in range(0, len(candidates), chunk_size):
+                chunk = candidates[start:start + chunk_size]
+                existing = set(Customer.objects.filter(
+                    email__in=[customer.email for _, customer in chunk]
+                ).values_list('email', flat=True))
+
+                survivors = []
+                for index, customer in chunk:
+                    if customer.email in existing:
+                        errors.append((index,
+                            f"Email already exists: {customer.email}"
+                        ))
+                    else:
+                        survivors.append(customer)
+
+                created.extend(_bulk_insert_customers(survivors))
 
         return BulkCreateCustomers(
             success=bool(created),
             created_customers=created,
-            errors=errors,
+            errors=[message for _, message in sorted(errors)],
         )
 
 
+def _bulk_insert_customers(customers):
+    """Inserts 'customers' with a single multi-row INSERT.
+    Backends that cannot return the new primary keys get one re-select by email.
+    """
+    if not customers:
+        return []
+
+    created = Customer.objects.bulk_create(customers)
+    invalidate_models(Customer)
+    if connection.features.can_return_rows_from_bulk_insert:
+        return created
+
+    by_email = Customer.objects.in_bulk(
+        [customer.email for customer in customers], field_name='email'
+    )
+    return [by_email[customer.email] for customer in customers]
+
+
 # ---------------------------------------------------------
 # Mutation Field for simple 'create' on Product table
 # ---------------------------------------------------------
@@ -181,7 +253,7 @@ class CreateProduct(graphene.Mutation):
                 success=False,
                 message="Price must be positive"
             )
-        if stock <= 0:
+        if stock < 0:
             return CreateProduct(
                 success=False,
                 message="Stock must be non-negative"
@@ -205,7 +277,8 @@ class CreateOrder(graphene.Mutation):
     	* graphene.Mutation: Enables customization of the mutation.
     * **Attributes**:
         * customer_id: A required ID object order to customer.
-        * product_ids: A required array of ordered products.
+        * product_ids: Optional array of ordered products, one unit per occurrence.
+        * items: Optional array of ordered products with their quantity.
         * order_date: Optional date object locating the order in space.
     """
 
@@ -213,7 +286,8 @@ class CreateOrder(graphene.Mutation):
         """Inner class listing the expected request inputs.
         """
         customer_id = ID(required=True)
-        product_ids = List(ID, required=True)
+        product_ids = List(ID)
+        items = List(OrderItemInput)
         order_date = graphene.DateTime(required=False)
 
 
@@ -222,13 +296,17 @@ class CreateOrder(graphene.Mutation):
     message = String()
 
     @transaction.atomic
-    def mutate(self, info, customer_id, product_ids, order_date=None):
+    def mutate(self, info, customer_id, product_ids=None, items=None, order_date=None):
         """Executes the CRUD operation on the database.
+        The line items snapshot each product's price, and the total is
+        summed from them by the database. The order is added to its day's
+        'DailySalesRollup' in the same transaction.
         * **Args**:
             * self: Represents the current instance of this class.
             * info: An object containing additional context associated with the current request.
     	    * customer_id: A required ID object order to customer.
-	    * product_ids: A required array of ordered products.
+	    * product_ids: Optional array of ordered products, one unit per occurrence.
+	    * items: Optional array of ordered products with their quantity.
 	    * order_date: Optional date object locating the order in space.
         """
         try:
@@ -239,30 +317,219 @@ class CreateOrder(graphene.Mutation):
                 message="Invalid customer ID"
             )
 
-        if not product_ids:
-            return createOrder(
+        try:
+            quantities = _order_quantities(product_ids, items)
+        except ValueError as error:
+            return CreateOrder(success=False, message=str(error))
+
+        if not quantities:
+            return CreateOrder(
                 success=False,
                 message="No products selected"
             )
 
-        products = Product.objects.filter(id__in=product_ids)
+        products = Product.objects.in_bulk(quantities)
 
-        if products.count() != len(product_ids):
-            return CreatorOrder(
+        if len(products) != len(quantities):
+            return CreateOrder(
                 success=False,
                 message="One or more invalid product IDs"
             )
 
-        total = sum(product.price for product in products)
-
-        order = Order(customer=customer, total_amount=total)
+        order = Order(customer_id=customer)
         if order_date:
             order.order_date = order_date
-        order.products.set(products)
+        order.save()
+        OrderItem.objects.bulk_create(_order_items(order, quantities, products))
+        Order.objects.filter(pk=order.pk).recompute_totals()
+        order.refresh_from_db(fields=['total_amount'])
+        DailySalesRollup.objects.record(
+            [(order.order_date, order.total_amount, sum(quantities.values()))]
+        )
+        invalidate_models(DailySalesRollup)
 
         return CreateOrder(success=True, message="Order created", order=order)
 
 
+def _order_quantities(product_ids, items):
+    """Merges 'productIds' (one unit per occurrence) and 'items' into
+    a dict of product id -> quantity.
+    Raises:
+    	ValueError: An ID is not numeric or a quantity is not positive.
+    """
+    quantities = {}
+    entries = [(product_id, 1) for product_id in product_ids or ()]
+    entries += [(item.get('product_id'), item.get('quantity', 1)) for item in items or ()]
+    for product_id, quantity in entries:
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid product ID: {product_id}")
+        if quantity is None or quantity <= 0:
+            raise ValueError(f"Quantity must be positive for product {product_id}")
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def _order_items(order, quantities, products):
+    """Builds the line items of 'order', snapshotting each product's price.
+    """
+    return [
+        OrderItem(
+            order=order,
+            product=products[product_id],
+            quantity=quantity,
+            unit_price=products[product_id].price,
+        )
+        for product_id, quantity in quantities.items()
+    ]
+
+
+# ----------------------------------------------------------
+# Mutation Field for creation multiple Order records
+# ----------------------------------------------------------
+class BulkCreateOrders(graphene.Mutation):
+    """* Contains the logic for creation of multiple order records. A bit like a 'Query resolver'.
+    * **Inheritance**:
+    	* graphene.Mutation: Enables customization of the mutation.
+    * **Attributes**:
+        * orders: An array of objects structured like 'OrderInput' instances.
+        * chunk_size: Optional number of orders inserted per query.
+    """
+
+    class Arguments:
+        """Inner class listing the expected request inputs.
+        """
+        orders = List(OrderInput, required=True)
+        chunk_size = Int(required=False)
+
+
+    created_orders = List(OrderType)
+    success = graphene.Boolean()
+    errors = List(String)
+
+    def mutate(self, info, orders, chunk_size=None):
+        """Executes the CRUD operation on the database.
+        Every referenced customer and product is read with one query per
+        table. Each chunk of orders and its line items then go in with one
+        'bulk_create' each, and the chunk's totals are summed from the line
+        items by one UPDATE, all inside a single transaction along with
+        the update of their days' 'DailySalesRollup'.
+        * **Args**:
+            * self: Represents the current instance of this class.
+            * info: An object containing additional context associated with the current request.
+            * orders: An array of objects structured like 'OrderInput' instances.
+            * chunk_size: Optional number of orders inserted per query.
+        """
+        if chunk_size is None:
+            chunk_size = settings.CRM_BULK_CHUNK_SIZE
+        if chunk_size <= 0:
+            return BulkCreateOrders(
+                success=False,
+                created_orders=[],
+                errors=["Chunk size must be positive"],
+            )
+
+        errors = []
+        requested = []
+        for index, data in enumerate(orders):
+            try:
+                customer_id = int(data.get('customer_id'))
+            except (TypeError, ValueError):
+                errors.append((index, f"Order {index}: Invalid customer ID {data.get('customer_id')}"))
+                continue
+            try:
+                quantities = _order_quantities(data.get('product_ids'), data.get('items'))
+            except ValueError as error:
+                errors.append((index, f"Order {index}: {error}"))
+                continue
+            requested.append((index, customer_id, quantities, data.get('order_date')))
+
+        customers = Customer.objects.in_bulk(
+            {customer_id for _, customer_id, _, _ in requested}
+        )
+        products = Product.objects.in_bulk(
+            {product_id for _, _, quantities, _ in requested for product_id in quantities}
+        )
+
+        candidates = []
+        for index, customer_id, quantities, order_date in requested:
+            if customer_id not in customers:
+                errors.append((index, f"Order {index}: Invalid customer ID {customer_id}"))
+                continue
+            if not quantities:
+                errors.append((index, f"Order {index}: No products selected"))
+                continue
+            missing = [product_id for product_id in quantities if product_id not in products]
+            if missing:
+                errors.append((index,
+                    f"Order {index}: Invalid product IDs {', '.join(map(str, missing))}"
+                ))
+                continue
+
+            order = Order(customer_id=customers[customer_id])
+            if order_date:
+                order.order_date = order_date
+            candidates.append((order, quantities))
+
+        created = []
+        with transaction.atomic():
+            for start in range(0, len(candidates), chunk_size):
+                chunk = candidates[start:start + chunk_size]
+                created.extend(_bulk_insert_orders(chunk, products, info))
+
+        return BulkCreateOrders(
+            success=bool(created),
+            created_orders=created,
+            errors=[message for _, message in sorted(errors)],
+        )
+
+
+def _bulk_insert_orders(chunk, products, info):
+    """Inserts the orders of 'chunk' and their line items with one multi-row
+    INSERT each, then sums their totals in SQL. Backends that cannot return
+    the new primary keys save the orders one by one instead, as nothing else
+    identifies them.
+    Args:
+    	chunk: A list of (unsaved order, product id -> quantity) pairs.
+    	products: The referenced products, keyed by primary key.
+    	info: Contains useful context associated with the request made.
+    Return:
+    	The saved orders, with their totals.
+    """
+    if not chunk:
+        return []
+
+    orders = [order for order, _ in chunk]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Order.objects.bulk_create(orders)
+    else:
+        for order in orders:
+            order.save()
+
+    loaders = get_loaders(info.context)
+    items = []
+    for order, quantities in chunk:
+        order_items = _order_items(order, quantities, products)
+        loaders.items_by_order.prime(order.pk, order_items)
+        loaders.products_by_order.prime(order.pk, [item.product for item in order_items])
+        items.extend(order_items)
+    OrderItem.objects.bulk_create(items)
+
+    placed = Order.objects.filter(pk__in=[order.pk for order in orders])
+    placed.recompute_totals()
+    totals = dict(placed.values_list('pk', 'total_amount'))
+    for order in orders:
+        order.total_amount = totals[order.pk]
+    DailySalesRollup.objects.record(
+        (order.order_date, order.total_amount, sum(quantities.values()))
+        for order, quantities in chunk
+    )
+
+    invalidate_models(OrderItem, Order, Product, DailySalesRollup)
+    return orders
+
+
 # ------------------------------------------------
 # Class defining the API's 'read operations'
 # ------------------------------------------------
@@ -275,18 +542,42 @@ class Query(graphene.ObjectType):
     """
 
     hello = graphene.String()
-    all_customers = DjangoFilterConnectionField(
+    all_customers = CRMConnectionField(
         CustomerType,
         filterset_class=CustomerFilter,
+        keyset_fields=('id',),
     )
-    all_products = DjangoFilterConnectionField(
+    all_products = CRMConnectionField(
         ProductType,
         filterset_class=ProductFilter,
     )
-    all_orders = DjangoFilterConnectionField(
+    all_orders = CRMConnectionField(
         OrderType,
         filterset_class=OrderFilter,
+        keyset_fields=('order_date', 'id'),
     )
+    search_customers = List(
+        CustomerType,
+        query=String(required=True),
+        first=Int(),
+    )
+    crm_stats = Field(
+        CRMStatsType,
+        order_date__gte=graphene.DateTime(),
+        order_date__lte=graphene.DateTime(),
+    )
+    sales_by_product = List(
+        ProductSalesType,
+        order_date__gte=graphene.DateTime(),
+        order_date__lte=graphene.DateTime(),
+        first=Int(),
+    )
+    sales_by_day = List(
+        DailySalesType,
+        from_=graphene.Date(required=True, name='from'),
+        to=graphene.Date(required=True),
+    )
+    latest_crm_report = Field(CrmReportType)
 
     def resolve_hello(root, info):
         """Resolver for any 'hello' request client-side.
@@ -298,6 +589,186 @@ class Query(graphene.ObjectType):
         """
         return 'Hello, GraphQL!'
 
+    def resolve_search_customers(root, info, query, first=None):
+        """Resolver ranking the customers whose name or email match 'query'.
+        Args:
+        	root: Represents the current instanciation of this Query class.
+        	info: Contains useful context associated with the request made.
+        	query: Word prefixes to find in the name or email, e.g. 'ali exa'.
+        	first: Optional number of results, capped by 'CRM_SEARCH_MAX_RESULTS'.
+        Return:
+        	The matching customers, best match first.
+        """
+        limit = min(first or settings.CRM_SEARCH_MAX_RESULTS,
+                    settings.CRM_SEARCH_MAX_RESULTS)
+        queryset = CustomerType.get_queryset(Customer.objects.all(), info)
+        customers = ranked_search(queryset, query, limit)
+        get_loaders(info.context).queue_nodes(customers)
+        return customers
+
+    def resolve_sales_by_product(root, info, order_date__gte=None,
+                                 order_date__lte=None, first=None):
+        """Resolver ranking products by revenue, summed from the line items in SQL.
+        Args:
+        	root: Represents the current instanciation of this Query class.
+        	info: Contains useful context associated with the request made.
+        	order_date__gte: Optional start of the order date window.
+        	order_date__lte: Optional end of the order date window.
+        	first: Optional number of products, capped by 'CRM_SALES_MAX_RESULTS'.
+        Return:
+        	Products annotated with 'units_sold' and 'revenue', best sellers first.
+        """
+        return _sales_by_product(order_date__gte, order_date__lte, first)
+
+    def resolve_crm_stats(root, info, order_date__gte=None, order_date__lte=None):
+        """Resolver computing the CRM's headline figures in a single SQL query.
+        Args:
+        	root: Represents the current instanciation of this Query class.
+        	info: Contains useful context associated with the request made.
+        	order_date__gte: Optional start of the order date window.
+        	order_date__lte: Optional end of the order date window.
+        Return:
+        	A 'CRMStatsType' with customer/order counts, revenue and average order value.
+        """
+        stats = Customer.objects.aggregate(
+            **_crm_stats_aggregates(order_date__gte, order_date__lte)
+        )
+        return _crm_stats(stats)
+
+    def resolve_sales_by_day(root, info, from_, to):
+        """Resolver reading the daily sales rollup, never the orders.
+        Args:
+        	root: Represents the current instanciation of this Query class.
+        	info: Contains useful context associated with the request made.
+        	from_: First day of the range ('from' in the API).
+        	to: Last day of the range, at most 'CRM_SALES_BY_DAY_MAX_DAYS' days on.
+        Return:
+        	One entry per day of the range, zeroed on days without orders.
+        """
+        return _zero_filled(_sales_by_day(from_, to), from_, to)
+
+    def resolve_latest_crm_report(root, info):
+        """Resolver reading the last report stored by the report task.
+        Args:
+        	root: Represents the current instanciation of this Query class.
+        	info: Contains useful context associated with the request made.
+        Return:
+        	The latest 'CrmReport', or None before the first report ran.
+        """
+        return _latest_crm_report(info).first()
+
+
+def _sales_by_day(since, until):
+    """Returns the (lazy) rollup rows of the days from 'since' to 'until'.
+    Raises:
+    	ValueError: The range is reversed or longer than 'CRM_SALES_BY_DAY_MAX_DAYS'.
+    """
+    if until < since:
+        raise ValueError("'to' must not be before 'from'")
+    if (until - since).days + 1 > settings.CRM_SALES_BY_DAY_MAX_DAYS:
+        raise ValueError(f"At most {settings.CRM_SALES_BY_DAY_MAX_DAYS} days can be requested")
+    return DailySalesRollup.objects.filter(date__range=(since, until)).order_by('date')
+
+
+def _zero_filled(rows, since, until):
+    """Returns one rollup per day from 'since' to 'until', taken from 'rows'
+    or left unsaved and zeroed for the days without orders.
+    """
+    stored = {row.date: row for row in rows}
+    days = (since + timedelta(days=offset) for offset in range((until - since).days + 1))
+    return [
+        stored.get(day) or DailySalesRollup(date=day, revenue=Decimal('0.00'))
+        for day in days
+    ]
+
+
+def _latest_crm_report(info):
+    """Returns the (lazy) reports, latest first, read through the 'created_at' index.
+    """
+    return CrmReportType.get_queryset(CrmReport.objects.all(), info).order_by('-created_at')
+
+
+def _sales_by_product(order_date__gte, order_date__lte, first):
+    """Returns the (lazy) products ranked by revenue over the date window.
+    """
+    limit = min(first or settings.CRM_SALES_MAX_RESULTS,
+                settings.CRM_SALES_MAX_RESULTS)
+    products = Product.objects.with_sales(order_date__gte, order_date__lte)
+    return products.order_by('-revenue', 'pk')[:limit]
+
+
+def _crm_stats_aggregates(order_date__gte, order_date__lte):
+    """Returns the aggregates of 'crmStats', computed over one Customer query.
+    """
+    window = Q()
+    if order_date__gte:
+        window &= Q(order__order_date__gte=order_date__gte)
+    if order_date__lte:
+        window &= Q(order__order_date__lte=order_date__lte)
+    window = window or None
+
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return {
+        'customer_count': Count('id', distinct=True),
+        'order_count': Count('order', filter=window),
+        'revenue': Coalesce(
+            Sum('order__total_amount', filter=window),
+            Value(0), output_field=money
+        ),
+        'average_order_value': Coalesce(
+            Avg('order__total_amount', filter=window),
+            Value(0), output_field=money
+        ),
+    }
+
+
+def _crm_stats(stats):
+    for key in ('revenue', 'average_order_value'):
+        stats[key] = Decimal(stats[key]).quantize(Decimal('0.01'))
+    return CRMStatsType(**stats)
+
+
+# ----------------------------------------------------
+# Native async resolvers, used by 'AsyncCRMGraphQLView'
+# ----------------------------------------------------
+@async_resolver('Query', 'hello')
+async def aresolve_hello(root, info):
+    return Query.resolve_hello(root, info)
+
+
+@async_resolver('Query', 'crmStats')
+async def aresolve_crm_stats(root, info, order_date__gte=None, order_date__lte=None):
+    """Same as 'Query.resolve_crm_stats', awaiting the aggregate on the event loop.
+    """
+    stats = await Customer.objects.aaggregate(
+        **_crm_stats_aggregates(order_date__gte, order_date__lte)
+    )
+    return _crm_stats(stats)
+
+
+@async_resolver('Query', 'salesByProduct')
+async def aresolve_sales_by_product(root, info, order_date__gte=None,
+                                    order_date__lte=None, first=None):
+    """Same as 'Query.resolve_sales_by_product', iterating the rows asynchronously.
+    """
+    products = _sales_by_product(order_date__gte, order_date__lte, first)
+    return [product async for product in products]
+
+
+@async_resolver('Query', 'salesByDay')
+async def aresolve_sales_by_day(root, info, from_, to):
+    """Same as 'Query.resolve_sales_by_day', iterating the rows asynchronously.
+    """
+    rows = [row async for row in _sales_by_day(from_, to)]
+    return _zero_filled(rows, from_, to)
+
+
+@async_resolver('Query', 'latestCrmReport')
+async def aresolve_latest_crm_report(root, info):
+    """Same as 'Query.resolve_latest_crm_report', awaiting the row on the event loop.
+    """
+    return await _latest_crm_report(info).afirst()
+
 
 # ----------------------------------------------------
 # Class registering all API's 'write operations'
@@ -311,6 +782,7 @@ class Mutation1(graphene.ObjectType):
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
 
 
 # ---------------------------------------------------
@@ -322,35 +794,80 @@ class UpdateLowStockProducts(graphene.Mutation):
     	graphene.Mutation: Contains boilerplate connecting client and server side.
     """
 
-    class Output(graphene.List(ProductType))
+    class Arguments:
+        """Inner class listing the expected request inputs.
+        """
+        threshold = Int(required=False, default_value=10)
+        increment = Int(required=False, default_value=10)
+
+    output = graphene.List(ProductType)
 
     success = graphene.String()
 
-    def mutate(self, info):
+    def mutate(self, info, threshold, increment):
         """Resolver for any 'Low stock update' request client-side.
+        The restock runs as one 'UPDATE ... SET stock = stock + increment'
+        statement, so concurrent orders never lose a stock change.
         Args:
         	self: Represents the current instanciation of this Query class.
         	info: Contains useful context associated with the request made.
+        	threshold: Products with a stock strictly below it are restocked.
+        	increment: Quantity added to the stock of each restocked product.
         Return:
         	A list of the update low stock products.
         """
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        update_products = []
-
-        for product in low_stock_products:
-            product.stock += 10
-            product.save()
-            updated_products.append(product)
+        if increment <= 0:
+            return UpdateLowStockProducts(success="Increment must be positive", output=[])
 
+        updated_products = _restock(threshold, increment)
         return UpdateLowStockProducts(success="Products restocked", output=updated_products)
 
 
+def _updates_return_rows(connection):
+    """Whether the backend supports 'UPDATE ... RETURNING' (PostgreSQL, and
+    SQLite from 3.35). MySQL has no RETURNING; MariaDB only for INSERT and DELETE.
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+
+
+def _restock(threshold, increment):
+    """Adds 'increment' to the stock of every product below 'threshold' in
+    one 'UPDATE ... WHERE stock < threshold'. The statement returns the
+    updated rows where the backend supports RETURNING. Elsewhere the rows
+    are locked first, so one re-select of their primary keys returns exactly
+    the products the UPDATE changed.
+    Return:
+    	The updated products.
+    """
+    alias = router.db_for_write(Product)
+    db = connections[alias]
+    with transaction.atomic(using=alias):
+        if _updates_return_rows(db):
+            table = db.ops.quote_name(Product._meta.db_table)
+            stock = db.ops.quote_name(Product._meta.get_field('stock').column)
+            products = list(Product.objects.raw(
+                f"UPDATE {table} SET {stock} = {stock} + %s WHERE {stock} < %s RETURNING *",
+                [increment, threshold],
+            ).using(alias))
+        else:
+            low_stock = Product.objects.using(alias).filter(stock__lt=threshold)
+            ids = list(low_stock.select_for_update().values_list('pk', flat=True))
+            Product.objects.using(alias).filter(pk__in=ids).update(stock=F('stock') + increment)
+            products = list(Product.objects.using(alias).filter(pk__in=ids))
+        # After the UPDATE, so the bump on commit follows the new stock.
+        invalidate_models(Product)
+    return products
+
+
 # ----------------------------------------------------
 # Class registering enabling 'Low stock updates'
 # ----------------------------------------------------
-class Mutation(graphene.ObjectType):
+class Mutation(Mutation1, graphene.ObjectType):
     """Extract field attributes from the querying class.
     Inheritance:
+    	Mutation1: Creation commands on customers, products and orders.
     	graphene.ObjectType: Contains boilerplate connecting client and server side.
     """
     update_low_stock_products = UpdateLowStockProducts.Field()
@@ -0,0 +1,175 @@
+"""
+'search' answers full-text lookups on customers and products from an index
+kept next to their tables: an FTS5 table filled by triggers on SQLite, and
+a FULLTEXT index on MySQL. Other backends fall back to 'icontains'.
+"""
+import re
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+# Columns indexed per table, with their bm25 weight on SQLite.
+SEARCH_COLUMNS = {
+    'crm_customer': (('name', 10.0), ('email', 1.0)),
+    'crm_product': (('name', 1.0),),
+}
+
+
+def search_terms(text):
+    """Splits user input into words, dropping every search operator.
+    """
+    return re.findall(r'\w+', text or '')
+
+
+# ---------------------------------------------------------
+# Keeping the index in step with its table
+# ---------------------------------------------------------
+def _sqlite_statements(table):
+    """Returns the DDL of the FTS5 table of 'table' and its sync triggers.
+    """
+    columns = [column for column, _ in SEARCH_COLUMNS[table]]
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    fts = f'{table}_fts'
+    delete = (f"INSERT INTO {fts}({fts}, rowid, {names}) "
+              f"VALUES ('delete', old.id, {old});")
+    insert = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{names}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} "
+        f"BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} "
+        f"BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {names} ON {table} "
+        f"BEGIN {delete} {insert} END",
+    ]
+
+
+def install_search_index(connection):
+    """Creates the search index of every searchable table, if missing.
+    On SQLite, a migration rebuilding a table drops its triggers, so this
+    also runs after every 'migrate' and reindexes tables that lost them.
+    Args:
+    	connection: The database connection to install the index on.
+    """
+    with connection.cursor() as cursor:
+        for table in SEARCH_COLUMNS:
+            columns = ', '.join(column for column, _ in SEARCH_COLUMNS[table])
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    "SELECT count(*) FROM sqlite_master "
+                    "WHERE type = 'trigger' AND tbl_name = %s AND name LIKE %s",
+                    [table, f'{table}_fts_%'],
+                )
+                if cursor.fetchone()[0] == 3:
+                    continue
+                for statement in _sqlite_statements(table):
+                    cursor.execute(statement)
+                cursor.execute(
+                    f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"
+                )
+            elif connection.vendor == 'mysql':
+                cursor.execute(
+                    "SELECT count(*) FROM information_schema.statistics "
+                    "WHERE table_schema = DATABASE() AND table_name = %s "
+                    "AND index_name = %s",
+                    [table, f'{table}_search'],
+                )
+                if cursor.fetchone()[0]:
+                    continue
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD FULLTEXT INDEX {table}_search ({columns})"
+                )
+
+
+def uninstall_search_index(connection):
+    """Drops what 'install_search_index' created.
+    """
+    with connection.cursor() as cursor:
+        for table in SEARCH_COLUMNS:
+            if connection.vendor == 'sqlite':
+                for suffix in ('ai', 'ad', 'au'):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}")
+                cursor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+            elif connection.vendor == 'mysql':
+                cursor.execute(f"ALTER TABLE {table} DROP INDEX {table}_search")
+
+
+# ---------------------------------------------------------
+# Querying the index
+# ---------------------------------------------------------
+def _matching_sql(vendor, table, terms, ranked=False):
+    """Returns (sql, params) selecting the ids of the rows matching every term.
+    Each term matches the words it starts, so 'ali exa' finds
+    'alice@example.com'. Ranked queries put the best matches first.
+    """
+    columns = [column for column, _ in SEARCH_COLUMNS[table]]
+    if vendor == 'sqlite':
+        fts = f'{table}_fts'
+        sql = f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s"
+        params = [' '.join(f'"{term}"*' for term in terms)]
+        if ranked:
+            weights = ', '.join(str(weight) for _, weight in SEARCH_COLUMNS[table])
+            sql += f" ORDER BY bm25({fts}, {weights})"
+        return sql, params
+
+    match = f"MATCH ({', '.join(columns)}) AGAINST (%s IN BOOLEAN MODE)"
+    params = [' '.join(f'+{term}*' for term in terms)]
+    sql = f"SELECT id FROM {table} WHERE {match}"
+    if ranked:
+        sql += f" ORDER BY {match} DESC"
+        params *= 2
+    return sql, params
+
+
+def _fallback(queryset, terms):
+    columns = [column for column, _ in SEARCH_COLUMNS[queryset.model._meta.db_table]]
+    for term in terms:
+        queryset = queryset.filter(
+            Q(*[(f'{column}__icontains', term) for column in columns], _connector=Q.OR)
+        )
+    return queryset
+
+
+def filter_search(queryset, text):
+    """Restricts 'queryset' to the rows matching the search 'text'.
+    The match is a subquery on the search index, so the queryset can still
+    be filtered, ordered and paginated as usual.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor not in ('sqlite', 'mysql'):
+        return _fallback(queryset, terms)
+
+    sql, params = _matching_sql(vendor, queryset.model._meta.db_table, terms)
+    return queryset.filter(pk__in=RawSQL(sql, params))
+
+
+def ranked_search(queryset, text, limit):
+    """Returns the best 'limit' rows of 'queryset' matching 'text', best first.
+    Only the top ids are read from the index, then loaded in one query.
+    """
+    terms = search_terms(text)
+    if not terms or limit <= 0:
+        return []
+
+    vendor = connections[queryset.db].vendor
+    if vendor not in ('sqlite', 'mysql'):
+        return list(_fallback(queryset, terms).order_by('pk')[:limit])
+
+    sql, params = _matching_sql(
+        vendor, queryset.model._meta.db_table, terms, ranked=True
+    )
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"{sql} LIMIT %s", params + [limit])
+        ids = [row[0] for row in cursor.fetchall()]
+
+    rows = queryset.in_bulk(ids)
+    return [rows[pk] for pk in ids if pk in rows]
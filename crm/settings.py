@@ -4,7 +4,7 @@ from celery.schedules import crontab
 INSTALLED_APPS += ['django_crontab']
 
 CRONJOBS = [
-    ('*/5 * * * *', 'crm.cron.log_crm_heartBeat'),
+    ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
     ('0 */12 * * *', 'crm.cron.update_low_stock'),
 ]
 
@@ -14,7 +14,6 @@ CRONJOBS = [
 
 INSTALLED_APPS += ['django_celery_beat']
 
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
 CELERY_BEAT_SCHEDULE = {
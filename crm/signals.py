@@ -0,0 +1,92 @@
+"""
+'signals' keeps derived data in step with writes to the CRM models.
+"""
+from collections import defaultdict
+from threading import local
+from django.db import connections
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+from .models import Customer, Product, Order, OrderItem, DailySalesRollup
+from .response_cache import invalidate_models
+from .search import install_search_index
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Order)
+def invalidate_cached_responses(sender, **kwargs):
+    """Drops the cached responses built from the written model.
+    """
+    invalidate_models(sender)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+@receiver(m2m_changed, sender=Order.product_id.through)
+def invalidate_cached_order_products(sender, **kwargs):
+    """Drops the cached responses reading the products of orders.
+    """
+    invalidate_models(OrderItem, Order, Product)
+
+
+# Orders (and their line items) a delete is removing, per delete operation
+_deleting = local()
+
+
+def _deletion(origin):
+    """Returns the (orders, units per order) noted for the delete started
+    by 'origin', which it also keeps alive so its id stays unique.
+    """
+    operations = getattr(_deleting, 'operations', None)
+    if operations is None:
+        operations = _deleting.operations = {}
+    return operations.setdefault(id(origin), (origin, {}, defaultdict(int)))[1:]
+
+
+@receiver(pre_delete, sender=Order)
+def note_deleted_order(sender, instance, origin=None, **kwargs):
+    """Notes an order a delete is about to remove, for 'remove_from_daily_sales'.
+    """
+    orders, _ = _deletion(origin)
+    orders[instance.pk] = (instance.order_date, instance.total_amount)
+
+
+@receiver(pre_delete, sender=OrderItem)
+def note_deleted_item(sender, instance, origin=None, **kwargs):
+    """Counts the units of the line items a delete is about to remove.
+    """
+    _, units = _deletion(origin)
+    units[instance.order_id] += instance.quantity
+
+
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_delete, sender=Order)
+def remove_from_daily_sales(sender, origin=None, **kwargs):
+    """Takes the orders of a delete out of their days' rollup at its first
+    removed row, in the deleting transaction. Every pre_delete signal of the
+    delete has run by then, so the rollup costs one UPDATE per day, however
+    many orders the delete (a queryset, a customer's cascade) removes.
+    """
+    operations = getattr(_deleting, 'operations', {})
+    _, orders, units = operations.pop(id(origin), (None, None, None))
+    if not orders:
+        return
+    DailySalesRollup.objects.record([
+        (order_date, total_amount, units.get(pk, 0))
+        for pk, (order_date, total_amount) in orders.items()
+    ], sign=-1)
+    invalidate_models(DailySalesRollup)
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, plan=None, **kwargs):
+    """Recreates the search triggers a table rebuild may have dropped.
+    """
+    if sender.name != 'crm' or not plan:
+        return
+    if any(migration.app_label == 'crm' and not backwards
+           for migration, backwards in plan):
+        install_search_index(connections[using])
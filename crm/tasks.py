@@ -1,41 +1,102 @@
-from celery import shared_task
-from datetime import datetime
-import requests
+from celery import chord, group, shared_task
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Reminder
+from .purge import purge_batches, start_purge
+from .reports import customers_partition, date_partitions, merge_report, orders_partition
 
 
 @shared_task
 def generate_crm_report():
-    query = """
-    {
-      allCustomers {
-        totalCount
-      }
-      allOrders {
-        edges {
-          node {
-            totalAmount
-          }
-        }
-      }
-    }
+    """Computes the report of the last 'CRM_REPORT_DAYS' days as parallel
+    subtasks, one per date range and one per customer-id shard, whose
+    summaries 'merge_crm_report' stores as a CrmReport once all are done.
     """
+    end = timezone.now()
+    start = end - timedelta(days=settings.CRM_REPORT_DAYS)
+    period = (start.isoformat(), end.isoformat())
 
-    try:
-        response = requests.post(
-            "http://localhost:8000/graphql",
-            json={"query": query},
-            timeout=10
-        )
-        data = response.json().get("data", {})
-
-        customers_count = data.get("allCustomers", {}).get("totalCount", 0)
-        orders = data.get("allOrders", {}).get("edges", [])
-        tital_revenue = sum(order["node"]["totalAmount"] for order in orders if order["node"]["totalAmount"])
-
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open("/tmp/crm_report_log.txt", "a") as f:
-            f.write(f"{timestamp} - Report: {customers_count} customers, {len(orders)} orders, ${total_revenue} revenue.")
-
-    except Exception as e:
-        with open("/tmp/crm_report_log.txt") as f:
-            f.write(f"{datetime.now()} - Failed to fetch CRM report: {str(e)}\n")
+    shards = settings.CRM_REPORT_CUSTOMER_SHARDS
+    partitions = [
+        report_orders_partition.s(*dates)
+        for dates in date_partitions(start, end, settings.CRM_REPORT_DATE_PARTITIONS)
+    ] + [
+        report_customers_partition.s(*period, shard, shards, settings.CRM_REPORT_TOP)
+        for shard in range(shards)
+    ]
+    merge = merge_crm_report.s(*period, settings.CRM_REPORT_TOP)
+    chord(group(partitions))(merge.on_error(log_crm_report_failure.s()))
+
+
+@shared_task
+def report_orders_partition(start, end):
+    return orders_partition(start, end)
+
+
+@shared_task
+def report_customers_partition(start, end, shard, shards, top):
+    return customers_partition(start, end, shard, shards, top)
+
+
+@shared_task
+def merge_crm_report(results, start, end, top):
+    """Stores the merged report and logs its headline figures.
+    Return:
+    	The id of the new CrmReport.
+    """
+    report = merge_report(results, start, end, top)
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open("/tmp/crm_report_log.txt", "a") as f:
+        f.write(f"{timestamp} - Report: {report.customer_count} customers, {report.order_count} orders, ${report.revenue} revenue.\n")
+    return report.pk
+
+
+@shared_task
+def log_crm_report_failure(request, exc, traceback):
+    with open("/tmp/crm_report_log.txt", "a") as f:
+        f.write(f"{datetime.now()} - Failed to build CRM report: {str(exc)}\n")
+
+
+@shared_task
+def send_reminder_batch(run_id, customer_ids):
+    """Sends the reminders a run still owes to 'customer_ids'.
+    Reminders already sent are skipped, so a batch queued twice (e.g. by a
+    resumed run) is only delivered once.
+    Return:
+    	The number of reminders sent.
+    """
+    with transaction.atomic():
+        reminders = Reminder.objects.filter(
+            run_id=run_id, customer_id__in=customer_ids, sent_at__isnull=True,
+        ).order_by('pk')
+        if connection.features.has_select_for_update_skip_locked:
+            reminders = reminders.select_for_update(skip_locked=True)
+        reminders = list(reminders)
+        if not reminders:
+            return 0
+
+        timestamp = datetime.now().isoformat()
+        with open("/tmp/order_reminders_log.txt", "a") as f:
+            f.write("".join(
+                f"{timestamp} - Order ID: {reminder.order_id}, Customer Email: {reminder.email}\n"
+                for reminder in reminders
+            ))
+        Reminder.objects.filter(pk__in=[reminder.pk for reminder in reminders]).update(sent_at=timezone.now())
+    return len(reminders)
+
+
+@shared_task
+def purge_inactive_customers(days=365):
+    """Deletes the customers without orders created more than 'days' days
+    ago, in batches, resuming the last purge if it did not complete.
+    Return:
+    	The number of customers the purge deleted.
+    """
+    run = start_purge(days)
+    for _ in purge_batches(run):
+        pass
+    with open("/tmp/customer_cleanup_log.txt", "a") as f:
+        f.write(f"{datetime.now()}: Deleted {run.deleted} inactive customers\n")
+    return run.deleted
@@ -1,3 +1,1431 @@
-from django.test import TestCase
+import json
+import re
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphene_django.debug.sql.tracking import unwrap_cursor
+from graphql_relay import from_global_id
+from .benchmarks import regression
+from .celery import app as celery_app
+from .documents import document_cache, query_hash
+from .filters import CustomerFilter, OrderFilter, ProductFilter
+from .loaders import CRMLoaders
+from .models import (
+    Customer, CrmReport, DailySalesRollup, Order, OrderItem, Product, PurgeRun,
+    Reminder, ReminderRun,
+)
+from .cron import update_low_stock
+from .executor import OperationError, run_operation
+from .purge import purge_batches, start_purge
+from .reminders import ORDERS_PAGE, record_page, send_reminders, start_run
+from .routers import replica_reads, request_routing
+from .schema import _restock
+from .search import filter_search
+from .tasks import generate_crm_report, send_reminder_batch
 
-# Create your tests here.
+
+# ---------------------------------------------------------
+# Filtersets
+# ---------------------------------------------------------
+class FilterSetTests(TestCase):
+    """Checks every filter of the filtersets can run."""
+
+    def test_method_filters_have_their_method(self):
+        for filterset in (CustomerFilter, ProductFilter, OrderFilter):
+            for name, declared in filterset.declared_filters.items():
+                if isinstance(declared.method, str):
+                    with self.subTest(filter=f'{filterset.__name__}.{name}'):
+                        self.assertTrue(callable(getattr(filterset, declared.method, None)))
+
+    def test_phone_pattern_matches_the_prefix_only(self):
+        for index, phone in enumerate(['+15550001', '+15559999', '+1556', '15550001', None]):
+            Customer.objects.create(name="C", email=f'c{index}@example.com', phone=phone)
+        phones = CustomerFilter({'phone_pattern': '+1555'}, Customer.objects.all()).qs.values_list('phone', flat=True)
+        self.assertEqual(sorted(phones), ['+15550001', '+15559999'])
+
+    def test_order_filters_run(self):
+        response = self.client.post('/graphql', {'query': """
+            { allOrders(productName: "lamp", productId: 1, customerName: "a",
+                        totalAmount_Gte: 1) { edges { node { id } } } }
+        """}, content_type='application/json')
+        self.assertEqual(response.json()['data']['allOrders']['edges'], [])
+
+
+# ---------------------------------------------------------
+# Query plans of the indexed filters
+# ---------------------------------------------------------
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN is SQLite syntax.")
+class FilterIndexTests(TestCase):
+    """Checks every indexed filter combination seeks an index.
+    The substring filters ('icontains') cannot use a B-tree index and are
+    left out on purpose.
+    """
+    filter_combinations = [
+        (CustomerFilter, {'created_at__gte': '2025-01-01'}),
+        (CustomerFilter, {'created_at__gte': '2025-01-01', 'created_at__lte': '2025-02-01'}),
+        (CustomerFilter, {'phone_pattern': '+1'}),
+        (ProductFilter, {'price__gte': '10'}),
+        (ProductFilter, {'price__gte': '10', 'price__lte': '50'}),
+        (ProductFilter, {'stock__gte': '5', 'stock__lte': '20'}),
+        (ProductFilter, {'low_stock': 'true'}),
+        (OrderFilter, {'order_date__gte': '2025-01-01T00:00:00Z'}),
+        (OrderFilter, {
+            'order_date__gte': '2025-01-01T00:00:00Z',
+            'order_date__lte': '2025-02-01T00:00:00Z',
+        }),
+        (OrderFilter, {'total_amount__gte': '100'}),
+        (OrderFilter, {'total_amount__gte': '100', 'total_amount__lte': '500'}),
+    ]
+
+    @staticmethod
+    def query_plan(queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_filters_use_an_index(self):
+        for filterset_class, data in self.filter_combinations:
+            model = filterset_class._meta.model
+            queryset = filterset_class(data=data, queryset=model.objects.all()).qs
+            with self.subTest(filterset=filterset_class.__name__, data=data):
+                plan = self.query_plan(queryset)
+                scans = [
+                    step for step in plan
+                    if re.match(r'SCAN \w+$', step) and 'USING' not in step
+                ]
+                self.assertFalse(scans, f"Full table scan: {plan}")
+
+    def test_customer_orders_use_an_index(self):
+        plan = self.query_plan(Order.objects.filter(customer_id=1).order_by('order_date'))
+        self.assertTrue(
+            any('crm_order_customer_date_idx' in step for step in plan), plan
+        )
+
+
+# ---------------------------------------------------------
+# Aggregated CRM figures
+# ---------------------------------------------------------
+@override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False})
+class CrmStatsTests(TestCase):
+    """Checks 'crmStats' against the orders it sums, in one query."""
+    query = """
+        query ($since: DateTime) {
+            crmStats(orderDate_Gte: $since) { customerCount orderCount revenue averageOrderValue }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        buyer = Customer.objects.create(name="Buyer", email="buyer@example.com")
+        Customer.objects.create(name="Idle", email="idle@example.com")
+        now = timezone.now()
+        for days_ago, total in ((1, '10.00'), (2, '25.00'), (30, '100.00')):
+            Order.objects.create(customer_id=buyer, order_date=now - timedelta(days=days_ago),
+                                 total_amount=Decimal(total))
+
+    def stats(self, since=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/graphql', {'query': self.query, 'variables': {'since': since}},
+                                        content_type='application/json')
+        self.assertEqual(len(queries), 1)
+        return response.json()['data']['crmStats']
+
+    def test_stats_over_every_order(self):
+        self.assertEqual(self.stats(), {
+            'customerCount': 2, 'orderCount': 3, 'revenue': '135.00', 'averageOrderValue': '45.00',
+        })
+
+    def test_stats_over_a_window(self):
+        since = (timezone.now() - timedelta(days=7)).isoformat()
+        stats = self.stats(since)
+        self.assertEqual((stats['orderCount'], stats['revenue'], stats['averageOrderValue']), (2, '35.00', '17.50'))
+
+
+# ---------------------------------------------------------
+# Query plans built from the selection set
+# ---------------------------------------------------------
+@override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False})
+class QueryPlannerTests(TestCase):
+    """Checks connections load the columns and relations their selection
+    set asks for, and nothing else.
+    """
+    query = """
+        fragment buyer on CustomerType { name }
+        { allOrders { edges { node { totalAmount customer { ...buyer } items { quantity product { name } } } } } }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name="Buyer", email="buyer@example.com", phone="+15550001")
+        cls.product = Product.objects.create(name="Lamp", price=Decimal('5.00'), stock=10)
+
+    def add_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(customer_id=self.customer)
+            OrderItem.objects.create(order=order, product=self.product, quantity=1, unit_price=Decimal('5.00'))
+
+    def run_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/graphql', {'query': self.query}, content_type='application/json')
+        self.assertNotIn('errors', response.json())
+        return [q['sql'] for q in queries]
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self.add_orders(2)
+        few = self.run_query()
+        self.add_orders(8)
+        self.assertEqual(len(few), len(self.run_query()))
+
+    def test_only_selected_columns_are_loaded(self):
+        self.add_orders(1)
+        orders = next(sql for sql in self.run_query() if sql.startswith('SELECT') and 'FROM "crm_order"' in sql
+                      and 'COUNT(' not in sql)
+        self.assertIn('"crm_customer"."name"', orders)
+        self.assertNotIn('"crm_customer"."phone"', orders)
+        self.assertNotIn('"crm_customer"."email"', orders)
+
+
+# ---------------------------------------------------------
+# Resolver and SQL tracing
+# ---------------------------------------------------------
+@override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False})
+class TracingTests(TestCase):
+    """Checks the trace the client asks for attributes the SQL to the fields
+    that issued it, and slow requests are logged.
+    """
+    query = '{ hello allCustomers(first: 5) { edges { node { name orderSet(first: 5) { edges { node { id } } } } } } }'
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.create(name="Buyer", email="buyer@example.com")
+        Order.objects.create(customer_id=customer)
+
+    def post(self, extensions=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/graphql', {'query': self.query, 'extensions': extensions or {}},
+                                        content_type='application/json')
+        return response.json(), queries
+
+    def test_traces_are_only_sent_on_request(self):
+        body, _ = self.post()
+        self.assertNotIn('tracing', body.get('extensions', {}))
+
+    def test_sql_is_attributed_to_the_resolving_fields(self):
+        body, queries = self.post({'tracing': True})
+        tracing = body['extensions']['tracing']
+        self.assertEqual(tracing['sql']['count'], len(queries))
+        resolvers = {'.'.join(map(str, entry['path'])): entry for entry in tracing['execution']['resolvers']}
+        self.assertEqual(resolvers['hello']['sqlCount'], 0)
+        self.assertGreater(resolvers['allCustomers']['sqlCount'], 0)
+        self.assertEqual(sum(entry['sqlCount'] for entry in resolvers.values()), len(queries))
+
+    @override_settings(CRM_TRACING={**settings.CRM_TRACING, 'SLOW_REQUEST_MS': 0})
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('crm.tracing', 'WARNING') as logs:
+            self.post()
+        self.assertIn("SQL queries", logs.output[0])
+
+
+# ---------------------------------------------------------
+# Query counts of the benchmarked operations
+# ---------------------------------------------------------
+@override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False})
+class QueryCountTests(TestCase):
+    """Runs every operation of the regression benchmark at two page sizes.
+    An operation whose query count grows with its page size has an N+1;
+    one issuing more queries than the stored baseline has regressed.
+    Latency is only checked by 'python -m crm.benchmarks.regression', as it
+    depends on the machine.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixtures = regression.seed(orders=200)
+        cls.baseline = json.loads(regression.BASELINE.read_text())['1000']
+
+    def test_query_counts_do_not_grow_with_page_size(self):
+        for name in regression.OPERATIONS:
+            with self.subTest(operation=name):
+                counts = regression.query_counts(self.client, name, self.fixtures)
+                self.assertEqual(len(set(counts.values())), 1, counts)
+
+    def test_query_counts_within_baseline(self):
+        for name in regression.OPERATIONS:
+            with self.subTest(operation=name):
+                counts = regression.query_counts(self.client, name, self.fixtures)
+                self.assertLessEqual(
+                    max(counts.values()), self.baseline[name]['queries'], counts
+                )
+
+
+# ---------------------------------------------------------
+# Restocking
+# ---------------------------------------------------------
+class RestockTests(TestCase):
+    """Checks 'updateLowStockProducts' returns the stock it wrote and leaves
+    the other products alone.
+    """
+    mutation = """
+        mutation { updateLowStockProducts(threshold: 10, increment: 5) {
+            success output { name stock } } }
+    """
+
+    def test_restocks_only_the_low_stock_products(self):
+        Product.objects.create(name="Lamp", price=Decimal('5.00'), stock=2)
+        Product.objects.create(name="Desk", price=Decimal('90.00'), stock=40)
+        response = self.client.post('/graphql', {'query': self.mutation}, content_type='application/json')
+        result = response.json()['data']['updateLowStockProducts']
+        self.assertEqual(result['output'], [{'name': "Lamp", 'stock': 7}])
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'stock')), {"Lamp": 7, "Desk": 40}
+        )
+
+    def test_restocks_in_one_update_returning_the_rows(self):
+        Product.objects.create(name="Lamp", price=Decimal('5.00'), stock=2)
+        with CaptureQueriesContext(connection) as queries:
+            products = _restock(10, 5)
+        statements = [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertRegex(statements[0], r'^UPDATE .* RETURNING')
+        self.assertEqual([(product.name, product.stock, product.price) for product in products],
+                         [("Lamp", 7, Decimal('5.00'))])
+
+    def test_restocks_without_returning(self):
+        Product.objects.create(name="Lamp", price=Decimal('5.00'), stock=2)
+        Product.objects.create(name="Desk", price=Decimal('90.00'), stock=40)
+        with mock.patch('crm.schema._updates_return_rows', return_value=False):
+            products = _restock(10, 5)
+        self.assertEqual([(product.name, product.stock) for product in products], [("Lamp", 7)])
+        self.assertEqual(dict(Product.objects.values_list('name', 'stock')), {"Lamp": 7, "Desk": 40})
+
+    def test_restocked_products_are_served_fresh(self):
+        product = Product.objects.create(name="Lamp", price=Decimal('5.00'), stock=2)
+        query = {'query': '{ allProducts { edges { node { stock } } } }'}
+        self.client.post('/graphql', query, content_type='application/json')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/graphql', {'query': self.mutation}, content_type='application/json')
+        response = self.client.post('/graphql', query, content_type='application/json')
+        edges = response.json()['data']['allProducts']['edges']
+        self.assertEqual(edges, [{'node': {'stock': product.stock + 5}}])
+
+
+# ---------------------------------------------------------
+# Partitioned CRM report
+# ---------------------------------------------------------
+class CeleryConfigurationTests(SimpleTestCase):
+    """Checks the Celery app reads the project settings (eager tests would
+    not notice a chord without a result backend).
+    """
+
+    def test_result_backend_is_configured(self):
+        self.assertEqual(celery_app.conf.result_backend, settings.CELERY_RESULT_BACKEND)
+        self.assertNotIn(celery_app.conf.result_backend, (None, '', 'disabled'))
+        self.assertEqual(celery_app.conf.broker_url, settings.CELERY_BROKER_URL)
+
+
+def run_celery_eagerly(test):
+    """Runs the Celery tasks of 'test' in process, on the in-memory broker
+    and result backend (the tests have no Redis), until it ends.
+    """
+    # The namespaced keys are the ones read while CELERY_* settings are set.
+    overrides = {
+        'task_always_eager': True,
+        'task_eager_propagates': True,
+        'CELERY_BROKER_URL': 'memory://',
+        'CELERY_RESULT_BACKEND': 'cache+memory://',
+    }
+    for key, value in overrides.items():
+        test.addCleanup(setattr, celery_app.conf, key, getattr(celery_app.conf, key, None))
+        setattr(celery_app.conf, key, value)
+
+
+@override_settings(
+    CRM_REPORT_DATE_PARTITIONS=3,
+    CRM_REPORT_CUSTOMER_SHARDS=2,
+    CRM_REPORT_TOP=2,
+    CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False},
+)
+class CrmReportTests(TestCase):
+    """Runs the report chord with Celery in eager mode and checks the merged partitions against the seeded orders.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        customers = [
+            Customer.objects.create(name=f"Customer {index}", email=f"customer{index}@example.com")
+            for index in range(4)
+        ]
+        products = [
+            Product.objects.create(name=f"Product {index}", price=Decimal('10.00') * (index + 1))
+            for index in range(3)
+        ]
+        # (customer, product, quantity, days ago); the last order is out of the window.
+        lines = [
+            (0, 0, 1, 1), (0, 1, 2, 2), (1, 2, 1, 3), (2, 0, 5, 6),
+            (3, 2, 3, 5), (3, 1, 1, 0.5), (1, 0, 9, 30),
+        ]
+        for customer, product, quantity, days in lines:
+            order = Order.objects.create(
+                customer_id=customers[customer],
+                order_date=now - timedelta(days=days),
+                total_amount=products[product].price * quantity,
+            )
+            OrderItem.objects.create(
+                order=order, product=products[product],
+                quantity=quantity, unit_price=products[product].price,
+            )
+        cls.customers, cls.products = customers, products
+
+    def setUp(self):
+        run_celery_eagerly(self)
+
+    def run_report(self):
+        with mock.patch('crm.tasks.open', mock.mock_open(), create=True):
+            generate_crm_report.delay()
+        return CrmReport.objects.latest()
+
+    def test_report_merges_partitions(self):
+        report = self.run_report()
+        self.assertEqual(report.customer_count, 4)
+        self.assertEqual(report.active_customer_count, 4)
+        self.assertEqual(report.order_count, 6)
+        self.assertEqual(report.revenue, Decimal('240.00'))
+        self.assertEqual(report.average_order_value, Decimal('40.00'))
+        self.assertEqual(
+            [(row['product_id'], row['units_sold'], row['revenue']) for row in report.top_products],
+            [(self.products[2].pk, 4, '120.00'), (self.products[0].pk, 6, '60.00')],
+        )
+        self.assertEqual(
+            [(row['email'], row['order_count'], row['revenue']) for row in report.top_customers],
+            [('customer3@example.com', 2, '110.00'), ('customer0@example.com', 2, '50.00')],
+        )
+
+    def test_latest_crm_report_field(self):
+        self.run_report()
+        latest = self.run_report()
+        response = self.client.post('/graphql', {'query': """
+            { latestCrmReport {
+                id orderCount revenue
+                topProducts { name unitsSold revenue }
+                topCustomers { email orderCount }
+            } }
+        """}, content_type='application/json')
+        report = response.json()['data']['latestCrmReport']
+        self.assertEqual(report['id'], str(latest.pk))
+        self.assertEqual(report['orderCount'], 6)
+        self.assertEqual(report['topProducts'][0], {
+            'name': 'Product 2', 'unitsSold': 4, 'revenue': '120.00',
+        })
+        self.assertEqual(report['topCustomers'][0]['email'], 'customer3@example.com')
+
+
+# ---------------------------------------------------------
+# Daily sales rollup
+# ---------------------------------------------------------
+class DailySalesRollupTests(TestCase):
+    """Checks the rollup kept up to date by the writes matches the one
+    rebuilt from the orders.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name="Buyer", email="buyer@example.com")
+        cls.product = Product.objects.create(name="Lamp", price=Decimal('5.00'))
+
+    def add_orders(self, count, days_ago=1, customer=None):
+        orders = []
+        for index in range(count):
+            order = Order.objects.create(
+                customer_id=customer or self.customer,
+                order_date=timezone.now() - timedelta(days=days_ago, minutes=index),
+                total_amount=Decimal('10.00'),
+            )
+            OrderItem.objects.create(order=order, product=self.product, quantity=2, unit_price=Decimal('5.00'))
+            orders.append(order)
+        DailySalesRollup.objects.rebuild()
+        return orders
+
+    def assertMatchesRebuild(self):
+        rows = lambda: sorted(DailySalesRollup.objects.filter(order_count__gt=0).values_list(
+            'date', 'order_count', 'revenue', 'units_sold',
+        ))
+        incremental = rows()
+        DailySalesRollup.objects.rebuild()
+        self.assertEqual(incremental, rows())
+
+    def test_deleting_orders_costs_the_same_whatever_their_number(self):
+        self.add_orders(3)
+        with CaptureQueriesContext(connection) as few:
+            Order.objects.filter(pk__in=Order.objects.values('pk')[:1]).delete()
+        self.assertMatchesRebuild()
+
+        self.add_orders(10)
+        with CaptureQueriesContext(connection) as many:
+            Order.objects.filter(pk__in=Order.objects.values('pk')[:10]).delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(len(few), len(many))
+
+    def sales_by_day(self, since, until):
+        response = self.client.post('/graphql', {'query': """
+            query ($from: Date!, $to: Date!) {
+                salesByDay(from: $from, to: $to) { date orderCount revenue unitsSold }
+            }
+        """, 'variables': {'from': since.isoformat(), 'to': until.isoformat()}},
+            content_type='application/json')
+        return response.json()
+
+    def test_sales_by_day_zero_fills_days_without_orders(self):
+        self.add_orders(2, days_ago=2)
+        today = timezone.localdate()
+        days = self.sales_by_day(today - timedelta(days=3), today)['data']['salesByDay']
+        self.assertEqual([day['date'] for day in days],
+                         [(today - timedelta(days=offset)).isoformat() for offset in (3, 2, 1, 0)])
+        self.assertEqual([day['orderCount'] for day in days], [0, 2, 0, 0])
+        self.assertEqual([day['unitsSold'] for day in days], [0, 4, 0, 0])
+
+    @override_settings(CRM_SALES_BY_DAY_MAX_DAYS=7)
+    def test_sales_by_day_rejects_reversed_or_long_ranges(self):
+        today = timezone.localdate()
+        for since, until in ((today, today - timedelta(days=1)), (today - timedelta(days=7), today)):
+            with self.subTest(since=since, until=until):
+                self.assertIsNone(self.sales_by_day(since, until)['data']['salesByDay'])
+
+    def test_created_orders_update_the_rollup(self):
+        response = self.client.post('/graphql', {'query': """
+            mutation ($customer: ID!, $product: ID!) {
+                createOrder(customerId: $customer, items: [{productId: $product, quantity: 3}]) { success }
+            }
+        """, 'variables': {'customer': self.customer.pk, 'product': self.product.pk}},
+            content_type='application/json')
+        self.assertTrue(response.json()['data']['createOrder']['success'])
+        self.assertMatchesRebuild()
+        self.assertEqual(DailySalesRollup.objects.get().units_sold, 3)
+
+    def test_customer_cascade_updates_the_rollup(self):
+        other = Customer.objects.create(name="Other", email="other@example.com")
+        self.add_orders(2, days_ago=1)
+        self.add_orders(3, days_ago=2, customer=other)
+        other.delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(DailySalesRollup.objects.aggregate(Sum('units_sold'))['units_sold__sum'], 4)
+
+
+# ---------------------------------------------------------
+# Synthetic data loading
+# ---------------------------------------------------------
+class SeedCommandTests(TestCase):
+    """Checks 'seed_crm' keeps its generated sign-up dates and '--clear'
+    empties every table pointing at the seeded rows.
+    """
+
+    def setUp(self):
+        # Under DEBUG, graphene-django's debug middleware leaves the cursors
+        # of earlier GraphQL requests wrapped, and its wrapper cannot log an
+        # 'executemany' on SQLite.
+        for alias in connections:
+            unwrap_cursor(connections[alias])
+
+    def seed(self, *args):
+        call_command(
+            'seed_crm', '--customers', '20', '--products', '5', '--orders', '30',
+            '--end-date', '2025-06-30', '--days', '30', *args, stdout=tempfile.TemporaryFile('w+'),
+        )
+
+    def test_customers_keep_their_generated_sign_up_dates(self):
+        self.seed()
+        created = Customer.objects.values_list('created_at', flat=True)
+        self.assertTrue(all(value.year == 2025 and value.month <= 6 for value in created))
+        self.assertTrue(Customer._meta.get_field('created_at').auto_now_add)
+
+    def test_clear_deletes_the_dependent_rows(self):
+        self.seed()
+        order = Order.objects.select_related('customer_id').first()
+        now = timezone.now()
+        run = ReminderRun.objects.create(window_start=now, window_end=now)
+        Reminder.objects.create(run=run, customer=order.customer_id, order=order, email=order.customer_id.email)
+        PurgeRun.objects.create(cutoff=now)
+        CrmReport.objects.create(period_start=now, period_end=now)
+
+        self.seed('--clear', '--seed', '1')
+        self.assertEqual(Customer.objects.count(), 20)
+        self.assertEqual(Order.objects.count(), 30)
+        for model in (Reminder, ReminderRun, PurgeRun, CrmReport):
+            with self.subTest(model=model.__name__):
+                self.assertFalse(model.objects.exists())
+
+
+# ---------------------------------------------------------
+# Keyset pagination
+# ---------------------------------------------------------
+@override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False})
+class KeysetPaginationTests(TestCase):
+    """Walks 'allOrders(keyset: true)' page by page over orders sharing
+    their dates, forward and backward.
+    """
+    query = """
+        query ($first: Int, $last: Int, $after: String, $before: String) {
+            allOrders(keyset: true, first: $first, last: $last, after: $after, before: $before) {
+                edges { node { id } }
+                pageInfo { startCursor endCursor hasNextPage hasPreviousPage }
+            }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.create(name="Buyer", email="buyer@example.com")
+        day = timezone.now() - timedelta(days=3)
+        # Pairs of orders on the same instant: only the id breaks the tie.
+        cls.orders = [
+            Order.objects.create(customer_id=customer, order_date=day + timedelta(hours=index // 2))
+            for index in range(7)
+        ]
+
+    def page(self, **variables):
+        response = self.client.post(
+            '/graphql', {'query': self.query, 'variables': variables}, content_type='application/json',
+        )
+        return response.json()
+
+    def ids(self, body):
+        return [int(from_global_id(edge['node']['id'])[1]) for edge in body['data']['allOrders']['edges']]
+
+    def test_forward_pages_cover_every_order_once(self):
+        seen, after = [], None
+        while True:
+            body = self.page(first=2, after=after)
+            seen += self.ids(body)
+            info = body['data']['allOrders']['pageInfo']
+            if not info['hasNextPage']:
+                break
+            after = info['endCursor']
+        self.assertEqual(seen, [order.pk for order in self.orders])
+
+    def test_backward_pages_cover_every_order_once(self):
+        seen, before = [], None
+        while True:
+            body = self.page(last=3, before=before)
+            seen = self.ids(body) + seen
+            info = body['data']['allOrders']['pageInfo']
+            if not info['hasPreviousPage']:
+                break
+            before = info['startCursor']
+        self.assertEqual(seen, [order.pk for order in self.orders])
+
+    @override_settings(CRM_KEYSET_MAX_PAGE_SIZE=3)
+    def test_page_size_is_capped(self):
+        body = self.page(first=50)
+        self.assertEqual(self.ids(body), [order.pk for order in self.orders[:3]])
+        self.assertTrue(body['data']['allOrders']['pageInfo']['hasNextPage'])
+
+    def test_pages_are_not_counted(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.page(first=2)
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'].upper()])
+
+    def test_invalid_cursors_are_rejected(self):
+        body = self.page(first=2, after='not-a-cursor')
+        self.assertIn('Invalid keyset cursor', body['errors'][0]['message'])
+
+
+# ---------------------------------------------------------
+# Document cache and persisted queries
+# ---------------------------------------------------------
+class PersistedQueryTests(TestCase):
+    """Sends operations the APQ way: the hash alone, then the hash with
+    its query when the server does not know it yet.
+    """
+    query = '{ hello }'
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, query=None, sha256=None, version=1):
+        body = {'extensions': {'persistedQuery': {'version': version, 'sha256Hash': sha256 or query_hash(self.query)}}}
+        if query:
+            body['query'] = query
+        return self.client.post('/graphql', body, content_type='application/json')
+
+    def error_code(self, response):
+        return response.json()['errors'][0]['extensions']['code']
+
+    def test_unknown_hashes_ask_for_the_query(self):
+        self.assertEqual(self.error_code(self.post()), 'PERSISTED_QUERY_NOT_FOUND')
+
+    def test_registered_queries_run_from_their_hash(self):
+        self.assertEqual(self.post(self.query).json()['data'], {'hello': 'Hello, GraphQL!'})
+        self.assertEqual(self.post().json()['data'], {'hello': 'Hello, GraphQL!'})
+
+    def test_mismatched_hashes_are_rejected(self):
+        response = self.post(self.query, sha256=query_hash('{ allProducts { totalCount } }'))
+        self.assertEqual(self.error_code(response), 'BAD_REQUEST')
+        self.assertEqual(self.error_code(self.post()), 'PERSISTED_QUERY_NOT_FOUND')
+
+    def test_unsupported_versions_are_rejected(self):
+        self.assertEqual(self.error_code(self.post(self.query, version=2)), 'PERSISTED_QUERY_NOT_SUPPORTED')
+
+    def test_documents_are_parsed_once(self):
+        query = '{ hello documentCacheProbe: hello }'
+        misses = document_cache.stats()['misses']
+        for _ in range(3):
+            self.client.post('/graphql', {'query': query}, content_type='application/json')
+        self.assertEqual(document_cache.stats()['misses'], misses + 1)
+
+
+# ---------------------------------------------------------
+# Query cost and depth limits
+# ---------------------------------------------------------
+@override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False})
+class QueryCostTests(TestCase):
+    """Checks over-budget operations are refused before any SQL runs, and
+    accepted ones report their cost.
+    """
+    orders = '{ allOrders(first: %d) { edges { node { customer { name } items { quantity } } } } }'
+
+    def post(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/graphql', {'query': query}, content_type='application/json')
+        return response, queries
+
+    def test_deep_queries_are_refused_unrun(self):
+        response, queries = self.post("""
+            { allCustomers { edges { node { orderSet { edges { node { customer {
+                orderSet { edges { node { customer { name } } } } } } } } } } } }
+        """)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['extensions']['code'], 'QUERY_TOO_DEEP')
+        self.assertEqual(len(queries), 0)
+
+    @override_settings(CRM_QUERY_MAX_COST=100)
+    def test_costly_queries_are_refused_unrun(self):
+        response, queries = self.post(self.orders % 50)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['extensions']['code'], 'QUERY_TOO_COMPLEX')
+        self.assertEqual(len(queries), 0)
+
+    def test_cost_grows_with_the_page_size(self):
+        small = self.post(self.orders % 5)[0].json()['extensions']['cost']
+        large = self.post(self.orders % 50)[0].json()['extensions']['cost']
+        self.assertEqual(small['depth'], large['depth'])
+        self.assertLess(small['requestedCost'], large['requestedCost'])
+        self.assertLessEqual(large['requestedCost'], large['maximumCost'])
+
+
+# ---------------------------------------------------------
+# Full-text search
+# ---------------------------------------------------------
+@override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False})
+class SearchTests(TestCase):
+    """Searches customers and products through the index kept in step with
+    their tables by triggers (SQLite) or FULLTEXT indexes (MySQL).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Customer.objects.create(name="Alice Dubois", email="alice@example.com")
+        cls.jose = Customer.objects.create(name="José Garcia", email="jg@example.org")
+        Product.objects.create(name="Desk Lamp", price=Decimal('20.00'), stock=1)
+        Product.objects.create(name="Office Chair", price=Decimal('90.00'), stock=1)
+
+    def search(self, text):
+        return list(filter_search(Customer.objects.all(), text).order_by('pk'))
+
+    def test_terms_match_word_prefixes(self):
+        self.assertEqual(self.search("ali exa"), [self.alice])
+        self.assertEqual(self.search("jose"), [self.jose])
+        self.assertEqual(self.search("example.com"), [self.alice])
+
+    def test_search_operators_are_ignored(self):
+        self.assertEqual(self.search('ali* -"dub'), [self.alice])
+        self.assertEqual(self.search('" * -'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        Customer.objects.filter(pk=self.alice.pk).update(name="Alicia Martin")
+        self.assertEqual(self.search("dubois"), [])
+        self.assertEqual(self.search("martin"), [self.alice])
+        self.jose.delete()
+        self.assertEqual(self.search("garcia"), [])
+
+    def test_search_fields(self):
+        response = self.client.post('/graphql', {'query': """
+            { searchCustomers(query: "gar") { name }
+              allProducts(search: "lam") { edges { node { name } } } }
+        """}, content_type='application/json')
+        data = response.json()['data']
+        self.assertEqual(data['searchCustomers'], [{'name': "José Garcia"}])
+        self.assertEqual(data['allProducts']['edges'], [{'node': {'name': "Desk Lamp"}}])
+
+
+# ---------------------------------------------------------
+# Streaming exports
+# ---------------------------------------------------------
+class ExportTests(TestCase):
+    """Downloads the filtered exports of orders and customers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name="Buyer", email="buyer@example.com", phone="+15550001")
+        cls.product = Product.objects.create(name="Lamp", price=Decimal('5.00'), stock=10)
+
+    def add_orders(self, count):
+        for index in range(count):
+            order = Order.objects.create(customer_id=self.customer, total_amount=Decimal(10 * (index + 1)))
+            OrderItem.objects.create(order=order, product=self.product, quantity=1, unit_price=Decimal('5.00'))
+
+    def export(self, resource, **params):
+        response = self.client.get(f'/export/{resource}', params)
+        content = b''.join(response.streaming_content).decode() if response.streaming else None
+        return response, content
+
+    def test_orders_stream_as_ndjson(self):
+        self.add_orders(3)
+        response, content = self.export('orders', total_amount__gte='15')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['total_amount'] for row in rows], ['20.00', '30.00'])
+        self.assertEqual(rows[0]['customer_email'], "buyer@example.com")
+        self.assertEqual(rows[0]['product_ids'], [self.product.pk])
+
+    def test_customers_stream_as_csv(self):
+        response, content = self.export('customers', format='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        header, row = content.splitlines()
+        self.assertEqual(header, 'id,name,email,phone,created_at')
+        self.assertTrue(row.startswith(f'{self.customer.pk},Buyer,buyer@example.com,+15550001,'))
+
+    def test_query_count_does_not_grow_with_the_rows(self):
+        self.add_orders(2)
+        with CaptureQueriesContext(connection) as few:
+            self.export('orders')
+        self.add_orders(8)
+        with CaptureQueriesContext(connection) as many:
+            self.export('orders')
+        self.assertEqual(len(few), len(many))
+
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.export('orders', format='xml')[0].status_code, 400)
+        self.assertEqual(self.export('orders', total_amount__gte='lots')[0].status_code, 400)
+        self.assertEqual(self.export('products')[0].status_code, 404)
+
+
+# ---------------------------------------------------------
+# Line item migration
+# ---------------------------------------------------------
+class OrderItemTests(TestCase):
+    """Checks order totals are summed from line items priced when ordered."""
+
+    def test_totals_follow_the_snapshotted_prices(self):
+        customer = Customer.objects.create(name="Buyer", email="buyer@example.com")
+        lamp = Product.objects.create(name="Lamp", price=Decimal('5.00'), stock=10)
+        response = self.client.post('/graphql', {'query': """
+            mutation ($customer: ID!, $lamp: ID!) {
+                createOrder(customerId: $customer, productIds: [$lamp], items: [{productId: $lamp, quantity: 2}]) {
+                    order { totalAmount items { quantity unitPrice } }
+                }
+            }
+        """, 'variables': {'customer': customer.pk, 'lamp': lamp.pk}}, content_type='application/json')
+        order = response.json()['data']['createOrder']['order']
+        self.assertEqual(order, {'totalAmount': '15.00', 'items': [{'quantity': 3, 'unitPrice': '5.00'}]})
+
+        Product.objects.filter(pk=lamp.pk).update(price=Decimal('7.00'))
+        Order.objects.all().recompute_totals()
+        self.assertEqual(Order.objects.get().total_amount, Decimal('15.00'))
+
+
+class OrderItemMigrationTests(TransactionTestCase):
+    """Migrates orders linked to their products by the implicit through
+    table onto line items, and back.
+    """
+    before = ('crm', '0004_order_date_default')
+    after = ('crm', '0005_orderitem')
+
+    def migrate(self, target):
+        call_command('migrate', *target, verbosity=0)
+        return MigrationLoader(connection).project_state(target).apps
+
+    def tearDown(self):
+        call_command('migrate', 'crm', verbosity=0)
+
+    def test_links_become_line_items_and_back(self):
+        apps = self.migrate(self.before)
+        customer = apps.get_model('crm', 'Customer').objects.create(name="Buyer", email="buyer@example.com")
+        Product = apps.get_model('crm', 'Product')
+        lamp = Product.objects.create(name="Lamp", price=Decimal('5.00'), stock=1)
+        desk = Product.objects.create(name="Desk", price=Decimal('80.00'), stock=1)
+        order = apps.get_model('crm', 'Order').objects.create(customer_id=customer, total_amount=Decimal('85.00'))
+        order.product_id.set([lamp, desk])
+
+        apps = self.migrate(self.after)
+        items = apps.get_model('crm', 'OrderItem').objects.order_by('product_id')
+        self.assertEqual(
+            list(items.values_list('order_id', 'product_id', 'quantity', 'unit_price')),
+            [(order.pk, lamp.pk, 1, Decimal('5.00')), (order.pk, desk.pk, 1, Decimal('80.00'))],
+        )
+
+        apps = self.migrate(self.before)
+        order = apps.get_model('crm', 'Order').objects.get()
+        self.assertEqual(sorted(order.product_id.values_list('pk', flat=True)), [lamp.pk, desk.pk])
+
+
+# ---------------------------------------------------------
+# Single customer and product creation
+# ---------------------------------------------------------
+class CreateRecordTests(TestCase):
+    """Creates one customer and one product, and rejects invalid input."""
+
+    def post(self, mutation):
+        response = self.client.post('/graphql', {'query': mutation}, content_type='application/json')
+        return response.json()['data']
+
+    def create_customer(self, email, phone):
+        return self.post(
+            f'mutation {{ createCustomer(name: "Ann", email: "{email}", phone: "{phone}") '
+            '{ success message customer { email phone } } }'
+        )['createCustomer']
+
+    def test_customers_are_created_once_per_email(self):
+        result = self.create_customer("ann@example.com", "555-123-4567")
+        self.assertTrue(result['success'], result['message'])
+        self.assertEqual(result['customer'], {'email': "ann@example.com", 'phone': "555-123-4567"})
+        self.assertEqual(self.create_customer("ann@example.com", "+15550001")['message'],
+                         "Email already exists")
+        self.assertEqual(self.create_customer("bob@example.com", "nope")['message'],
+                         "Invalid phone format")
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_products_may_start_out_of_stock(self):
+        result = self.post(
+            'mutation { createProduct(name: "Desk", price: "50.00", stock: 0) '
+            '{ success product { name stock } } }'
+        )['createProduct']
+        self.assertTrue(result['success'])
+        self.assertEqual(result['product'], {'name': "Desk", 'stock': 0})
+        result = self.post(
+            'mutation { createProduct(name: "Desk", price: "50.00", stock: -1) { success message } }'
+        )['createProduct']
+        self.assertEqual(result, {'success': False, 'message': "Stock must be non-negative"})
+
+
+# ---------------------------------------------------------
+# Bulk customer creation
+# ---------------------------------------------------------
+class BulkCreateCustomersTests(TestCase):
+    """Creates customers in bulk, checking each row's errors set-wise."""
+    mutation = """
+        mutation ($customers: [CustomerInput]!, $chunkSize: Int) {
+            bulkCreateCustomers(customers: $customers, chunkSize: $chunkSize) {
+                success errors createdCustomers { email }
+            }
+        }
+    """
+
+    def post(self, customers, chunk_size=None):
+        response = self.client.post('/graphql', {'query': self.mutation, 'variables': {
+            'customers': customers, 'chunkSize': chunk_size,
+        }}, content_type='application/json')
+        return response.json()['data']['bulkCreateCustomers']
+
+    def test_valid_rows_are_created_and_invalid_ones_reported(self):
+        Customer.objects.create(name="Taken", email="taken@example.com")
+        result = self.post([
+            {'name': "A", 'email': "a@example.com", 'phone': "+15550001"},
+            {'name': "B", 'email': "taken@example.com"},
+            {'name': "C", 'email': "a@example.com"},
+            {'name': "D", 'email': "d@example.com", 'phone': "nope"},
+            {'name': "E", 'email': "e@example.com", 'phone': "555-0001"},
+        ], chunk_size=2)
+        self.assertTrue(result['success'])
+        self.assertEqual([row['email'] for row in result['createdCustomers']], ["a@example.com", "e@example.com"])
+        self.assertEqual(result['errors'], [
+            "Email already exists: taken@example.com",
+            "Duplicate email in request: a@example.com",
+            "Invalid phone: nope",
+        ])
+
+    @override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False})
+    def test_query_count_does_not_grow_with_the_rows(self):
+        counts = []
+        for count in (2, 20):
+            rows = [{'name': "C", 'email': f'{count}-{index}@example.com'} for index in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(len(self.post(rows)['createdCustomers']), count)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_non_positive_chunk_sizes_are_rejected(self):
+        result = self.post([{'name': "A", 'email': "a@example.com"}], chunk_size=0)
+        self.assertFalse(result['success'])
+        self.assertFalse(Customer.objects.exists())
+
+
+# ---------------------------------------------------------
+# Bulk order creation
+# ---------------------------------------------------------
+class BulkCreateOrdersTests(TestCase):
+    """Creates orders in bulk, valid and invalid ones mixed, across chunks."""
+    mutation = """
+        mutation ($orders: [OrderInput]!, $chunkSize: Int) {
+            bulkCreateOrders(orders: $orders, chunkSize: $chunkSize) {
+                success errors createdOrders { totalAmount items { quantity unitPrice } }
+            }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name="Buyer", email="buyer@example.com")
+        cls.lamp = Product.objects.create(name="Lamp", price=Decimal('5.00'), stock=10)
+        cls.desk = Product.objects.create(name="Desk", price=Decimal('80.00'), stock=10)
+
+    def post(self, orders, chunk_size=None):
+        response = self.client.post('/graphql', {'query': self.mutation, 'variables': {
+            'orders': orders, 'chunkSize': chunk_size,
+        }}, content_type='application/json')
+        return response.json()['data']['bulkCreateOrders']
+
+    def order(self, **fields):
+        return {'customerId': self.customer.pk, **fields}
+
+    def test_valid_orders_are_created_and_invalid_ones_reported(self):
+        result = self.post([
+            self.order(productIds=[self.lamp.pk, self.lamp.pk]),
+            self.order(customerId=0, productIds=[self.lamp.pk]),
+            self.order(items=[{'productId': self.desk.pk, 'quantity': 2}, {'productId': self.lamp.pk}]),
+            self.order(productIds=[0]),
+            self.order(),
+        ], chunk_size=1)
+        self.assertTrue(result['success'])
+        self.assertEqual([order['totalAmount'] for order in result['createdOrders']], ['10.00', '165.00'])
+        self.assertEqual(result['createdOrders'][0]['items'], [{'quantity': 2, 'unitPrice': '5.00'}])
+        self.assertEqual([error.split(':')[0] for error in result['errors']], ['Order 1', 'Order 3', 'Order 4'])
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(OrderItem.objects.aggregate(Sum('quantity'))['quantity__sum'], 5)
+        self.assertEqual(DailySalesRollup.objects.get().order_count, 2)
+
+    @override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False})
+    def test_query_count_does_not_grow_with_the_orders(self):
+        # The first order of the day creates its rollup row; later ones update it.
+        self.post([self.order(productIds=[self.lamp.pk])])
+        counts = []
+        for count in (2, 10):
+            with CaptureQueriesContext(connection) as queries:
+                result = self.post([self.order(productIds=[self.lamp.pk, self.desk.pk])] * count)
+            self.assertEqual(len(result['createdOrders']), count)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_non_positive_chunk_sizes_are_rejected(self):
+        result = self.post([self.order(productIds=[self.lamp.pk])], chunk_size=0)
+        self.assertFalse(result['success'])
+        self.assertFalse(Order.objects.exists())
+
+
+# ---------------------------------------------------------
+# Response cache
+# ---------------------------------------------------------
+class ResponseCacheTests(TestCase):
+    """Checks reads are served from the response cache until a write to
+    one of the models they read.
+    """
+    query = '{ allProducts(price_Gte: %s) { edges { node { name stock } } } }'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Lamp", price=Decimal('12.00'), stock=3)
+
+    def post(self, query):
+        response = self.client.post('/graphql', {'query': query}, content_type='application/json')
+        return response.json()
+
+    def product_queries(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            body = self.post(query)
+        return body, [q['sql'] for q in queries if 'crm_product' in q['sql']]
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        first, read = self.product_queries(self.query % '"10"')
+        second, cached = self.product_queries(self.query % '"10"')
+        self.assertTrue(read)
+        self.assertEqual(cached, [])
+        self.assertEqual(first, second)
+
+    def test_equivalent_filters_share_a_response(self):
+        self.product_queries(self.query % '"10"')
+        _, cached = self.product_queries(self.query % '"10.00"')
+        self.assertEqual(cached, [])
+
+    def test_writes_invalidate_the_responses_reading_the_model(self):
+        self.post(self.query % '"10"')
+        Product.objects.filter(pk=self.product.pk).update(stock=9)
+        self.assertEqual(self.post(self.query % '"10"')['data']['allProducts']['edges'][0]['node']['stock'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post('mutation { createProduct(name: "Desk", price: "50.00", stock: 1) { success } }')
+        names = [edge['node']['name'] for edge in self.post(self.query % '"10"')['data']['allProducts']['edges']]
+        self.assertEqual(sorted(names), ["Desk", "Lamp"])
+
+    def test_reads_of_other_models_stay_cached(self):
+        self.post('{ allCustomers { edges { node { name } } } }')
+        self.post('mutation { createProduct(name: "Desk", price: "50.00", stock: 1) { success } }')
+        with CaptureQueriesContext(connection) as queries:
+            self.post('{ allCustomers { edges { node { name } } } }')
+        self.assertFalse([q for q in queries if 'crm_customer' in q['sql']])
+
+    def test_mutations_are_not_cached(self):
+        mutation = 'mutation { createProduct(name: "Desk", price: "50.00", stock: 1) { success } }'
+        self.post(mutation)
+        self.post(mutation)
+        self.assertEqual(Product.objects.filter(name="Desk").count(), 2)
+
+
+# ---------------------------------------------------------
+# Order reminders
+# ---------------------------------------------------------
+class ReminderTests(TestCase):
+    """Walks the week's orders in small pages and sends each customer one
+    reminder, for their first order of the window.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.customers = [
+            Customer.objects.create(name=f"C{index}", email=f'c{index}@example.com')
+            for index in range(4)
+        ]
+        first, second, third, late = cls.customers
+        cls.first_orders = {}
+        for customer, days_ago in ((first, 6), (second, 5), (first, 4), (third, 3), (first, 2), (late, 10)):
+            order = Order.objects.create(customer_id=customer, order_date=now - timedelta(days=days_ago))
+            cls.first_orders.setdefault(customer.pk, order.pk)
+        del cls.first_orders[late.pk]
+
+    def setUp(self):
+        run_celery_eagerly(self)
+
+    def sent(self):
+        return dict(Reminder.objects.filter(sent_at__isnull=False).values_list('customer_id', 'order_id'))
+
+    def test_each_customer_gets_one_reminder(self):
+        run = send_reminders(days=7, page_size=2, batch_size=2)
+        self.assertIsNotNone(run.completed_at)
+        self.assertEqual(self.sent(), self.first_orders)
+
+    def test_interrupted_run_resumes_after_its_last_page(self):
+        run = start_run(days=7)
+        page = run_operation(ORDERS_PAGE, {
+            'since': run.window_start.isoformat(), 'until': run.window_end.isoformat(), 'first': 2,
+        })['allOrders']
+        self.assertEqual(len(record_page(run, page)), 2)
+
+        with mock.patch('crm.reminders.send_reminder_batch.delay', wraps=send_reminder_batch.delay) as delay:
+            resumed = send_reminders(days=7, page_size=2, batch_size=2)
+        self.assertEqual(resumed.pk, run.pk)
+        self.assertEqual(self.sent(), self.first_orders)
+        # The unsent reminders of the first page, then the third customer's.
+        self.assertEqual([call.args[1] for call in delay.call_args_list],
+                         [list(self.first_orders)[:2], list(self.first_orders)[2:]])
+
+
+# ---------------------------------------------------------
+# Inactive-customer purge
+# ---------------------------------------------------------
+class PurgeTests(TestCase):
+    """Purges the customers created over a year ago who never ordered, in
+    batches, and resumes a purge that was interrupted.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        old = timezone.now() - timedelta(days=400)
+        customers = [
+            Customer.objects.create(name=f"C{index}", email=f'c{index}@example.com')
+            for index in range(9)
+        ]
+        cls.inactive = customers[:5]
+        cls.buyers = customers[5:7]
+        Customer.objects.filter(pk__in=[c.pk for c in customers[:7]]).update(created_at=old)
+        for buyer in cls.buyers:
+            Order.objects.create(customer_id=buyer)
+
+    def command(self, *args):
+        out = tempfile.TemporaryFile('w+')
+        call_command('purge_inactive_customers', '--pause', '0', *args, stdout=out)
+        out.seek(0)
+        return out.read()
+
+    def test_dry_run_only_counts(self):
+        self.assertEqual(self.command('--dry-run').strip(), '5')
+        self.assertEqual(Customer.objects.count(), 9)
+
+    def test_purge_keeps_buyers_and_recent_customers(self):
+        self.assertEqual(self.command('--batch-size', '2').strip(), '5')
+        self.assertFalse(Customer.objects.filter(pk__in=[c.pk for c in self.inactive]).exists())
+        self.assertEqual(Customer.objects.count(), 4)
+        self.assertIsNotNone(PurgeRun.objects.get().completed_at)
+
+    def test_interrupted_purge_resumes_past_its_checkpoint(self):
+        batches = purge_batches(start_purge(), batch_size=2, pause=0)
+        self.assertEqual([next(batches), next(batches)], [2, 2])
+        batches.close()
+        run = PurgeRun.objects.get()
+        self.assertEqual((run.deleted, run.last_pk, run.completed_at), (4, self.inactive[3].pk, None))
+        self.assertEqual(self.command('--dry-run').strip(), '1')
+
+        output = self.command('--batch-size', '2')
+        self.assertIn("Resuming", output)
+        run.refresh_from_db()
+        self.assertEqual(run.deleted, 5)
+        self.assertIsNotNone(run.completed_at)
+        self.assertEqual(PurgeRun.objects.count(), 1)
+
+
+# ---------------------------------------------------------
+# In-process execution of job operations
+# ---------------------------------------------------------
+@override_settings(CRM_JOBS_GRAPHQL_URL=None)
+class ExecutorTests(TestCase):
+    """Runs job operations in process: data is returned as is, errors raise,
+    and a mutation that fails is rolled back as a whole.
+    """
+
+    def test_returns_the_data(self):
+        Product.objects.create(name="Desk", price=Decimal('50.00'), stock=3)
+        data = run_operation('{ hello allProducts { edges { node { name } } } }')
+        self.assertEqual(data['allProducts']['edges'], [{'node': {'name': "Desk"}}])
+        self.assertIn('hello', data)
+
+    def test_invalid_documents_raise(self):
+        with self.assertRaises(OperationError) as raised:
+            run_operation('{ noSuchField }')
+        self.assertIn('noSuchField', str(raised.exception))
+
+    def test_failed_mutations_are_rolled_back(self):
+        mutation = """
+        mutation {
+          createProduct(name: "Desk", price: "50.00", stock: 1) { success }
+          createOrder(customerId: "not-a-number", productIds: []) { success }
+        }
+        """
+        with self.assertRaises(OperationError):
+            run_operation(mutation)
+        self.assertFalse(Product.objects.exists())
+
+    def test_mutations_commit_when_they_succeed(self):
+        data = run_operation('mutation { createProduct(name: "Desk", price: "50.00", stock: 1) { success } }')
+        self.assertTrue(data['createProduct']['success'])
+        self.assertTrue(Product.objects.filter(name="Desk").exists())
+
+    def test_cron_jobs_run_in_process(self):
+        Product.objects.create(name="Desk", price=Decimal('50.00'), stock=2)
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch('crm.executor.requests.post') as post, \
+                mock.patch('crm.cron.open', create=True, side_effect=lambda path, mode: open(f'{directory}/log', mode)):
+            update_low_stock()
+        post.assert_not_called()
+        self.assertEqual(Product.objects.get().stock, 12)
+
+
+# ---------------------------------------------------------
+# Read/write splitting between the primary and a replica
+# ---------------------------------------------------------
+REPLICA = 'test_replica'
+
+
+@override_settings(
+    CRM_REPLICA_DATABASE=REPLICA,
+    CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False},
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Routes requests between the test database (the primary) and a second
+    SQLite file standing in for the replica. The two are not replicated,
+    so each read shows which database served it.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # The test runner only sets up the configured aliases: the replica
+        # file is added once the primary is ready.
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings[REPLICA] = connections.configure_settings({
+            'default': connections.settings['default'],
+            REPLICA: {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': f'{cls.replica_dir.name}/replica.sqlite3',
+            },
+        })[REPLICA]
+        cls.databases = cls.databases | {REPLICA}
+        call_command('migrate', database=REPLICA, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        cls.databases = cls.databases - {REPLICA}
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        Customer.objects.create(name="Primary", email="primary@example.com")
+        Customer.objects.using(REPLICA).create(name="Replica", email="replica@example.com")
+
+    def post(self, url, query):
+        response = self.client.post(url, {'query': query}, content_type='application/json')
+        return response.json()
+
+    def test_queries_read_from_the_replica(self):
+        for url in ('/graphql', '/graphql/async'):
+            with self.subTest(url=url):
+                body = self.post(url, '{ allCustomers { edges { node { name } } } }')
+                names = [edge['node']['name'] for edge in body['data']['allCustomers']['edges']]
+                self.assertEqual(names, ['Replica'])
+
+    def test_mutations_write_to_the_primary(self):
+        body = self.post('/graphql', """
+            mutation { createProduct(name: "New", price: "9.99", stock: 3) { success } }
+        """)
+        self.assertTrue(body['data']['createProduct']['success'])
+        self.assertTrue(Product.objects.using('default').filter(name="New").exists())
+        self.assertFalse(Product.objects.using(REPLICA).filter(name="New").exists())
+
+    def test_reads_after_a_write_stay_on_the_primary(self):
+        with request_routing():
+            with replica_reads():
+                self.assertEqual(Customer.objects.get().name, "Replica")
+            Customer.objects.create(name="Written", email="written@example.com")
+            with replica_reads():
+                self.assertEqual(Customer.objects.count(), 2)
+        with request_routing(), replica_reads():
+            self.assertEqual(Customer.objects.get().name, "Replica")
+
+    def test_reads_outside_queries_use_the_primary(self):
+        self.assertEqual(Customer.objects.get().name, "Primary")
+
+    @override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': True})
+    def test_replica_reads_are_not_cached(self):
+        # Cached versions come from the primary, the rows from a lagging replica.
+        for url in ('/graphql', '/graphql/async'):
+            with self.subTest(url=url), mock.patch('crm.views.response_cache.store') as store:
+                self.post(url, '{ allCustomers { edges { node { name } } } }')
+                store.assert_not_called()
+
+    @override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': True})
+    def test_primary_reads_are_cached(self):
+        with override_settings(CRM_REPLICA_DATABASE=None), \
+                mock.patch('crm.views.response_cache.store') as store:
+            self.post('/graphql', '{ allCustomers { edges { node { name } } } }')
+        store.assert_called_once()
+
+
+class BatchedOperationTests(TestCase):
+    """Posts JSON arrays of operations to the synchronous view, which runs
+    them in order and answers each with its own result and status.
+    """
+
+    def post(self, operations):
+        return self.client.post('/graphql', json.dumps(operations), content_type='application/json')
+
+    def test_operations_answer_in_order_with_their_own_errors(self):
+        response = self.post([
+            {'id': 'write', 'query': 'mutation { createProduct(name: "Batched", price: "1.50", stock: 2) { success } }'},
+            {'id': 'read', 'query': '{ allProducts { edges { node { name } } } }'},
+            {'id': 'invalid', 'query': '{ nope }'},
+        ])
+        body = response.json()
+        self.assertEqual([entry['id'] for entry in body], ['write', 'read', 'invalid'])
+        self.assertEqual([entry['status'] for entry in body], [200, 200, 400])
+        self.assertTrue(body[0]['data']['createProduct']['success'])
+        self.assertEqual(body[1]['data']['allProducts']['edges'], [{'node': {'name': "Batched"}}])
+        self.assertIn('errors', body[2])
+
+    @override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False})
+    def test_operations_share_the_request_loaders(self):
+        customer = Customer.objects.create(name="Ann", email='ann@example.com')
+        Order.objects.create(customer_id=customer)
+        query = '{ allOrders { edges { node { customer { name } } } } }'
+        with mock.patch('crm.loaders.CRMLoaders', wraps=CRMLoaders) as loaders:
+            body = self.post([{'query': query}] * 3).json()
+        self.assertEqual(loaders.call_count, 1)
+        self.assertEqual({json.dumps(entry['data']) for entry in body},
+                         {json.dumps({'allOrders': {'edges': [{'node': {'customer': {'name': "Ann"}}}]}})})
+
+    @override_settings(CRM_BATCH_MAX_OPERATIONS=2)
+    def test_oversized_batches_are_rejected(self):
+        response = self.post([{'query': '{ allProducts { edges { node { name } } } }'}] * 3)
+        self.assertEqual(response.status_code, 400)
+
+
+# ---------------------------------------------------------
+# Async view
+# ---------------------------------------------------------
+@override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False})
+class AsyncViewTests(TransactionTestCase):
+    """Runs the same operations on the async view as on the synchronous one.
+    A transaction test case: the async view's queries run in pool threads,
+    on their own connections.
+    """
+    query = '{ allProducts { edges { node { name stock } } } }'
+    mutation = 'mutation { createProduct(name: "Desk", price: "50.00", stock: 1) { success } }'
+
+    def setUp(self):
+        Product.objects.create(name="Lamp", price=Decimal('5.00'), stock=3)
+
+    def post(self, url, body):
+        return self.client.post(url, json.dumps(body), content_type='application/json')
+
+    def test_queries_answer_as_on_the_sync_view(self):
+        self.assertEqual(
+            self.post('/graphql/async', {'query': self.query}).json(),
+            self.post('/graphql', {'query': self.query}).json(),
+        )
+
+    def test_mutations_run_once(self):
+        body = self.post('/graphql/async', {'query': self.mutation}).json()
+        self.assertTrue(body['data']['createProduct']['success'])
+        self.assertEqual(Product.objects.filter(name="Desk").count(), 1)
+
+    def test_batches_answer_in_order(self):
+        for batch in (
+            [{'id': 'a', 'query': self.query}, {'id': 'b', 'query': '{ nope }'}, {'id': 'c', 'query': self.query}],
+            [{'id': 'a', 'query': self.mutation}, {'id': 'b', 'query': self.query}],
+        ):
+            with self.subTest(batch=[entry['query'][:8] for entry in batch]):
+                body = self.post('/graphql/async', batch).json()
+                self.assertEqual([entry['id'] for entry in body], [entry['id'] for entry in batch])
+                self.assertEqual(len([entry for entry in body if 'errors' in entry]),
+                                 len([entry for entry in batch if 'nope' in entry['query']]))
+        # The write of the second batch is read by the query after it.
+        self.assertEqual(len(body[1]['data']['allProducts']['edges']), 2)
+
+    @override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False})
+    def test_batched_queries_run_with_their_own_loaders(self):
+        # Concurrent queries cannot share the loaders, which are not
+        # thread-safe: each gets its own and repeats the others' lookups.
+        for index in range(3):
+            customer = Customer.objects.create(name=f"C{index}", email=f'c{index}@example.com')
+            order = Order.objects.create(customer_id=customer)
+            OrderItem.objects.create(order=order, product=Product.objects.get(), quantity=index + 1,
+                                     unit_price=Decimal('5.00'))
+        queries = [
+            '{ allOrders { edges { node { customer { name } items { quantity } } } } }',
+            '{ allCustomers(first: 10) { edges { node { name orderSet(first: 10) { edges { node { id } } } } } } }',
+            '{ allOrders { edges { node { customer { email } } } } }',
+        ]
+        expected = [self.post('/graphql', {'query': query}).json()['data'] for query in queries]
+        with mock.patch('crm.loaders.CRMLoaders', wraps=CRMLoaders) as loaders:
+            body = self.post('/graphql/async', [{'query': query} for query in queries * 2]).json()
+        self.assertEqual(loaders.call_count, len(queries) * 2)
+        self.assertEqual([entry['data'] for entry in body], expected * 2)
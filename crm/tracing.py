@@ -0,0 +1,203 @@
+"""
+'tracing' times the resolvers of a GraphQL request and attributes the SQL
+it issues to the field that was resolving. Clients get the timings as an
+Apollo-tracing 'extensions.tracing' block by sending {"tracing": true} in
+the request 'extensions'; requests over 'SLOW_REQUEST_MS' are logged.
+"""
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager, nullcontext
+from datetime import datetime, timezone
+from functools import wraps
+from inspect import isawaitable
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+# ---------------------------------------------------------
+# Timings of one request
+# ---------------------------------------------------------
+class RequestTrace:
+    """Collects the resolver timings and the SQL statements of one request.
+    Statements are counted against the resolver started last on the same
+    thread, which is also the field whose lazy querysets are being
+    evaluated. Statements of Django's async ORM are not recorded.
+    Attributes:
+    	operation_name: The name of the traced operation, if any.
+    	requested: Whether the client asked for 'extensions.tracing'.
+    	fields: Whether resolvers are timed, or only the request as a whole.
+    	resolvers: One Apollo-tracing entry per resolved field.
+    	sql_count: Statements run during the request.
+    	sql_duration: Nanoseconds spent running them.
+    """
+
+    def __init__(self, operation_name=None, requested=False, fields=False):
+        self.operation_name = operation_name
+        self.requested = requested
+        self.fields = fields
+        self.resolvers = []
+        self.sql_count = 0
+        self.sql_duration = 0
+        self._local = threading.local()
+        self.start_time = time.time()
+        self.start = time.perf_counter_ns()
+        self.duration = None
+
+    def record_sql(self, execute, sql, params, many, context):
+        """'connection.execute_wrapper' hook timing every statement.
+        """
+        start = time.perf_counter_ns()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            self.sql_count += 1
+            self.sql_duration += elapsed
+            entry = getattr(self._local, 'entry', None)
+            if entry is not None:
+                entry['sqlCount'] += 1
+                entry['sqlDuration'] += elapsed
+
+    @contextmanager
+    def recording(self):
+        """Hooks 'record_sql' into every database connection of this thread.
+        """
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self.record_sql))
+            yield self
+
+    def recorded(self, func):
+        """Wraps 'func' to record its SQL, e.g. when it runs on another thread.
+        """
+        @wraps(func)
+        def run(*args, **kwargs):
+            with self.recording():
+                return func(*args, **kwargs)
+        return run
+
+    def start_field(self, info):
+        entry = {
+            'path': info.path.as_list(),
+            'parentType': str(info.parent_type),
+            'fieldName': info.field_name,
+            'returnType': str(info.return_type),
+            'startOffset': time.perf_counter_ns() - self.start,
+            'duration': 0,
+            'sqlCount': 0,
+            'sqlDuration': 0,
+        }
+        self.resolvers.append(entry)
+        self._local.entry = entry
+        return entry
+
+    def end_field(self, entry):
+        entry['duration'] = time.perf_counter_ns() - self.start - entry['startOffset']
+
+    def finish(self):
+        """Stops the clock, logging the request if it was slow. Idempotent.
+        """
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter_ns() - self.start
+        threshold = settings.CRM_TRACING.get('SLOW_REQUEST_MS')
+        if threshold is not None and self.duration >= threshold * 1_000_000:
+            logger.warning(self.summary())
+
+    def summary(self, top=5):
+        """Returns a one-line digest: totals, then the most expensive fields.
+        """
+        line = (
+            f"Slow GraphQL operation {self.operation_name or '<anonymous>'}: "
+            f"{self.duration / 1e6:.1f} ms, {self.sql_count} SQL queries "
+            f"({self.sql_duration / 1e6:.1f} ms)"
+        )
+        ranked = sorted(
+            self.resolvers,
+            key=lambda entry: (entry['sqlDuration'], entry['duration']),
+            reverse=True,
+        )[:top]
+        if ranked:
+            line += "; top fields: " + ", ".join(
+                f"{'.'.join(map(str, entry['path']))} {entry['duration'] / 1e6:.1f} ms"
+                f" / {entry['sqlCount']} queries"
+                for entry in ranked
+            )
+        return line
+
+    def as_apollo(self):
+        """Returns the trace in the Apollo tracing format (version 1), each
+        resolver carrying its 'sqlCount' and 'sqlDuration' as well.
+        """
+        return {
+            'version': 1,
+            'startTime': _iso(self.start_time),
+            'endTime': _iso(self.start_time + self.duration / 1e9),
+            'duration': self.duration,
+            'sql': {'count': self.sql_count, 'duration': self.sql_duration},
+            'execution': {'resolvers': self.resolvers},
+        }
+
+
+def start_trace(extensions, operation_name=None):
+    """Returns the trace of a request, or None when tracing is disabled.
+    Args:
+    	extensions: The 'extensions' object of the request, if any.
+    	operation_name: The operation about to run.
+    """
+    config = settings.CRM_TRACING
+    if not config.get('ENABLED', True):
+        return None
+    requested = bool((extensions or {}).get('tracing'))
+    return RequestTrace(
+        operation_name=operation_name,
+        requested=requested,
+        fields=requested or config.get('TRACE_ALL_FIELDS', False),
+    )
+
+
+def recording(trace):
+    """Returns the context recording the SQL of 'trace', if there is one.
+    """
+    return trace.recording() if trace is not None else nullcontext()
+
+
+# ---------------------------------------------------------
+# Graphene middleware timing the resolvers
+# ---------------------------------------------------------
+class TracingMiddleware:
+    """Times every resolver of a traced request.
+    The view only adds it to requests whose trace times fields, so other
+    requests do not pay for it.
+    """
+
+    def resolve(self, next, root, info, **args):
+        trace = getattr(info.context, 'crm_trace', None)
+        if trace is None:
+            return next(root, info, **args)
+
+        entry = trace.start_field(info)
+        try:
+            result = next(root, info, **args)
+        except Exception:
+            trace.end_field(entry)
+            raise
+        if isawaitable(result):
+            return self.await_result(trace, entry, result)
+        trace.end_field(entry)
+        return result
+
+    @staticmethod
+    async def await_result(trace, entry, result):
+        try:
+            return await result
+        finally:
+            trace.end_field(entry)
@@ -1,28 +1,78 @@
+from decimal import Decimal
 import graphene
-from graphene_django import DjangoObjectType
-from .models import Customer, Product, Order
+from graphene_django import DjangoObjectType, DjangoConnectionField
+from graphene_django.utils import bypass_get_queryset
+from .models import Customer, Product, Order, OrderItem, CrmReport, DailySalesRollup
+from .loaders import get_loaders
+from .optimizer import optimize_queryset
 from graphene import relay
 
 
+# -----------------------------------------------
+# Common base of the CRM's GraphQL types
+# -----------------------------------------------
+
+class CRMObjectType(DjangoObjectType):
+    """Plans every queryset of the type from the request's selection set.
+    Inheritance:
+    	DjangoObjectType: Provides boilerplate simplifying CRUD operations.
+    Attributes:
+    	optimize_queries: Set to False on a subclass to hand querysets over untouched.
+    	field_sources: Maps GraphQL fields to the model field they read, when named differently.
+    """
+    optimize_queries = True
+    field_sources = {}
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        """Applies select_related, prefetch_related and only() to 'queryset'.
+        """
+        if not cls.optimize_queries:
+            return queryset
+        return optimize_queryset(queryset, info, cls)
+
+
+def _prefetched(instance, name):
+    """Returns the rows of 'name' fetched by prefetch_related, or None.
+    """
+    cache = getattr(instance, '_prefetched_objects_cache', {})
+    if name in cache:
+        return list(cache[name])
+    return None
+
+
 # -----------------------------------------------
 # Set of GraphQL's version of database tables
 # -----------------------------------------------
 
-class CustomerType(DjangoObjectType):
+class CustomerType(CRMObjectType):
     """Refers to the 'Customer' table inside the database.
     Inheritance:
-    	DjangoObjectType: Provides boilerplate simplifying CRUD operations.
+    	CRMObjectType: Provides boilerplate simplifying CRUD operations.
     """
+    order_set = DjangoConnectionField(lambda: OrderType)
+
     class Meta:
         model = Customer
         interfaces = (relay.Node,)
         filter_fields = ['name', 'email', 'phone', 'created_at']
 
+    def resolve_order_set(customer, info, **kwargs):
+        """Resolves the customer's orders through the request's batch loader.
+        """
+        orders = _prefetched(customer, 'order_set')
+        if orders is not None:
+            return orders
+        return get_loaders(info.context).orders_by_customer.load(customer.pk)
 
-class ProductType(DjangoObjectType):
+
+class ProductType(CRMObjectType):
     """Refers to the 'Product' table inside the database.
     Inheritance:
-    	DjangoObjectType: Provides boilerplate simplifying CRUD operations.
+    	CRMObjectType: Provides boilerplate simplifying CRUD operations.
     """
     class Meta:
         model = Product
@@ -30,12 +80,154 @@ class ProductType(DjangoObjectType):
         filter_fields = ['name', 'price', 'stock']
 
 
-class OrderType(DjangoObjectType):
+class OrderItemType(CRMObjectType):
+    """Refers to the 'OrderItem' table (line items of an order) inside the database.
+    Inheritance:
+    	CRMObjectType: Provides boilerplate simplifying CRUD operations.
+    """
+    class Meta:
+        model = OrderItem
+        fields = ('id', 'product', 'quantity', 'unit_price')
+
+    @bypass_get_queryset
+    def resolve_product(item, info):
+        """Returns the product joined or loaded along with the line item.
+        """
+        return item.product
+
+
+class OrderType(CRMObjectType):
     """Refers to the 'Order' table inside the database.
     Inheritance:
-    	DjangoObjectType: Provides boilerplate simplifying CRUD operations.
+    	CRMObjectType: Provides boilerplate simplifying CRUD operations.
     """
+    customer = graphene.Field(CustomerType)
+    product_id = graphene.List(ProductType)
+    items = graphene.List(OrderItemType)
+
+    field_sources = {'customer': 'customer_id'}
+
     class Meta:
         model = Order
         interfaces = (relay.Node,)
         filter_fields = ['total_amount', 'order_date']
+
+    def resolve_customer(order, info):
+        """Resolves the ordering customer through the request's batch loader.
+        """
+        if Order.customer_id.is_cached(order):
+            return order.customer_id
+        return get_loaders(info.context).customer.load(order.customer_id_id)
+
+    @bypass_get_queryset
+    def resolve_customer_id(order, info):
+        """Same as 'customer', kept for clients using the model field name.
+        """
+        return OrderType.resolve_customer(order, info)
+
+    def resolve_product_id(order, info):
+        """Resolves the ordered products through the request's batch loader.
+        """
+        products = _prefetched(order, 'product_id')
+        if products is not None:
+            return products
+        return get_loaders(info.context).products_by_order.load(order.pk)
+
+    def resolve_items(order, info):
+        """Resolves the order's line items through the request's batch loader.
+        """
+        items = _prefetched(order, 'items')
+        if items is not None:
+            return items
+        return get_loaders(info.context).items_by_order.load(order.pk)
+
+
+# -----------------------------------------------
+# Aggregates computed by the database
+# -----------------------------------------------
+
+class ProductSalesType(graphene.ObjectType):
+    """Units sold and revenue of one product, summed over its line items.
+    Inheritance:
+    	graphene.ObjectType: Plain GraphQL type, not mapped onto a table.
+    Attributes:
+    	cache_models: Models the figures are computed from, for cache invalidation.
+    """
+    cache_models = (Product, Order, OrderItem)
+
+    product = graphene.Field(ProductType)
+    units_sold = graphene.Int()
+    revenue = graphene.Decimal()
+
+    def resolve_product(product, info):
+        """The row is the product itself, annotated by 'with_sales()'.
+        """
+        return product
+
+    def resolve_revenue(product, info):
+        return Decimal(product.revenue).quantize(Decimal('0.01'))
+
+
+class CRMStatsType(graphene.ObjectType):
+    """Headline figures of the CRM, computed with SQL aggregates.
+    Inheritance:
+    	graphene.ObjectType: Plain GraphQL type, not mapped onto a table.
+    Attributes:
+    	cache_models: Models the figures are computed from, for cache invalidation.
+    """
+    cache_models = (Customer, Order)
+
+    customer_count = graphene.Int()
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+    average_order_value = graphene.Decimal()
+
+
+class DailySalesType(CRMObjectType):
+    """Refers to the 'DailySalesRollup' table: the sales of one day.
+    Inheritance:
+    	CRMObjectType: Provides boilerplate simplifying CRUD operations.
+    """
+
+    class Meta:
+        model = DailySalesRollup
+        fields = ('date', 'order_count', 'revenue', 'units_sold')
+
+
+# -----------------------------------------------
+# Materialized reports
+# -----------------------------------------------
+
+class ReportProductType(graphene.ObjectType):
+    """One best-selling product of a CRM report.
+    Inheritance:
+    	graphene.ObjectType: Plain GraphQL type, read from the report's JSON.
+    """
+    product_id = graphene.ID()
+    name = graphene.String()
+    units_sold = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class ReportCustomerType(graphene.ObjectType):
+    """One of the biggest spenders of a CRM report.
+    Inheritance:
+    	graphene.ObjectType: Plain GraphQL type, read from the report's JSON.
+    """
+    customer_id = graphene.ID()
+    name = graphene.String()
+    email = graphene.String()
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class CrmReportType(CRMObjectType):
+    """Refers to the 'CrmReport' table, filled by the report Celery task.
+    Inheritance:
+    	CRMObjectType: Provides boilerplate simplifying CRUD operations.
+    """
+    top_products = graphene.List(ReportProductType)
+    top_customers = graphene.List(ReportCustomerType)
+
+    class Meta:
+        model = CrmReport